@@ -0,0 +1,201 @@
+"""Thống kê doanh thu / món bán theo khung giờ, ngày, tuần, tháng trên khoảng thời gian bất kỳ.
+
+Mỗi request chạy đúng 1 câu SQL (UNION ALL các truy vấn GROUP BY trên bảng đang dùng và bảng lưu trữ, lọc paid_at bằng
+khoảng >= / < để dùng index).
+Khung đã đóng (trước khung hiện tại) không bao giờ đổi nên được cache: lần sau chỉ truy vấn phần từ mốc đã cache tới nay
+(trong khung đang mở thì tới đầu giờ hiện tại).
+"""
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, DateTimeField, F, IntegerField, Sum, Value
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import ArchivedOrderItem, ArchivedRevenue, OrderItem, Revenue
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+MAX_BUCKETS = getattr(settings, 'EMENU_ANALYTICS_MAX_BUCKETS', 10000)
+CACHE_TTL = getattr(settings, 'EMENU_ANALYTICS_CACHE_TTL', 60 * 60 * 24)
+GENERATION_KEY = 'emenu:analytics:gen'
+DEFAULT_DAYS = 30
+
+def floor(dt, bucket):
+    """Đầu khung chứa dt (tuần bắt đầu từ thứ Hai, giống Trunc('week') của MySQL/SQLite)"""
+    if bucket == 'hour': return dt.replace(minute=0, second=0, microsecond=0)
+    dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'week': return dt - timedelta(days=dt.weekday())
+    if bucket == 'month': return dt.replace(day=1)
+    return dt
+
+FIXED_STEPS = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+
+def step(dt, bucket):
+    if bucket in FIXED_STEPS: return dt + FIXED_STEPS[bucket]
+    return dt.replace(year=dt.year + dt.month // 12, month=dt.month % 12 + 1)
+
+def bucket_starts(start, end, bucket):
+    if bucket in FIXED_STEPS: return [start + i * FIXED_STEPS[bucket] for i in range(bucket_count(start, end, bucket))]
+    out = []
+    while start < end: out.append(start); start = step(start, bucket)
+    return out
+
+def parse_time(value, inclusive_end=False):
+    """'2026-03-01' hoặc datetime ISO; ngày đứng riêng ở `to` được tính trọn ngày đó"""
+    try: d, dt = parse_date(value), None
+    except ValueError: d = None
+    if d is not None: dt = datetime.combine(d + timedelta(days=1) if inclusive_end else d, time.min)
+    else:
+        try: dt = parse_datetime(value)
+        except ValueError: dt = None
+        if dt is None: raise ValueError(f'Thời gian không hợp lệ: {value}')
+    if settings.USE_TZ and timezone.is_naive(dt): dt = timezone.make_aware(dt)
+    elif not settings.USE_TZ and timezone.is_aware(dt): dt = timezone.make_naive(dt)
+    return timezone.localtime(dt) if settings.USE_TZ else dt
+
+def _ids(value):
+    ids = [v.strip() for v in (value or '').split(',') if v.strip()]
+    if not all(v.isdigit() for v in ids): raise ValueError('category phải là danh sách ID')
+    return sorted(int(v) for v in ids)
+
+def parse_params(params, now=None):
+    bucket = params.get('bucket', 'day')
+    if bucket not in BUCKETS: raise ValueError(f"bucket phải là một trong {', '.join(BUCKETS)}")
+    now = now or (timezone.localtime() if settings.USE_TZ else timezone.now())
+    end = parse_time(params['to'], inclusive_end=True) if params.get('to') else now
+    start = parse_time(params['from']) if params.get('from') else end - timedelta(days=DEFAULT_DAYS)
+    # Làm tròn ra biên khung để mọi khung trả về đều đầy đủ
+    start, aligned = floor(start, bucket), floor(end, bucket)
+    end = aligned if aligned == end else step(aligned, bucket)
+    if start >= end: raise ValueError('from phải trước to')
+    if bucket_count(start, end, bucket) > MAX_BUCKETS: raise ValueError(f'Khoảng thời gian quá dài (tối đa {MAX_BUCKETS} khung)')
+    methods = sorted({m.strip() for m in params.get('method', '').split(',') if m.strip()})
+    return {'bucket': bucket, 'start': start, 'end': end, 'methods': methods, 'categories': _ids(params.get('category')), 'now': now}
+
+def bucket_count(start, end, bucket):
+    if bucket == 'month': return (end.year - start.year) * 12 + end.month - start.month
+    return int((end - start) / FIXED_STEPS[bucket])
+
+# Dữ liệu đang dùng và dữ liệu đã lưu trữ (archive.py): (bảng dòng món, bảng doanh thu, lookup danh mục / tên món / giá)
+SOURCES = [
+    (OrderItem, Revenue, {'cat': 'item__category_id', 'name': 'item__name', 'price': 'item__price'}),
+    (ArchivedOrderItem, ArchivedRevenue, {'cat': 'category_id', 'name': 'item_name', 'price': 'price'}),
+]
+
+def _parts(line_model, revenue_model, f, start, end, bucket, methods, categories):
+    paid = {'order__status': 'paid', 'order__revenues__paid_at__gte': start, 'order__revenues__paid_at__lt': end}
+    if methods: paid['order__revenues__method__in'] = methods
+    if categories: paid[f"{f['cat']}__in"] = categories
+    # Gộp mọi điều kiện trên revenues vào 1 filter() -> chỉ 1 JOIN, Trunc bên dưới dùng lại JOIN đó
+    lines = line_model.objects.filter(**paid).annotate(b=Trunc('order__revenues__paid_at', bucket, output_field=DateTimeField()))
+    line_amount = Sum(F('quantity') * F(f['price']))
+    items = (lines.annotate(kind=Value(1), key=F('item_id'), name=F(f['name']), cat=F(f['cat']))
+             .values('b', 'kind', 'key', 'name', 'cat').annotate(qty=Sum('quantity'), amount=line_amount).order_by())
+    blank = {'key': Value(None, IntegerField()), 'name': Value(None, CharField()), 'cat': Value(None, IntegerField())}
+    if categories:
+        # Tiền thanh toán là của cả đơn, không tách được theo danh mục -> doanh thu = tiền các món thuộc danh mục
+        totals = lines.annotate(kind=Value(0), **blank).values('b', 'kind', 'key', 'name', 'cat') \
+            .annotate(qty=Count('order_id', distinct=True), amount=line_amount).order_by()
+    else:
+        revenues = revenue_model.objects.filter(paid_at__gte=start, paid_at__lt=end, **({'method__in': methods} if methods else {}))
+        totals = (revenues.annotate(b=Trunc('paid_at', bucket, output_field=DateTimeField()), kind=Value(0), **blank)
+                  .values('b', 'kind', 'key', 'name', 'cat').annotate(qty=Count('id'), amount=Sum('amount')).order_by())
+    return [totals, items]
+
+def build_query(start, end, bucket, methods=(), categories=()):
+    """1 câu SQL: các dòng kind=0 là tổng theo khung (số đơn, tiền), kind=1 là từng món theo khung (số lượng, tiền).
+    Bảng đang dùng và bảng lưu trữ không trùng đơn nào nên chỉ cần cộng dồn kết quả"""
+    parts = [qs for source in SOURCES for qs in _parts(*source, start, end, bucket, methods, categories)]
+    return parts[0].union(*parts[1:], all=True)
+
+def _empty():
+    return {'totals': {}, 'items': {}}
+
+def _add(state, b, kind, key, name, cat, qty, amount):
+    t = state['totals'].setdefault(b, [0, 0, 0, 0])  # số đơn, doanh thu, số món, tiền món
+    if kind == 0: t[0] += qty; t[1] += amount or 0
+    else:
+        t[2] += qty; t[3] += amount or 0
+        i = state['items'].setdefault(key, [name, cat, 0, 0])
+        i[2] += qty; i[3] += amount or 0
+
+def _merge(state, rows, bucket, until=None):
+    """Cộng các dòng của build_query (gom lên khung `bucket`) vào state; dòng từ mốc `until` trở đi chưa đóng
+    nên được cộng vào state thứ hai, không cache"""
+    open_state = _empty()
+    for b, *row in rows:
+        if isinstance(b, date) and not isinstance(b, datetime): b = datetime.combine(b, time.min)
+        if settings.USE_TZ and timezone.is_aware(b): b = timezone.localtime(b)
+        _add(open_state if until is not None and b >= until else state, floor(b, bucket), *row)
+    return open_state
+
+def _combine(*states):
+    out = _empty()
+    for s in states:
+        for b, (orders, revenue, qty, amount) in s['totals'].items():
+            t = out['totals'].setdefault(b, [0, 0, 0, 0]); t[0] += orders; t[1] += revenue; t[2] += qty; t[3] += amount
+        for key, (name, cat, qty, amount) in s['items'].items():
+            i = out['items'].setdefault(key, [name, cat, 0, 0]); i[2] += qty; i[3] += amount
+    return out
+
+def _cache_key(p, closed):
+    gen = cache.get_or_set(GENERATION_KEY, 1, None)
+    methods, cats = ','.join(p['methods']), ','.join(map(str, p['categories']))
+    # Khoảng đã đóng hẳn: kết quả cố định theo cả start/end. Khoảng tới hiện tại: 1 entry theo start, nối dài dần
+    tail = p['end'].isoformat() if closed else 'live'
+    return f"emenu:analytics:{gen}:{p['bucket']}:{p['start'].isoformat()}:{tail}:{methods}:{cats}"
+
+_paused = threading.local()
+
+@contextmanager
+def paused():
+    """Bỏ qua invalidate() trong khối này (lưu trữ đơn chỉ chuyển dòng sang bảng khác, tổng không đổi)"""
+    _paused.on = True
+    try: yield
+    finally: _paused.on = False
+
+def is_paused():
+    return getattr(_paused, 'on', False)
+
+def invalidate(**kwargs):
+    """Doanh thu cũ bị sửa/xoá -> bỏ toàn bộ kết quả đã cache (nối vào signal trong signals.py)"""
+    if is_paused(): return
+    try: cache.incr(GENERATION_KEY)
+    except ValueError: cache.set(GENERATION_KEY, 1, None)
+
+def compute(p):
+    bucket, start, end = p['bucket'], p['start'], p['end']
+    current = floor(p['now'], bucket)  # Đầu khung đang mở: mọi khung trước mốc này đã đóng
+    closed = end <= current
+    key = _cache_key(p, closed)
+    cached = cache.get(key)
+    if closed and cached is not None: return cached['state'], True
+
+    since = cached['upto'] if cached and start <= cached['upto'] <= p['now'] else start
+    state = cached['state'] if since != start else _empty()
+    # Đã có mọi khung đóng -> phần còn lại nằm trong khung đang mở: gom theo giờ để cache được cả các giờ đã qua
+    # của khung đó (tháng/tuần đang chạy không phải tính lại từ đầu mỗi request)
+    grain = 'hour' if not closed and since >= current else bucket
+    until = None if closed else (floor(p['now'], 'hour') if grain == 'hour' else current)
+    rows = build_query(since, end, grain, p['methods'], p['categories']).values_list('b', 'kind', 'key', 'name', 'cat', 'qty', 'amount')
+    open_state = _merge(state, rows, bucket, until)
+    cache.set(key, {'upto': end if closed else max(until, since), 'state': state}, CACHE_TTL)
+    return _combine(state, open_state), since != start
+
+def report(p, limit=10):
+    state, from_cache = compute(p)
+    totals, zero = state['totals'], (0, 0, 0, 0)
+    series = [{'bucket': b.isoformat(), 'revenue': t[1], 'orders': t[0], 'items_sold': t[2], 'item_sales': t[3]}
+              for b in bucket_starts(p['start'], p['end'], p['bucket']) for t in (totals.get(b, zero),)]
+    items = sorted(state['items'].items(), key=lambda kv: (-kv[1][2], kv[0]))
+    return {
+        'bucket': p['bucket'], 'from': p['start'].isoformat(), 'to': p['end'].isoformat(),
+        'filters': {'method': p['methods'], 'category': p['categories']},
+        'totals': dict(zip(('orders', 'revenue', 'items_sold', 'item_sales'), map(sum, zip(zero, *totals.values())))),
+        'series': series,
+        'items': [{'id': k, 'name': name, 'category_id': cat, 'quantity': qty, 'amount': amount}
+                  for k, (name, cat, qty, amount) in items[:limit]],
+        'cached': from_cache,
+    }
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class EmenuConfig(AppConfig):
     name = 'EMENU'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,65 @@
+"""Chuyển đơn đã thanh toán lâu ngày (kèm dòng món, doanh thu) sang bảng *_archive theo lô và dọn thông báo cũ,
+để các bảng nóng (orders, order_items, revenues, notifications) luôn nhỏ. Chạy bằng `manage.py archive_orders`.
+
+Thống kê (analytics.py), xuất file (exports.py) và món bán chạy đọc cả 2 nơi nên kết quả không đổi sau khi lưu trữ.
+Bảng revenue_daily không bị trừ: dòng chuyển đi vẫn là doanh thu đã có.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import analytics, caching
+from .models import ArchivedOrder, ArchivedOrderItem, ArchivedRevenue, Notification, Order, OrderItem, Revenue
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = getattr(settings, 'EMENU_ARCHIVE_AFTER_DAYS', 90)
+NOTIFICATION_RETENTION_DAYS = getattr(settings, 'EMENU_NOTIFICATION_RETENTION_DAYS', 7)
+BATCH_SIZE = getattr(settings, 'EMENU_ARCHIVE_BATCH_SIZE', 500)
+
+def archive_batch(ids):
+    """Chuyển các đơn `ids` (chỉ đơn 'paid') sang bảng lưu trữ trong 1 transaction, trả về số đơn đã chuyển"""
+    with transaction.atomic():
+        orders = list(Order.objects.select_for_update().filter(pk__in=ids, status='paid')
+                      .values('id_donhang', 'table_id', 'table__number', 'total', 'status', 'created_at'))
+        if not orders: return 0
+        ids = [o['id_donhang'] for o in orders]
+        lines = OrderItem.objects.filter(order_id__in=ids).values(
+            'id_chitiet', 'order_id', 'item_id', 'item__name', 'item__category_id', 'item__category__name',
+            'item__price', 'quantity', 'note', 'is_served')
+        revenues = Revenue.objects.filter(order_id__in=ids).values('id', 'order_id', 'method', 'amount', 'paid_at')
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(
+            id_donhang=o['id_donhang'], table_id=o['table_id'], table_number=o['table__number'], total=o['total'],
+            status=o['status'], created_at=o['created_at']) for o in orders])
+        ArchivedOrderItem.objects.bulk_create([ArchivedOrderItem(
+            id_chitiet=l['id_chitiet'], order_id=l['order_id'], item_id=l['item_id'], item_name=l['item__name'],
+            category_id=l['item__category_id'], category_name=l['item__category__name'], price=l['item__price'],
+            quantity=l['quantity'], note=l['note'], is_served=l['is_served']) for l in lines], batch_size=1000)
+        ArchivedRevenue.objects.bulk_create([ArchivedRevenue(**r) for r in revenues], batch_size=1000)
+        # Thống kê / món bán chạy đọc cả bảng lưu trữ, đơn đã thanh toán không hiện trên danh sách bàn
+        # nên kết quả đã cache vẫn đúng -> không huỷ cache cho từng dòng bị xoá
+        with analytics.paused(), caching.paused():
+            Order.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+def archive_orders(days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE, now=None):
+    """Lưu trữ mọi đơn 'paid' tạo trước `days` ngày, mỗi lô 1 transaction ngắn (không khoá bảng lâu)"""
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    old = Order.objects.filter(status='paid', created_at__lt=cutoff).order_by('pk')
+    total, last = 0, 0
+    while True:
+        ids = list(old.filter(pk__gt=last).values_list('pk', flat=True)[:batch_size])
+        if not ids: return total
+        total += archive_batch(ids)
+        last = ids[-1]
+        logger.info("Đã lưu trữ %d đơn (tới id %d)", total, last)
+
+def purge_notifications(days=NOTIFICATION_RETENTION_DAYS, batch_size=BATCH_SIZE, now=None):
+    """Xoá thông báo tạo trước `days` ngày (đã đọc hay chưa đều đã hết ý nghĩa), theo lô"""
+    stale = Notification.objects.filter(created_at__lt=(now or timezone.now()) - timedelta(days=days))
+    total = 0
+    while True:
+        ids = list(stale.values_list('pk', flat=True)[:batch_size])
+        if not ids: return total
+        total += Notification.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,232 @@
+"""Cache 2 tầng cho dữ liệu đọc nhiều: menu, trạng thái bàn, dashboard.
+
+Tầng 1 là LRU trong RAM của từng tiến trình (không tốn 1 lần gọi mạng), tầng 2 là cache dùng chung của Django
+(Redis khi có REDIS_URL, không thì LocMem). Mỗi nhóm dữ liệu (Namespace) có 1 số thế hệ lưu ở cache dùng chung,
+key thật là `emenu:<nhóm>:<thế hệ>:<key>`: huỷ cả nhóm = tăng thế hệ, bản cũ tự hết hạn theo TTL.
+Khi huỷ, thế hệ mới được phát lên bus để worker khác bỏ LRU của mình ngay; worker lỡ tin nhắn (mất kết nối)
+vẫn đọc lại thế hệ từ cache dùng chung mỗi GEN_POLL giây.
+"""
+import json, logging, os, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+LOCAL_SIZE = getattr(settings, 'EMENU_CACHE_LOCAL_SIZE', 256)  # Số key tối đa trong LRU của mỗi nhóm / tiến trình
+BUS_URL = getattr(settings, 'EMENU_CACHE_BUS', None)  # redis://... để phát lệnh huỷ tới mọi worker; None = trong tiến trình
+GEN_POLL = getattr(settings, 'EMENU_CACHE_GEN_POLL', 30 if BUS_URL else 1)
+CHANNEL = 'emenu:cache:invalidate'
+
+# ================= BUS =================
+
+class LocalBus:
+    """Bus trong 1 tiến trình: đủ khi chỉ có 1 worker, và để test nhiều 'worker' (Namespace cùng tên) chung 1 bus"""
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, fn):
+        self._subscribers.append(fn)
+
+    def publish(self, name, gen):
+        for fn in list(self._subscribers): fn(name, gen)
+
+
+class RedisBus:
+    """Pub/sub Redis: mỗi tiến trình có 1 thread nghe kênh CHANNEL. Cần gói `redis` (redis-py)."""
+    def __init__(self, url, channel=CHANNEL):
+        import redis
+        self._redis, self.channel = redis.Redis.from_url(url), channel
+        self._subscribers, self._thread = [], None
+        self._lock = threading.Lock()
+
+    def subscribe(self, fn):
+        self._subscribers.append(fn)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='emenu-cache-bus', daemon=True)
+                self._thread.start()
+
+    def publish(self, name, gen):
+        try: self._redis.publish(self.channel, json.dumps([name, gen]))
+        except Exception: logger.exception("Không phát được lệnh huỷ cache '%s'", name)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Vừa (nối lại) kết nối: có thể đã lỡ tin nhắn -> mọi nhóm đọc lại thế hệ từ cache dùng chung
+                for fn in list(self._subscribers): fn(None, None)
+                for message in pubsub.listen():
+                    name, gen = json.loads(message['data'])
+                    for fn in list(self._subscribers): fn(name, gen)
+            except Exception:
+                logger.exception("Mất kết nối bus cache, nối lại sau 1 giây")
+                time.sleep(1)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+def get_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is None: _bus = RedisBus(BUS_URL) if BUS_URL else LocalBus()
+    return _bus
+
+# ================= NAMESPACE =================
+
+class Namespace:
+    def __init__(self, name, ttl, local_size=LOCAL_SIZE, poll=GEN_POLL, bus=None):
+        self.name, self.ttl, self.local_size, self.poll = name, ttl, local_size, poll
+        self.gen_key = f'emenu:gen:{name}'
+        self._local = OrderedDict()  # key -> (thế hệ, hết hạn (monotonic), giá trị)
+        self._lock = threading.Lock()
+        self._gen, self._checked = None, 0.0
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0}
+        self.bus = bus or get_bus()
+        self.bus.subscribe(self._on_message)
+
+    def _count(self, name):
+        with self._lock: self.counters[name] += 1
+
+    def _use(self, gen):
+        with self._lock:
+            if gen != self._gen: self._gen = gen; self._local.clear()
+            self._checked = time.monotonic()
+
+    def generation(self):
+        """Thế hệ hiện tại; chỉ hỏi cache dùng chung khi quá GEN_POLL giây chưa hỏi"""
+        if self._gen is not None and time.monotonic() - self._checked < self.poll: return self._gen
+        gen = cache.get(self.gen_key)
+        if gen is None:
+            # Khởi tạo theo thời gian để không quay lại thế hệ cũ khi key bị cache đẩy ra
+            cache.add(self.gen_key, int(time.time() * 1000), None)
+            gen = cache.get(self.gen_key)
+        self._use(gen)
+        return gen
+
+    def _on_message(self, name, gen):
+        if name is None: self._checked = 0.0  # Bus vừa nối lại: hỏi lại thế hệ ở lần đọc tới
+        elif name == self.name and (self._gen is None or gen > self._gen): self._use(gen)
+
+    def _shared_key(self, key, gen):
+        return f'emenu:{self.name}:{gen}:{key}'
+
+    def local(self, key):
+        """Chỉ đọc LRU trong RAM (không I/O, dùng được trong view async); None nếu không có / cần hỏi lại thế hệ"""
+        if self._gen is None or time.monotonic() - self._checked >= self.poll: return None
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None or entry[0] != self._gen or entry[1] <= time.monotonic(): return None
+            self._local.move_to_end(key)
+            self.counters['local_hits'] += 1
+        return entry[2]
+
+    def _remember(self, key, gen, value, ttl):
+        with self._lock:
+            if gen != self._gen: return
+            self._local[key] = (gen, time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size: self._local.popitem(last=False)
+
+    def lookup(self, key):
+        """(thế hệ, giá trị hoặc None); giữ thế hệ này để set() sau khi dựng không ghi nhầm sang thế hệ mới"""
+        gen = self.generation()
+        value = self.local(key)
+        if value is not None: return gen, value
+        value = cache.get(self._shared_key(key, gen))
+        if value is None:
+            self._count('misses')
+            return gen, None
+        self._count('shared_hits')
+        self._remember(key, gen, value, self.ttl)
+        return gen, value
+
+    def get(self, key):
+        return self.lookup(key)[1]
+
+    def set(self, key, value, ttl=None, gen=None):
+        """Ghi ở thế hệ `gen` (thế hệ lúc bắt đầu dựng); bỏ qua nếu nhóm đã bị huỷ trong lúc dựng,
+        vì `value` có thể được dựng từ dữ liệu cũ"""
+        if gen is None: gen = self.generation()
+        elif cache.get(self.gen_key) != gen: return
+        cache.set(self._shared_key(key, gen), value, ttl or self.ttl)
+        self._remember(key, gen, value, ttl or self.ttl)
+
+    def get_or_set(self, key, build, ttl=None):
+        """Giá trị của `key` ở thế hệ hiện tại; `build()` chỉ chạy khi cả 2 tầng đều chưa có (không được trả None)"""
+        gen, value = self.lookup(key)
+        if value is None:
+            value = build()
+            self.set(key, value, ttl, gen)
+        return value
+
+    def invalidate(self, **kwargs):
+        """Huỷ mọi key của nhóm ở mọi worker (kwargs để nối thẳng vào signal)"""
+        try: gen = cache.incr(self.gen_key)
+        except ValueError:
+            cache.add(self.gen_key, int(time.time() * 1000), None)
+            gen = cache.get(self.gen_key)
+        self._use(gen)
+        self._count('invalidations')
+        self.bus.publish(self.name, gen)
+
+    def reset(self):
+        """Quên LRU, thế hệ đã biết và bộ đếm (sau khi cache dùng chung bị xoá)"""
+        with self._lock:
+            self._local.clear()
+            self._gen, self._checked = None, 0.0
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters, local_keys=len(self._local), generation=self._gen)
+        lookups = data['local_hits'] + data['shared_hits'] + data['misses']
+        data['hit_rate'] = round((data['local_hits'] + data['shared_hits']) / lookups, 3) if lookups else None
+        return data
+
+# ================= CÁC NHÓM =================
+
+_namespaces = {}
+
+def namespace(name, ttl):
+    if name not in _namespaces: _namespaces[name] = Namespace(name, ttl)
+    return _namespaces[name]
+
+# Menu: snapshot JSON theo revision (menu_cache.py). Bàn / dashboard có TTL ngắn vì chứa thời gian tương đối (số phút
+# ngồi, doanh thu 'hôm nay'); mọi thay đổi dữ liệu vẫn huỷ ngay qua signals.py.
+menu = namespace('menu', getattr(settings, 'EMENU_CACHE_MENU_TTL', 60 * 60 * 24))
+tables = namespace('tables', getattr(settings, 'EMENU_CACHE_TABLES_TTL', 30))
+dashboard = namespace('dashboard', getattr(settings, 'EMENU_CACHE_DASHBOARD_TTL', 60))
+
+def invalidate(*names):
+    for name in names: _namespaces[name].invalidate()
+
+_paused = threading.local()
+
+@contextmanager
+def paused():
+    """Bỏ qua changed() trong khối này (vd. lưu trữ đơn đã thanh toán: bàn / dashboard không đổi)"""
+    _paused.on = True
+    try: yield
+    finally: _paused.on = False
+
+def changed(*names):
+    """Dữ liệu của các nhóm vừa đổi: huỷ ngay, và nếu đang trong transaction thì huỷ lại sau commit
+    (request chen vào giữa có thể đã dựng lại cache từ dữ liệu cũ chưa commit)"""
+    if getattr(_paused, 'on', False): return
+    invalidate(*names)
+    if transaction.get_connection().in_atomic_block: transaction.on_commit(lambda: invalidate(*names))
+
+def stats():
+    return {'pid': os.getpid(), 'bus': type(get_bus()).__name__,
+            'namespaces': {name: ns.stats() for name, ns in _namespaces.items()}}
+
+def clear():
+    """Xoá cache dùng chung và LRU của tiến trình này (dev / test)"""
+    cache.clear()
+    for ns in _namespaces.values(): ns.reset()
@@ -0,0 +1,142 @@
+import asyncio, json, threading, time
+from functools import wraps
+from collections import deque
+from asgiref.sync import sync_to_async
+from itertools import islice
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+
+# Stream SSE tự đóng sau MAX_SECONDS để worker WSGI được giải phóng; trình duyệt tự nối lại bằng Last-Event-ID
+SSE_MAX_SECONDS = getattr(settings, 'EMENU_SSE_MAX_SECONDS', 300)
+SSE_HEARTBEAT_SECONDS = getattr(settings, 'EMENU_SSE_HEARTBEAT_SECONDS', 15)
+SSE_RETRY_MS = 3000
+# Token ngắn hạn cho EventSource (không gửi được header Authorization): chỉ kiểm tra lúc mở stream
+STREAM_TOKEN_MAX_AGE = getattr(settings, 'EMENU_STREAM_TOKEN_MAX_AGE', 10 * 60)
+STREAM_TOKEN_SALT = 'emenu.stream'
+
+class EventBroker:
+    """Pub/sub trong tiến trình: giữ `size` sự kiện gần nhất, client đọc tiếp từ con trỏ `since`"""
+
+    def __init__(self, size=1000):
+        self._events = deque(maxlen=size)
+        # Id bắt đầu theo mili-giây để con trỏ cũ của client vẫn đúng sau khi server khởi động lại
+        self._last_id = int(time.time() * 1000)
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, type, data):
+        with self._cond:
+            self._last_id += 1
+            # Mã hoá JSON 1 lần, mọi client dùng chung chuỗi này
+            event = {'id': self._last_id, 'type': type, 'json': json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}
+            self._events.append(event)
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, flag in waiters:
+            loop.call_soon_threadsafe(flag.set)
+        return event
+
+    def read(self, since, types=None):
+        """Trả về (con trỏ mới, [sự kiện có id > since])"""
+        with self._cond:
+            last = self._last_id
+            if since >= last: return last, []
+            if not self._events or since < self._events[0]['id'] - 1:
+                # Client tụt quá xa bộ đệm -> báo tải lại toàn bộ qua API thường
+                return last, [{'id': last, 'type': 'resync', 'json': '{}'}]
+            start = since - self._events[0]['id'] + 1
+            events = list(islice(self._events, start, None))
+        return last, [e for e in events if not types or e['type'] in types]
+
+    def wait(self, since, timeout, types=None):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._last_id > since, max(0, deadline - time.monotonic()))
+            since, events = self.read(since, types)
+            if events or time.monotonic() >= deadline: return since, events
+
+    async def await_events(self, since, timeout, types=None):
+        loop, flag = asyncio.get_running_loop(), asyncio.Event()
+        waiter = (loop, flag)
+        deadline = loop.time() + timeout
+        with self._cond: self._async_waiters.add(waiter)
+        try:
+            while True:
+                flag.clear()
+                since, events = self.read(since, types)
+                left = deadline - loop.time()
+                if events or left <= 0: return since, events
+                try: await asyncio.wait_for(flag.wait(), left)
+                except asyncio.TimeoutError: pass
+        finally:
+            with self._cond: self._async_waiters.discard(waiter)
+
+broker = EventBroker()
+
+def publish_on_commit(type, data):
+    """Chỉ phát sự kiện khi dữ liệu đã ghi xong vào DB"""
+    transaction.on_commit(lambda: broker.publish(type, data))
+
+# ================= SERVER-SENT EVENTS =================
+
+def stream_token(user):
+    """Token ký bằng SECRET_KEY, dùng làm ?token= khi mở stream; hết hạn sau STREAM_TOKEN_MAX_AGE giây"""
+    return signing.dumps(user.pk, salt=STREAM_TOKEN_SALT)
+
+def staff_stream(view):
+    """Chỉ cho nhân viên (is_staff) mở stream: đăng nhập bằng session, hoặc ?token= do stream_token() cấp.
+    Không có người dùng -> 401, không phải nhân viên -> 403"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = request.user if request.user.is_authenticated else None
+        if user is None and request.GET.get('token'):
+            try: pk = signing.loads(request.GET['token'], salt=STREAM_TOKEN_SALT, max_age=STREAM_TOKEN_MAX_AGE)
+            except signing.BadSignature: pk = None
+            user = get_user_model().objects.filter(pk=pk, is_active=True).first() if pk is not None else None
+        if user is None: return JsonResponse({'error': 'Cần đăng nhập hoặc token stream hợp lệ'}, status=401)
+        if not user.is_staff: return JsonResponse({'error': 'Chỉ nhân viên được xem stream'}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+def _format(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {event['json']}\n\n"
+
+def _stream(since, types, on_tick=None):
+    yield f'retry: {SSE_RETRY_MS}\n\n'
+    deadline = time.monotonic() + SSE_MAX_SECONDS
+    while (left := deadline - time.monotonic()) > 0:
+        if on_tick: on_tick()
+        since, events = broker.wait(since, min(SSE_HEARTBEAT_SECONDS, left), types)
+        if not events: yield ': ping\n\n'
+        for e in events: yield _format(e)
+
+async def _astream(since, types, on_tick=None):
+    yield f'retry: {SSE_RETRY_MS}\n\n'
+    deadline = time.monotonic() + SSE_MAX_SECONDS
+    while (left := deadline - time.monotonic()) > 0:
+        if on_tick: await sync_to_async(on_tick)()
+        since, events = await broker.await_events(since, min(SSE_HEARTBEAT_SECONDS, left), types)
+        if not events: yield ': ping\n\n'
+        for e in events: yield _format(e)
+
+def sse_response(request, types=None, on_tick=None):
+    """Stream các sự kiện mới sau con trỏ `?since=` / header Last-Event-ID (mặc định: chỉ sự kiện từ bây giờ).
+    on_tick: hàm đồng bộ gọi mỗi vòng chờ (tối đa mỗi SSE_HEARTBEAT_SECONDS), vd. quét bàn hết hạn"""
+    cursor = request.GET.get('since') or request.headers.get('Last-Event-ID')
+    since = int(cursor) if cursor and cursor.isdigit() else broker.last_id
+    # Dưới ASGI dùng async generator để không giữ thread nào trong lúc chờ
+    stream = _astream(since, types, on_tick) if isinstance(request, ASGIRequest) else _stream(since, types, on_tick)
+    res = StreamingHttpResponse(stream, content_type='text/event-stream')
+    res['Cache-Control'] = 'no-cache'
+    res['X-Accel-Buffering'] = 'no'
+    return res
@@ -0,0 +1,156 @@
+"""Xuất doanh thu / đơn / dòng món cho kế toán dạng CSV, XLSX hoặc JSON theo cột, ghi ra từng đợt (stream).
+
+Đơn cũ đã lưu trữ (archive.py) được xuất trước, rồi tới dữ liệu đang dùng.
+Dữ liệu được đọc theo trang khoá chính (WHERE pk > <cuối trang trước> ORDER BY pk LIMIT n): driver MySQL nạp cả
+kết quả của 1 query vào RAM kể cả khi dùng .iterator(), nên chia trang mới giữ bộ nhớ phẳng với khoảng thời gian bất kỳ.
+"""
+import csv, io, json, re, zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.db.models import F
+from .models import ArchivedOrder, ArchivedOrderItem, ArchivedRevenue, Order, OrderItem, Revenue
+
+CHUNK_SIZE = getattr(settings, 'EMENU_EXPORT_CHUNK_SIZE', 2000)
+FORMATS = {'csv': 'text/csv; charset=utf-8',
+           'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+           'json': 'application/x-ndjson'}
+
+
+class Source:
+    def __init__(self, queryset, date_field, lookups):
+        # lookups theo đúng thứ tự header của Dataset, lookup đầu luôn là khoá chính để chia trang
+        self.queryset, self.date_field, self.lookups = queryset, date_field, lookups
+
+    def chunks(self, start=None, end=None, chunk_size=CHUNK_SIZE):
+        qs = self.queryset()
+        if start: qs = qs.filter(**{f'{self.date_field}__gte': start})
+        if end: qs = qs.filter(**{f'{self.date_field}__lt': end})
+        pk = self.lookups[0]
+        qs = qs.values_list(*self.lookups).order_by(pk)
+        last = None
+        while True:
+            rows = list((qs if last is None else qs.filter(**{f'{pk}__gt': last}))[:chunk_size])
+            if rows: yield rows
+            if len(rows) < chunk_size: return
+            last = rows[-1][0]
+
+
+class Dataset:
+    """Bảng xuất = dữ liệu đã lưu trữ (archive.py, đơn cũ) nối tiếp dữ liệu đang dùng, cùng bộ cột"""
+    def __init__(self, header, *sources):
+        self.header, self.sources = header, sources
+
+    def chunks(self, start=None, end=None, chunk_size=CHUNK_SIZE):
+        for source in self.sources: yield from source.chunks(start, end, chunk_size)
+
+
+DATASETS = {
+    'revenues': Dataset(['id', 'paid_at', 'method', 'amount', 'order_id', 'table'],
+        Source(ArchivedRevenue.objects.all, 'paid_at', ['id', 'paid_at', 'method', 'amount', 'order_id', 'order__table_number']),
+        Source(Revenue.objects.all, 'paid_at', ['id', 'paid_at', 'method', 'amount', 'order_id', 'order__table__number'])),
+    'orders': Dataset(['id', 'created_at', 'table', 'status', 'total'],
+        Source(ArchivedOrder.objects.all, 'created_at', ['id_donhang', 'created_at', 'table_number', 'status', 'total']),
+        Source(Order.objects.all, 'created_at', ['id_donhang', 'created_at', 'table__number', 'status', 'total'])),
+    # Đơn đang dùng không lưu giá món theo đơn -> unit_price / amount tính theo giá hiện tại (bảng lưu trữ có giá lúc lưu trữ)
+    'order_items': Dataset(['id', 'order_id', 'ordered_at', 'table', 'order_status', 'item_id', 'item', 'category',
+                            'quantity', 'unit_price', 'amount', 'served', 'note'],
+        Source(lambda: ArchivedOrderItem.objects.annotate(amount=F('quantity') * F('price')), 'order__created_at', [
+            'id_chitiet', 'order_id', 'order__created_at', 'order__table_number', 'order__status', 'item_id', 'item_name',
+            'category_name', 'quantity', 'price', 'amount', 'is_served', 'note']),
+        Source(lambda: OrderItem.objects.annotate(amount=F('quantity') * F('item__price')), 'order__created_at', [
+            'id_chitiet', 'order_id', 'order__created_at', 'order__table__number', 'order__status', 'item_id', 'item__name',
+            'item__category__name', 'quantity', 'item__price', 'amount', 'is_served', 'note'])),
+}
+
+def _text(value):
+    if isinstance(value, datetime): return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date): return value.isoformat()
+    return value
+
+# --- CSV ---
+class _Echo:
+    def write(self, value): return value
+
+def stream_csv(header, chunks):
+    writer = csv.writer(_Echo())
+    yield ('\ufeff' + writer.writerow(header)).encode()  # BOM để Excel đọc đúng tiếng Việt
+    for rows in chunks:
+        yield ''.join(writer.writerow([_text(v) for v in r]) for r in rows).encode()
+
+# --- JSON theo cột: dòng đầu là tên cột, mỗi dòng sau là 1 đợt dạng [[cột 1...], [cột 2...], ...] ---
+def stream_json(header, chunks):
+    yield (json.dumps({'columns': header}) + '\n').encode()
+    for rows in chunks:
+        yield (json.dumps([[_text(v) for v in col] for col in zip(*rows)], ensure_ascii=False, separators=(',', ':')) + '\n').encode()
+
+# --- XLSX: tự ghi file zip + XML tối thiểu (chuỗi inline, không sharedStrings) để không phải giữ cả bảng trong RAM ---
+_XLSX_PARTS = {
+    '[Content_Types].xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>',
+    '_rels/.rels': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    'xl/workbook.xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    'xl/_rels/workbook.xml.rels': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>',
+}
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+class _Pipe(io.RawIOBase):
+    """Đích ghi không seek được cho ZipFile: gom bytes vừa ghi để generator trả ra rồi xoá"""
+    def __init__(self): self.parts = []
+    def writable(self): return True
+    def write(self, b): self.parts.append(bytes(b)); return len(b)
+    def drain(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+def _cell(value):
+    if value is None: return '<c/>'
+    if isinstance(value, bool): return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)): return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(_XML_ILLEGAL.sub("", str(_text(value))))}</t></is></c>'
+
+def _row(values):
+    return '<row>' + ''.join(_cell(v) for v in values) + '</row>'
+
+def stream_xlsx(header, chunks, sheet='Export'):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, body in _XLSX_PARTS.items(): zf.writestr(name, body.replace('{name}', escape(sheet, {'"': '&quot;'})))
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as ws:
+            ws.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                      + _row(header)).encode())
+            for rows in chunks:
+                ws.write(''.join(_row(r) for r in rows).encode())
+                yield pipe.drain()
+            ws.write(b'</sheetData></worksheet>')
+    yield pipe.drain()
+
+STREAMS = {'csv': stream_csv, 'xlsx': stream_xlsx, 'json': stream_json}
+
+def stream(dataset, fmt, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Generator bytes của file xuất; raise ValueError nếu dataset / định dạng không hợp lệ"""
+    if dataset not in DATASETS: raise ValueError(f"Không có dữ liệu '{dataset}' (chọn: {', '.join(DATASETS)})")
+    if fmt not in STREAMS: raise ValueError(f"Định dạng không hỗ trợ: {fmt} (chọn: {', '.join(STREAMS)})")
+    ds = DATASETS[dataset]
+    chunks = ds.chunks(start, end, chunk_size)
+    if fmt == 'xlsx': return stream_xlsx(ds.header, chunks, sheet=dataset)
+    return STREAMS[fmt](ds.header, chunks)
+
+def filename(dataset, fmt, start=None, end=None):
+    span = '_'.join(d.strftime('%Y%m%d') for d in (start, end) if d)
+    return f"{dataset}{'_' + span if span else ''}.{fmt}"
@@ -0,0 +1,142 @@
+import logging, math, threading, time
+from collections import defaultdict
+from functools import wraps
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371000  # mét
+METERS_PER_DEG = EARTH_RADIUS * math.pi / 180  # ~111195m: cùng bán kính với haversine để bbox không hẹp hơn vùng tròn
+CELL_DEG = 0.01  # Ô lưới ~1.1km để tra nhanh các vùng gần điểm cần kiểm tra
+
+# Vùng cho phép đặt món, mỗi chi nhánh 1 hoặc nhiều vùng: hình tròn (lat/lon/radius mét) hoặc đa giác [(lat, lon), ...]
+DEFAULT_FENCES = [{'name': 'Quán', 'lat': 10.824682, 'lon': 106.720029, 'radius': 150}]
+
+def haversine(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin(math.radians(lat2 - lat1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class GeofenceError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message); self.status = status
+
+
+class CircleFence:
+    def __init__(self, name, lat, lon, radius):
+        self.name, self.lat, self.lon, self.radius = name, lat, lon, radius
+        self.cos_lat = math.cos(math.radians(lat))
+        dlat, dlon = radius / METERS_PER_DEG, radius / (METERS_PER_DEG * max(self.cos_lat, 1e-6))
+        self.bbox = (lat - dlat, lat + dlat, lon - dlon, lon + dlon)
+        self.center = (lat, lon)
+
+    def contains(self, lat, lon):
+        return haversine(self.lat, self.lon, lat, lon) <= self.radius
+
+
+class PolygonFence:
+    def __init__(self, name, points):
+        self.name, self.points = name, [(float(a), float(b)) for a, b in points]
+        lats, lons = [p[0] for p in self.points], [p[1] for p in self.points]
+        self.bbox = (min(lats), max(lats), min(lons), max(lons))
+        self.center = (sum(lats) / len(lats), sum(lons) / len(lons))
+        self.cos_lat = math.cos(math.radians(self.center[0]))
+
+    def contains(self, lat, lon):
+        # Ray casting trên mặt phẳng lat/lon (đủ chính xác với vùng cỡ vài km)
+        inside, pts = False, self.points
+        for (y1, x1), (y2, x2) in zip(pts, pts[1:] + pts[:1]):
+            if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1: inside = not inside
+        return inside
+
+
+def make_fence(spec):
+    if 'polygon' in spec: return PolygonFence(spec.get('name', ''), spec['polygon'])
+    return CircleFence(spec.get('name', ''), float(spec['lat']), float(spec['lon']), float(spec['radius']))
+
+
+class GeofenceSet:
+    """Tra vùng chứa 1 điểm: lưới ô CELL_DEG -> lọc bbox tính sẵn -> mới tính chính xác (haversine / đa giác)"""
+
+    def __init__(self, fences):
+        self.fences = list(fences)
+        self.grid = defaultdict(list)
+        for f in self.fences:
+            lat0, lat1, lon0, lon1 = f.bbox
+            for i in range(math.floor(lat0 / CELL_DEG), math.floor(lat1 / CELL_DEG) + 1):
+                for j in range(math.floor(lon0 / CELL_DEG), math.floor(lon1 / CELL_DEG) + 1):
+                    self.grid[i, j].append(f)
+
+    def find(self, lat, lon):
+        for f in self.grid.get((math.floor(lat / CELL_DEG), math.floor(lon / CELL_DEG)), ()):
+            lat0, lat1, lon0, lon1 = f.bbox
+            if lat0 <= lat <= lat1 and lon0 <= lon <= lon1 and f.contains(lat, lon): return f
+        return None
+
+    def nearest_distance(self, lat, lon):
+        """Khoảng cách (m, xấp xỉ) tới tâm vùng gần nhất - chỉ dùng cho thông báo khi bị từ chối"""
+        return min((math.hypot(lat - f.center[0], (lon - f.center[1]) * f.cos_lat) * METERS_PER_DEG for f in self.fences), default=0)
+
+
+class RateLimitedLog:
+    """Ghi log tối đa 1 lần / `interval` giây cho mỗi khoá, kèm số lần đã bỏ qua"""
+
+    def __init__(self, logger, interval=60):
+        self.logger, self.interval = logger, interval
+        self._last, self._skipped, self._lock = {}, defaultdict(int), threading.Lock()
+
+    def log(self, level, key, msg, *args):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last.get(key, -self.interval) < self.interval:
+                self._skipped[key] += 1; return
+            self._last[key], skipped = now, self._skipped.pop(key, 0)
+        if skipped: msg += f' (bỏ qua {skipped} log tương tự)'
+        self.logger.log(level, msg, *args)
+
+
+_fences = None
+_lock = threading.Lock()
+_log = RateLimitedLog(logger, getattr(settings, 'EMENU_GEOFENCE_LOG_INTERVAL', 60))
+
+def get_fences():
+    global _fences
+    with _lock:
+        if _fences is None: _fences = GeofenceSet(make_fence(s) for s in getattr(settings, 'EMENU_GEOFENCES', DEFAULT_FENCES))
+    return _fences
+
+def reset():
+    global _fences
+    with _lock: _fences = None
+
+@receiver(setting_changed)
+def _reload(setting, **kwargs):
+    if setting == 'EMENU_GEOFENCES': reset()
+
+def validate(data):
+    """Kiểm tra toạ độ khách gửi lên, trả về vùng chứa nó hoặc raise GeofenceError"""
+    lat, lon = data.get('lat'), data.get('lon')
+    if lat in (None, '') or lon in (None, ''): raise GeofenceError('Yêu cầu bật Vị trí (GPS) trên thiết bị để đặt món!', 400)
+    try: lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError): raise GeofenceError('Tọa độ GPS không hợp lệ!', 400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180): raise GeofenceError('Tọa độ GPS không hợp lệ!', 400)
+    fences = get_fences()
+    fence = fences.find(lat, lon)
+    if fence is None:
+        dist = fences.nearest_distance(lat, lon)
+        _log.log(logging.INFO, 'outside', 'Từ chối đặt món ngoài vùng: %.6f, %.6f (cách %dm)', lat, lon, dist)
+        raise GeofenceError(f'Bạn đang cách quán {int(dist)}m. Vui lòng lại gần quán để đặt!', 403)
+    return fence
+
+def geofenced(view):
+    """Decorator cho view DRF: chặn request có toạ độ ngoài mọi vùng, gắn request.geofence = vùng khớp"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try: request.geofence = validate(request.data)
+        except GeofenceError as e: return Response({'error': str(e)}, e.status)
+        return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,61 @@
+"""Header Idempotency-Key cho các POST có tác dụng phụ (gọi món, thanh toán).
+
+Wi-Fi quán chập chờn làm điện thoại gửi lại request: create_order cộng dồn số lượng, checkout ghi thêm Revenue.
+Client gửi cùng 1 key (vd. UUID sinh lúc bấm nút) cho mọi lần thử lại; lần đầu chạy view và lưu JSON trả về
+vào cache dùng chung (caching.py: Redis nếu có) trong TTL giây, các lần sau trả lại đúng response đó sau 1 lần đọc cache,
+không chạy lại view / không đụng DB. Request không có header chạy như cũ.
+"""
+import hashlib, json
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+TTL = getattr(settings, 'EMENU_IDEMPOTENCY_TTL', 24 * 60 * 60)
+# Key đang xử lý bị giữ tối đa chừng này giây (worker chết giữa chừng thì key tự mở lại)
+LOCK_SECONDS = getattr(settings, 'EMENU_IDEMPOTENCY_LOCK_SECONDS', 60)
+MAX_KEY_LENGTH = 255
+PENDING = 'pending'
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.md5(f'{request.path}\n{body}'.encode()).hexdigest()
+
+def idempotent(view):
+    """Decorator cho view DRF (đặt dưới @api_view / @permission_classes để lần gửi lại vẫn phải qua xác thực).
+    Mỗi key lưu (dấu vân tay request, status, JSON) - chỉ response < 500 được lưu, lỗi 500 thì client thử lại được."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key: return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH: return Response({'error': f'{HEADER} dài tối đa {MAX_KEY_LENGTH} ký tự'}, 400)
+        user = request.user.pk if request.user.is_authenticated else ''
+        cache_key = 'emenu:idem:' + hashlib.md5(f'{view.__name__}:{user}:{key}'.encode()).hexdigest()
+        fingerprint = _fingerprint(request)
+
+        # Lần gửi lại thường gặp: 1 lần get() là đủ để trả response đã lưu.
+        # Key chưa có -> add() (nguyên tử) giành key, chỉ 1 request chạy view, các lần gửi trùng lúc đó nhận 409
+        stored = cache.get(cache_key)
+        if stored is None and not cache.add(cache_key, (PENDING, fingerprint), LOCK_SECONDS):
+            stored = cache.get(cache_key)  # Request khác vừa giành key trước
+            if stored is None: return Response({'error': 'Request trùng key vừa kết thúc, hãy gửi lại'}, 409, headers={'Retry-After': '1'})
+        if stored is not None:
+            if stored[1] != fingerprint: return Response({'error': f'{HEADER} đã dùng cho request khác'}, 422)
+            if stored[0] == PENDING: return Response({'error': 'Request với key này đang được xử lý'}, 409, headers={'Retry-After': '1'})
+            _, _, status, body = stored
+            res = HttpResponse(body, status=status, content_type='application/json')
+            res[REPLAY_HEADER] = 'true'
+            return res
+
+        try: res = view(request, *args, **kwargs)
+        except BaseException:
+            cache.delete(cache_key)
+            raise
+        if res.status_code >= 500 or not hasattr(res, 'data'): cache.delete(cache_key)
+        else: cache.set(cache_key, ('done', fingerprint, res.status_code, JSONRenderer().render(res.data)), TTL)
+        return res
+    return wrapper
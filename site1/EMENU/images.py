@@ -0,0 +1,88 @@
+import hashlib, io, os, threading
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+THUMB_SIZE = (200, 200)
+_PIL_FORMATS = {'.png': 'PNG', '.webp': 'WEBP', '.gif': 'PNG'}
+
+# Các cỡ ảnh dẫn xuất sinh ra khi lưu ảnh món (khung tối đa, giữ tỉ lệ)
+VARIANTS = {'thumb': (200, 200), 'card': (480, 480), 'detail': (1080, 1080)}
+DERIVED_DIR = 'menu/derived'
+
+# { (ảnh gốc, kích thước): tên thumbnail } -> mỗi thumbnail chỉ kiểm tra/tạo 1 lần mỗi tiến trình
+_memo = {}
+_lock = threading.Lock()
+
+def _base_ext(name):
+    ext = os.path.splitext(name)[1].lower()
+    return '.png' if ext in ('.png', '.gif') else ('.webp' if ext == '.webp' else '.jpg')
+
+def _encode(img, fmt):
+    if fmt == 'JPEG' and img.mode != 'RGB': img = img.convert('RGB')
+    buf = io.BytesIO()
+    if fmt == 'WEBP': img.save(buf, fmt, quality=80, method=4)
+    else: img.save(buf, fmt, quality=80, optimize=True)
+    return buf.getvalue()
+
+def thumbnail_name(name, size=THUMB_SIZE):
+    stem = os.path.splitext(name)[0]
+    return f"{os.path.dirname(stem)}/thumbs/{os.path.basename(stem)}_{size[0]}x{size[1]}{_base_ext(name)}"
+
+def _render(src, size, fmt):
+    with default_storage.open(src, 'rb') as f:
+        img = ImageOps.exif_transpose(Image.open(f))
+        img.thumbnail(size)
+        return _encode(img, fmt)
+
+def get_thumbnail(name, size=THUMB_SIZE):
+    """Trả về tên file thumbnail trong storage (tạo nếu chưa có), None nếu ảnh gốc không tồn tại"""
+    if not name: return None
+    key = (name, size)
+    if key in _memo: return _memo[key]
+    with _lock:
+        if key in _memo: return _memo[key]
+        thumb = thumbnail_name(name, size)
+        if not default_storage.exists(thumb):
+            if not default_storage.exists(name): return None
+            fmt = _PIL_FORMATS.get(os.path.splitext(thumb)[1], 'JPEG')
+            thumb = default_storage.save(thumb, ContentFile(_render(name, size, fmt)))
+        _memo[key] = thumb
+    return thumb
+
+# ================= ẢNH DẪN XUẤT (thumb / card / detail + WebP) =================
+
+def derivative_names(image_hash, original_name):
+    """{'thumb': ..., 'thumb_webp': ..., ...} - đặt tên theo hash nội dung ảnh gốc nên không cần đọc file để biết URL"""
+    if not image_hash or not original_name: return {}
+    ext, folder = _base_ext(original_name), f"{DERIVED_DIR}/{image_hash[:2]}/{image_hash}"
+    names = {}
+    for variant in VARIANTS:
+        names[variant] = f"{folder}/{variant}{ext}"
+        if ext != '.webp': names[f"{variant}_webp"] = f"{folder}/{variant}.webp"
+    return names
+
+def derivative_urls(image_hash, original_name, request=None):
+    urls = {k: default_storage.url(v) for k, v in derivative_names(image_hash, original_name).items()}
+    return {k: request.build_absolute_uri(v) for k, v in urls.items()} if request else urls
+
+def build_derivatives(name):
+    """Sinh toàn bộ ảnh dẫn xuất cho ảnh gốc `name`, trả về hash SHA-256 của ảnh gốc.
+    Ảnh trùng nội dung dùng chung bộ dẫn xuất, file đã có thì bỏ qua."""
+    with default_storage.open(name, 'rb') as f: data = f.read()
+    image_hash = hashlib.sha256(data).hexdigest()
+    names = derivative_names(image_hash, name)
+    missing = {k: v for k, v in names.items() if not default_storage.exists(v)}
+    if not missing: return image_hash
+
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    img.load()
+    for variant, size in VARIANTS.items():
+        if variant not in missing and f"{variant}_webp" not in missing: continue
+        resized = img.copy(); resized.thumbnail(size)
+        for key in (variant, f"{variant}_webp"):
+            if key in missing:
+                fmt = _PIL_FORMATS.get(os.path.splitext(missing[key])[1], 'JPEG')
+                # Tên cố định theo hash: nếu tiến trình khác vừa ghi cùng file thì nội dung y hệt, bỏ qua
+                if not default_storage.exists(missing[key]): default_storage.save(missing[key], ContentFile(_encode(resized, fmt)))
+    return image_hash
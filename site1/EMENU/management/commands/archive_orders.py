@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from EMENU import archive
+
+
+class Command(BaseCommand):
+    help = 'Chuyển đơn đã thanh toán lâu ngày sang bảng lưu trữ (theo lô) và xoá thông báo cũ (1 lần, hoặc lặp với --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=archive.ARCHIVE_AFTER_DAYS, help='Lưu trữ đơn đã thanh toán tạo trước số ngày này')
+        parser.add_argument('--notification-days', type=int, default=archive.NOTIFICATION_RETENTION_DAYS, help='Xoá thông báo cũ hơn số ngày này')
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE, help='Số đơn mỗi transaction')
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục')
+        parser.add_argument('--interval', type=float, default=3600, help='Số giây giữa 2 lần chạy')
+
+    def handle(self, *args, **opts):
+        while True:
+            orders = archive.archive_orders(opts['days'], opts['batch_size'])
+            notifications = archive.purge_notifications(opts['notification_days'], opts['batch_size'])
+            if orders or notifications or not opts['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Đã lưu trữ {orders} đơn, xoá {notifications} thông báo cũ.'))
+            if not opts['loop']: return
+            time.sleep(opts['interval'])
+            close_old_connections()  # Kết nối DB có thể đã bị server đóng trong lúc ngủ
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from EMENU.models import Revenue, ArchivedRevenue, DailyRevenue
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng revenue_daily từ bảng revenues (toàn bộ hoặc theo khoảng ngày)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='Ngày bắt đầu (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Ngày kết thúc (YYYY-MM-DD)')
+
+    def handle(self, *args, **opts):
+        # Doanh thu của đơn đã lưu trữ (archive_orders) nằm ở revenues_archive -> tính cả 2 bảng
+        sources, rollups = [Revenue.objects.all(), ArchivedRevenue.objects.all()], DailyRevenue.objects.all()
+        if opts['start']:
+            sources = [r.filter(paid_at__gte=opts['start']) for r in sources]; rollups = rollups.filter(day__gte=opts['start'])
+        if opts['end']:
+            sources = [r.filter(paid_at__lt=opts['end'] + timedelta(days=1)) for r in sources]; rollups = rollups.filter(day__lte=opts['end'])
+
+        totals = {}
+        for revenues in sources:
+            for r in revenues.annotate(day=TruncDate('paid_at')).values('day', 'method').annotate(total=Sum('amount'), count=Count('id')).order_by():
+                t = totals.setdefault((r['day'], r['method']), [0, 0]); t[0] += r['total']; t[1] += r['count']
+        with transaction.atomic():
+            rollups.delete()
+            created = DailyRevenue.objects.bulk_create(
+                [DailyRevenue(day=day, method=method, total=total, count=count) for (day, method), (total, count) in totals.items()],
+                batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f'Đã tổng hợp {len(created)} dòng doanh thu theo ngày.'))
@@ -0,0 +1,42 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand
+from EMENU.images import build_derivatives
+from EMENU.menu_cache import bump_revision
+from EMENU.models import Item
+
+
+def _build(name):
+    # Chạy trong tiến trình con: chỉ đọc/ghi file, không đụng DB
+    try: return name, build_derivatives(name), None
+    except Exception as e: return name, '', str(e)
+
+
+class Command(BaseCommand):
+    help = 'Sinh ảnh dẫn xuất (thumb/card/detail + WebP) cho ảnh món đã có'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Số tiến trình (1 = chạy tuần tự)')
+        parser.add_argument('--force', action='store_true', help='Làm lại cả món đã có image_hash')
+
+    def handle(self, *args, **opts):
+        items = Item.objects.exclude(image='').exclude(image__isnull=True)
+        if not opts['force']: items = items.filter(image_hash='')
+        names = sorted(set(items.values_list('image', flat=True)))
+        if not names:
+            self.stdout.write('Không có ảnh nào cần xử lý.'); return
+
+        if opts['workers'] <= 1: results = list(map(_build, names))
+        else:
+            # initializer=django.setup để chạy được cả khi hệ điều hành dùng spawn (Windows)
+            with ProcessPoolExecutor(max_workers=opts['workers'], initializer=django.setup) as pool:
+                results = list(pool.map(_build, names, chunksize=4))
+
+        done = failed = 0
+        for name, image_hash, error in results:
+            if error:
+                failed += 1; self.stderr.write(f'Lỗi {name}: {error}'); continue
+            done += Item.objects.filter(image=name).update(image_hash=image_hash)
+        bump_revision()
+        self.stdout.write(self.style.SUCCESS(f'Đã xử lý {len(names) - failed} ảnh ({done} món), lỗi {failed}.'))
@@ -0,0 +1,50 @@
+from collections import defaultdict
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from EMENU.menu_cache import bump_revision
+from EMENU.models import Item
+from EMENU.storage import menu_storage, content_name, file_digest
+
+
+class Command(BaseCommand):
+    help = 'Gộp các ảnh trùng nội dung trong media/menu về một file đặt tên theo hash và trỏ lại các món'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default='menu', help='Thư mục trong MEDIA_ROOT (mặc định: menu)')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ báo cáo, không đổi gì')
+        parser.add_argument('--prune-orphans', action='store_true', help='Xoá luôn ảnh không món nào dùng')
+
+    def handle(self, *args, **opts):
+        directory, dry = opts['dir'], opts['dry_run']
+        groups = defaultdict(list)
+        for fname in menu_storage.listdir(directory)[1]:
+            name = f'{directory}/{fname}'
+            with menu_storage.open(name, 'rb') as f: groups[file_digest(File(f))].append(name)
+
+        referenced = set(Item.objects.exclude(image='').values_list('image', flat=True))
+        moved = removed = freed = 0
+        for digest, names in groups.items():
+            canonical = content_name(directory, digest, names[0])
+            used = [n for n in names if n in referenced]
+            if not used and opts['prune_orphans']:
+                doomed = names
+            elif not used and len(names) == 1:
+                continue
+            else:
+                if not dry and not menu_storage.exists(canonical):
+                    with menu_storage.open(names[0], 'rb') as f: menu_storage.save(canonical, File(f))
+                stale = [n for n in names if n != canonical]
+                if not dry and stale:
+                    with transaction.atomic(): moved += Item.objects.filter(image__in=stale).update(image=canonical)
+                elif stale: moved += Item.objects.filter(image__in=stale).count()
+                doomed = stale
+            for name in doomed:
+                freed += menu_storage.size(name)
+                if not dry: menu_storage.delete(name)
+                removed += 1
+
+        if not dry: bump_revision()
+        prefix = '[DRY RUN] ' if dry else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{len(groups)} ảnh khác nhau, xoá {removed} file ({freed / 1024 / 1024:.1f} MB), trỏ lại {moved} món.'))
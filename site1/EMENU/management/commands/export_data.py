@@ -0,0 +1,30 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from EMENU import analytics, exports
+
+
+class Command(BaseCommand):
+    help = 'Xuất doanh thu / đơn / dòng món ra CSV, XLSX hoặc JSON theo cột (stream theo trang, RAM không tăng theo số dòng)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(exports.DATASETS))
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='csv')
+        parser.add_argument('--from', dest='start', help='Từ ngày/giờ (YYYY-MM-DD hoặc ISO)')
+        parser.add_argument('--to', dest='end', help='Đến ngày (tính trọn ngày) hoặc giờ ISO')
+        parser.add_argument('--output', '-o', help='File đích (mặc định: tên tự đặt theo dữ liệu và khoảng ngày, "-" = stdout)')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **opts):
+        try:
+            start = analytics.parse_time(opts['start']) if opts['start'] else None
+            end = analytics.parse_time(opts['end'], inclusive_end=True) if opts['end'] else None
+        except ValueError as e: raise CommandError(e)
+        body = exports.stream(opts['dataset'], opts['format'], start, end, opts['chunk_size'])
+        path = opts['output'] or exports.filename(opts['dataset'], opts['format'], start, end)
+        if path == '-':
+            for part in body: sys.stdout.buffer.write(part)
+            sys.stdout.buffer.flush(); return
+        size = 0
+        with open(path, 'wb') as f:
+            for part in body: f.write(part); size += len(part)
+        self.stdout.write(self.style.SUCCESS(f'Đã xuất {opts["dataset"]} ra {path} ({size} bytes).'))
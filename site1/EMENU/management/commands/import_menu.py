@@ -0,0 +1,94 @@
+import csv, json, os, time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from EMENU.menu_cache import bump_revision
+from EMENU.models import Category, Item
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Đọc từng phần tử của mảng JSON lớn mà không nạp cả file vào bộ nhớ"""
+    decoder, buf, eof = json.JSONDecoder(), '', False
+    while not buf.strip():
+        data = f.read(chunk_size)
+        if not data: return
+        buf += data
+    buf = buf.lstrip()
+    if buf[0] != '[': raise CommandError('File JSON phải là một mảng các món')
+    buf = buf[1:]
+    while True:
+        buf = buf.lstrip()
+        if buf[:1] == ']': return
+        if buf[:1] == ',': buf = buf[1:]; continue
+        try:
+            if not buf: raise json.JSONDecodeError('hết dữ liệu', buf, 0)
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            if eof: raise CommandError('File JSON không hợp lệ')
+            data = f.read(chunk_size)
+            eof = not data; buf += data
+            continue
+        yield obj
+        buf = buf[end:]
+
+def iter_rows(path, fmt):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv': rows = csv.DictReader(f)
+        elif fmt == 'ndjson': rows = (json.loads(line) for line in f if line.strip())
+        else: rows = iter_json_array(f)
+        for r in rows:
+            # Chấp nhận cả khoá tiếng Việt (menu.json) lẫn tiếng Anh
+            name = str(r.get('ten_mon') or r.get('name') or '').strip()
+            if not name: continue
+            yield str(r.get('phan_loai') or r.get('category') or 'Khác').strip(), name, int(r.get('gia') or r.get('price') or 0)
+
+
+class Command(BaseCommand):
+    help = 'Nạp menu từ JSON/NDJSON/CSV: upsert theo (danh mục, tên món) theo lô, trong 1 transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='menu.json')
+        parser.add_argument('--format', choices=['auto', 'json', 'ndjson', 'csv'], default='auto')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--keep-missing', action='store_true', help='Không xoá món không có trong file')
+
+    def handle(self, *args, **opts):
+        path, fmt = opts['path'], opts['format']
+        if not os.path.exists(path): raise CommandError(f'Không tìm thấy file {path}')
+        if fmt == 'auto':
+            fmt = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}.get(os.path.splitext(path)[1].lower(), 'json')
+
+        started = time.perf_counter()
+        # Cả lần nạp là 1 transaction: khách vẫn thấy menu cũ đến khi commit, không có lúc menu trống
+        with transaction.atomic():
+            categories = {c.name: c for c in Category.objects.all()}
+            existing = set(Item.objects.values_list('category_id', 'name'))
+            seen, batch, file_categories = set(), {}, set()
+
+            # MySQL (ON DUPLICATE KEY UPDATE) không nhận cột đích, tự dùng ràng buộc unique (category, name)
+            target = {'unique_fields': ['category', 'name']} if connection.features.supports_update_conflicts_with_target else {}
+
+            def flush():
+                Item.objects.bulk_create(batch.values(), update_conflicts=True, update_fields=['price'], **target)
+                batch.clear()
+
+            for cat_name, name, price in iter_rows(path, fmt):
+                if cat_name not in categories: categories[cat_name] = Category.objects.create(name=cat_name)
+                file_categories.add(cat_name)
+                key = (categories[cat_name].id, name)
+                seen.add(key)
+                batch[key] = Item(category=categories[cat_name], name=name, price=price)
+                if len(batch) >= opts['batch_size']: flush()
+            if batch: flush()
+
+            removed = 0
+            if not opts['keep_missing']:
+                stale = [pk for pk, cid, name in Item.objects.values_list('id', 'category_id', 'name') if (cid, name) not in seen]
+                for i in range(0, len(stale), opts['batch_size']):
+                    removed += Item.objects.filter(pk__in=stale[i:i + opts['batch_size']]).delete()[1].get('EMENU.Item', 0)
+                Category.objects.filter(items__isnull=True).exclude(name__in=file_categories).delete()
+            transaction.on_commit(bump_revision)
+
+        added = len(seen - existing)
+        self.stdout.write(self.style.SUCCESS(
+            f'Thêm {added}, cập nhật {len(seen) - added}, xoá {removed} món '
+            f'({len(file_categories)} danh mục) trong {time.perf_counter() - started:.2f}s.'))
@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from EMENU import reservations
+
+
+class Command(BaseCommand):
+    help = 'Trả các bàn đặt trước đã quá hạn (1 lần, hoặc lặp với --loop cho cron/systemd)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục')
+        parser.add_argument('--interval', type=float, default=reservations.SWEEP_INTERVAL, help='Số giây giữa 2 lần quét')
+
+    def handle(self, *args, **opts):
+        while True:
+            close_old_connections()
+            ids = reservations.sweep()
+            if ids or not opts['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Đã trả {len(ids)} bàn đặt trước quá hạn.'))
+            if not opts['loop']: return
+            time.sleep(opts['interval'])
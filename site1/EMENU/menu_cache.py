@@ -0,0 +1,44 @@
+import hashlib
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+from .caching import menu
+
+# Menu đổi vài lần/ngày nhưng bị đọc hàng nghìn lần/giờ:
+# JSON được render 1 lần cho mỗi revision rồi phục vụ nguyên bytes từ cache (LRU trong RAM -> cache dùng chung, xem caching.py).
+
+def bump_revision(**kwargs):
+    """Gọi mỗi khi Item/Category thay đổi (nối vào signal trong signals.py); mọi worker bỏ snapshot cũ"""
+    menu.invalidate()
+
+def _snapshot(data):
+    body = JSONRenderer().render(data)
+    return f'"{hashlib.md5(body).hexdigest()}"', body
+
+def snapshot_response(request, variant, build):
+    """Trả về snapshot `variant` của menu; `build()` chỉ chạy khi revision hiện tại chưa có snapshot"""
+    return _respond(request, menu.get_or_set(variant, lambda: _snapshot(build())))
+
+async def asnapshot_response(request, variant, abuild):
+    """Bản async của snapshot_response cho view ASGI; `abuild` là coroutine function.
+    Trúng LRU trong RAM thì trả ngay, không nhảy thread; ngược lại đọc cache dùng chung trong 1 lần nhảy thread
+    (thread_sensitive=False: không xếp hàng sau các query ORM)"""
+    snap = menu.local(variant)
+    if snap is None:
+        gen, snap = await sync_to_async(menu.lookup, thread_sensitive=False)(variant)
+    if snap is None:
+        snap = _snapshot(await abuild())
+        await sync_to_async(menu.set, thread_sensitive=False)(variant, snap, gen=gen)
+    return _respond(request, snap)
+
+def _respond(request, snap):
+    etag, body = snap
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (etag in parse_etags(if_none_match) or f'W/{etag}' in parse_etags(if_none_match)):
+        res = HttpResponseNotModified()
+    else:
+        res = HttpResponse(body, content_type='application/json')
+    res['ETag'] = etag
+    res['Cache-Control'] = 'no-cache'  # Bắt trình duyệt hỏi lại mỗi lần -> nhận 304 nếu menu chưa đổi
+    return res
@@ -0,0 +1,65 @@
+import json, logging, time
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('EMENU.metrics')
+
+
+class RequestMetricsMiddleware:
+    """Đo từng request: số query, tổng thời gian DB, thời gian render (JSON) và kích thước response.
+    Trả về qua header Server-Timing (xem trong tab Network của trình duyệt), ghi 1 dòng JSON vào logger
+    'EMENU.metrics' và cảnh báo khi endpoint vượt ngân sách query. Chỉ bật khi EMENU_METRICS = True."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'EMENU_METRICS', False): raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budget = getattr(settings, 'EMENU_QUERY_BUDGET', 20)
+        # Ngân sách riêng theo tên URL, vd. {'get_menu_data': 2, 'create_order': 12}
+        self.budgets = getattr(settings, 'EMENU_QUERY_BUDGETS', {})
+
+    def __call__(self, request):
+        stats = request._emenu_metrics = {'queries': 0, 'db': 0.0, 'render': 0.0}
+
+        def track(execute, sql, params, many, context):
+            t = time.perf_counter()
+            try: return execute(sql, params, many, context)
+            finally:
+                stats['queries'] += 1; stats['db'] += time.perf_counter() - t
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all(): stack.enter_context(conn.execute_wrapper(track))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        self.report(request, response, stats, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Response của DRF được render (JSON) sau view -> đo riêng phần này
+        stats, t = request._emenu_metrics, time.perf_counter()
+        def done(rendered):
+            stats['render'] += time.perf_counter() - t
+        response.add_post_render_callback(done)
+        return response
+
+    def report(self, request, response, stats, total):
+        match = request.resolver_match
+        endpoint = (match.url_name or match.view_name) if match else request.path
+        size = None if response.streaming else len(response.content)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats["db"] * 1000:.1f};desc="{stats["queries"]} queries"',
+            f'render;dur={stats["render"] * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        response['Timing-Allow-Origin'] = '*'
+        logger.info(json.dumps({
+            'method': request.method, 'path': request.path, 'endpoint': endpoint, 'status': response.status_code,
+            'queries': stats['queries'], 'db_ms': round(stats['db'] * 1000, 2), 'render_ms': round(stats['render'] * 1000, 2),
+            'total_ms': round(total * 1000, 2), 'bytes': size,
+        }, ensure_ascii=False))
+        budget = self.budgets.get(endpoint, self.budget)
+        if budget is not None and stats['queries'] > budget:
+            logger.warning("Vượt ngân sách query: %s %s chạy %d query (ngân sách %d)",
+                           request.method, endpoint, stats['queries'], budget)
@@ -1,3 +1,4 @@
 from .core import Category, Item
 from .order import Table, Order, OrderItem
-from .manage import Revenue, Booking, Notification
\ No newline at end of file
+from .manage import Revenue, DailyRevenue, Booking, Notification
+from .archive import ArchivedOrder, ArchivedOrderItem, ArchivedRevenue
\ No newline at end of file
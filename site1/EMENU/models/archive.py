@@ -0,0 +1,42 @@
+from django.db import models
+
+# Đơn đã thanh toán lâu ngày được chuyển sang đây (xem EMENU/archive.py) để bảng orders / order_items / revenues
+# chỉ còn dữ liệu đang dùng. Giữ nguyên khoá chính cũ, chép sẵn tên bàn / tên món / giá lúc lưu trữ
+# nên không phụ thuộc vào bàn, món hiện tại (món bị xoá hay đổi giá thì lịch sử vẫn đúng).
+
+class ArchivedOrder(models.Model):
+    id_donhang = models.IntegerField(primary_key=True)
+    table_id = models.IntegerField(db_column='id_ban')
+    table_number = models.CharField(max_length=50, db_column='so_ban')
+    total = models.IntegerField(db_column='tong_tien', default=0)
+    status = models.CharField(max_length=20, db_column='trang_thai_tt', default='paid')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True, db_column='thoi_gian_luu_tru')
+    class Meta:
+        db_table = 'orders_archive'
+        indexes = [models.Index(fields=['created_at'], name='idx_order_arch_created')]
+
+class ArchivedOrderItem(models.Model):
+    id_chitiet = models.IntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items', db_column='id_donhang')
+    item_id = models.IntegerField(db_column='id_mon')
+    item_name = models.CharField(max_length=255, db_column='ten_mon')
+    category_id = models.IntegerField(db_column='id_danhmuc')
+    category_name = models.CharField(max_length=100, db_column='ten_danhmuc')
+    price = models.IntegerField(db_column='gia')
+    quantity = models.IntegerField(db_column='so_luong', default=1)
+    note = models.TextField(db_column='ghi_chu', null=True, blank=True)
+    is_served = models.BooleanField(db_column='da_ra_mon', default=True)
+    class Meta:
+        db_table = 'order_lines_archive'
+        indexes = [models.Index(fields=['item_id'], name='idx_orderline_arch_item')]  # Món bán chạy
+
+class ArchivedRevenue(models.Model):
+    id = models.IntegerField(primary_key=True, db_column='id_tt')
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='revenues', db_column='id_donhang')
+    method = models.CharField(max_length=20, db_column='phuong_thuc')
+    amount = models.IntegerField(default=0, db_column='so_tien')
+    paid_at = models.DateTimeField(db_column='thoi_gian_tt')
+    class Meta:
+        db_table = 'revenues_archive'
+        indexes = [models.Index(fields=['paid_at', 'method'], name='idx_revenue_arch_paid_method')]
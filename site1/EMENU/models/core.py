@@ -1,4 +1,5 @@
 from django.db import models
+from ..storage import menu_storage
 
 class Category(models.Model):
     id = models.AutoField(primary_key=True, db_column='id_danhmuc')
@@ -11,6 +12,15 @@ class Item(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, db_column='id_danhmuc', related_name='items')
     name = models.CharField(max_length=255, db_column='ten_mon')
     price = models.IntegerField(db_column='gia')
-    image = models.ImageField(upload_to='menu/', null=True, blank=True, db_column='hinh_anh')
-    class Meta: db_table = 'items'; verbose_name = 'Món ăn'
+    image = models.ImageField(upload_to='menu/', storage=menu_storage, null=True, blank=True, db_column='hinh_anh')
+    # SHA-256 của ảnh gốc, dùng để đặt tên ảnh dẫn xuất (thumb/card/detail) - xem images.py
+    image_hash = models.CharField(max_length=64, blank=True, default='', db_column='hinh_anh_hash')
+    # Ảnh gửi dạng link được tải nền (remote_images.py): pending -> ready/failed
+    IMAGE_STATUS_CHOICES = [('ready', 'Sẵn sàng'), ('pending', 'Đang tải'), ('failed', 'Lỗi tải')]
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default='ready', db_column='trang_thai_anh')
+    image_source = models.CharField(max_length=500, blank=True, default='', db_column='nguon_anh')
+    class Meta:
+        db_table = 'items'; verbose_name = 'Món ăn'
+        # Khoá tự nhiên khi nạp menu (import_menu upsert theo cặp này)
+        constraints = [models.UniqueConstraint(fields=['category', 'name'], name='uniq_item_category_name')]
     def __str__(self): return self.name
\ No newline at end of file
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from .order import Order, Table
 
 class Revenue(models.Model):
@@ -8,7 +8,30 @@ class Revenue(models.Model):
     method = models.CharField(max_length=20, choices=METHOD_CHOICES, db_column='phuong_thuc')
     amount = models.IntegerField(default=0, db_column='so_tien')
     paid_at = models.DateTimeField(auto_now_add=True, db_column='thoi_gian_tt')
-    class Meta: db_table = 'revenues'
+    class Meta:
+        db_table = 'revenues'
+        # Lọc theo khoảng thời gian (paid_at >= ... AND paid_at < ...) rồi gom theo phương thức
+        indexes = [models.Index(fields=['paid_at', 'method'], name='idx_revenue_paid_method')]
+
+class DailyRevenue(models.Model):
+    """Bảng tổng hợp doanh thu theo ngày x phương thức, cập nhật dần khi Revenue được thêm / sửa / xoá (signals.py)"""
+    day = models.DateField(db_column='ngay')
+    method = models.CharField(max_length=20, db_column='phuong_thuc')
+    total = models.BigIntegerField(default=0, db_column='tong_tien')
+    count = models.IntegerField(default=0, db_column='so_don')
+    class Meta:
+        db_table = 'revenue_daily'
+        constraints = [models.UniqueConstraint(fields=['day', 'method'], name='uniq_revenue_daily_day_method')]
+
+    @classmethod
+    def add(cls, day, method, amount, count=1):
+        inc = {'total': models.F('total') + amount, 'count': models.F('count') + count}
+        if cls.objects.filter(day=day, method=method).update(**inc): return
+        try:
+            with transaction.atomic(): cls.objects.create(day=day, method=method, total=amount, count=count)
+        except IntegrityError:
+            # Request khác vừa tạo dòng của ngày này -> cộng dồn vào đó
+            cls.objects.filter(day=day, method=method).update(**inc)
 
 class Booking(models.Model):
     STATUS_CHOICES = [('pending', 'Chờ xử lý'), ('confirmed', 'Đã xác nhận')]
@@ -20,10 +43,16 @@ class Booking(models.Model):
     note = models.TextField(null=True, blank=True, db_column='ghi_chu')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_column='trang_thai')
     created_at = models.DateTimeField(auto_now_add=True)
-    class Meta: db_table = 'bookings'; ordering = ['-created_at']
+    class Meta:
+        db_table = 'bookings'; ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'], name='idx_booking_status_created')]
 
 class Notification(models.Model):
     table = models.ForeignKey(Table, on_delete=models.CASCADE, null=True)
     message = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
-    is_read = models.BooleanField(default=False)
\ No newline at end of file
+    is_read = models.BooleanField(default=False)
+    class Meta:
+        indexes = [models.Index(fields=['table', 'is_read', 'created_at'], name='idx_noti_table_read_created'),
+                   # Dọn thông báo cũ theo lô (archive.purge_notifications)
+                   models.Index(fields=['created_at'], name='idx_noti_created')]
\ No newline at end of file
@@ -1,6 +1,37 @@
+import time
 from django.db import models
 from django.utils import timezone
 from .core import Item
+from .. import caching
+
+def next_version(current=0):
+    """Phiên bản kế tiếp của đơn: tăng dần và theo mili-giây, nên đơn mới của bàn luôn có phiên bản
+    lớn hơn đơn cũ (client giữ ?since= qua lần thanh toán vẫn đúng)"""
+    return max(current + 1, int(time.time() * 1000))
+
+class TableQuerySet(models.QuerySet):
+    def with_open_order(self):
+        """Gắn tổng tiền + giờ mở của đơn đang mở mới nhất vào từng bàn (subquery, không query theo từng dòng)"""
+        latest = Order.objects.open().filter(table=models.OuterRef('pk')).order_by('-id_donhang')
+        return self.annotate(open_order_total=models.Subquery(latest.values('total')[:1]),
+                             open_order_created_at=models.Subquery(latest.values('created_at')[:1]))
+
+    def release_expired(self, now=None):
+        """Trả các bàn đặt trước đã quá hạn về 'available' bằng 1 câu UPDATE, trả về id các bàn vừa được trả"""
+        # Bàn đã có đơn mở (khách đã tới gọi món) thì không trả, kể cả khi trạng thái còn 'reserved'
+        expired = self.filter(status='reserved', expires_at__lte=now or timezone.now()).exclude(
+            models.Exists(Order.objects.open().filter(table=models.OuterRef('pk'))))
+        ids = list(expired.values_list('id', flat=True))
+        # UPDATE lặp lại điều kiện: bàn vừa chuyển sang 'occupied' giữa 2 câu sẽ không bị trả nhầm
+        if ids:
+            expired.filter(pk__in=ids).update(status='available', reserved_at=None, expires_at=None)
+            caching.changed('tables')
+        return ids
+
+class OrderQuerySet(models.QuerySet):
+    def open(self):
+        """Đơn chưa thanh toán, chưa hủy"""
+        return self.exclude(status__in=['paid', 'cancelled'])
 
 class Table(models.Model):
     STATUS_CHOICES = [('available', 'Trống'), ('reserved', 'Đã đặt'), ('occupied', 'Đang dùng')]
@@ -9,13 +40,11 @@ class Table(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available', db_column='trang_thai')
     reserved_at = models.DateTimeField(null=True, blank=True, db_column='thoi_gian_dat')
     expires_at = models.DateTimeField(null=True, blank=True, db_column='thoi_gian_het_han')
-    class Meta: db_table = 'tables'
-    
-    def check_expired(self):
-        if self.status == 'reserved' and self.expires_at and timezone.now() > self.expires_at:
-            self.status = 'available'; self.reserved_at = None; self.expires_at = None; self.save()
-            return True
-        return False
+    objects = TableQuerySet.as_manager()
+    class Meta:
+        db_table = 'tables'
+        # Quét bàn đặt trước hết hạn: WHERE trang_thai = 'reserved' AND thoi_gian_het_han <= now
+        indexes = [models.Index(fields=['status', 'expires_at'], name='idx_table_status_expires')]
 
 class Order(models.Model):
     id_donhang = models.AutoField(primary_key=True)
@@ -23,7 +52,15 @@ class Order(models.Model):
     total = models.IntegerField(db_column='tong_tien', default=0)
     status = models.CharField(max_length=20, db_column='trang_thai_tt', default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
-    class Meta: db_table = 'orders'
+    # Tăng mỗi lần đơn đổi (gọi thêm món, ra món, thanh toán) - dùng cho ?since= của get_order_by_table
+    version = models.BigIntegerField(default=0, db_column='phien_ban')
+    objects = OrderQuerySet.as_manager()
+    class Meta:
+        db_table = 'orders'
+        # Tìm đơn mở mới nhất của bàn: WHERE id_ban = ? AND trang_thai_tt ... ORDER BY id_donhang DESC
+        indexes = [models.Index(fields=['table', 'status'], name='idx_order_table_status'),
+                   # Lưu trữ đơn cũ: WHERE trang_thai_tt = 'paid' AND created_at < ... (archive.py)
+                   models.Index(fields=['status', 'created_at'], name='idx_order_status_created')]
 
 class OrderItem(models.Model):
     id_chitiet = models.AutoField(primary_key=True)
@@ -32,4 +69,10 @@ class OrderItem(models.Model):
     quantity = models.IntegerField(db_column='so_luong', default=1)
     note = models.TextField(db_column='ghi_chu', null=True, blank=True)
     is_served = models.BooleanField(db_column='da_ra_mon', default=False)
-    class Meta: db_table = 'order_items'
\ No newline at end of file
+    version = models.BigIntegerField(default=0, db_column='phien_ban')  # = Order.version lúc dòng này đổi lần cuối
+    class Meta:
+        db_table = 'order_items'
+        # Gộp món vào dòng chưa ra món (create_order)
+        indexes = [models.Index(fields=['order', 'item', 'is_served'], name='idx_orderitem_order_item_srv'),
+                   # Hàng chờ bếp: WHERE da_ra_mon = 0 ... ORDER BY id_mon (số dòng chưa ra luôn nhỏ)
+                   models.Index(fields=['is_served', 'item'], name='idx_orderitem_served_item')]
\ No newline at end of file
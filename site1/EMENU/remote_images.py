@@ -0,0 +1,70 @@
+import io, logging, mimetypes, os, threading, uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import Image
+from .menu_cache import bump_revision
+from .models import Item
+
+logger = logging.getLogger(__name__)
+
+# Tải ảnh từ link ngoài bằng worker nền: request lưu món trả về ngay với image_status='pending'
+MAX_BYTES = getattr(settings, 'EMENU_REMOTE_IMAGE_MAX_BYTES', 5 * 1024 * 1024)
+TIMEOUT = getattr(settings, 'EMENU_REMOTE_IMAGE_TIMEOUT', 10)
+WORKERS = getattr(settings, 'EMENU_REMOTE_IMAGE_WORKERS', 4)
+
+RemoteImage = namedtuple('RemoteImage', 'url')
+
+class RemoteImageError(Exception):
+    pass
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+def download(url, max_bytes=MAX_BYTES, timeout=TIMEOUT):
+    """Tải ảnh dạng stream, dừng ngay khi vượt max_bytes hoặc không phải image/*"""
+    with requests.get(url, stream=True, timeout=timeout) as res:
+        if res.status_code != 200: raise RemoteImageError(f"Lỗi link: {res.status_code}")
+        ctype = res.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if not ctype.startswith('image/'): raise RemoteImageError(f"Link không phải ảnh ({ctype or 'không rõ'})")
+        if int(res.headers.get('Content-Length') or 0) > max_bytes: raise RemoteImageError("Ảnh quá lớn")
+        buf = bytearray()
+        for chunk in res.iter_content(64 * 1024):
+            buf += chunk
+            if len(buf) > max_bytes: raise RemoteImageError("Ảnh quá lớn")
+    name = os.path.basename(urlparse(url).path)
+    if not os.path.splitext(name)[1]: name = f"{uuid.uuid4()}{mimetypes.guess_extension(ctype) or '.jpg'}"
+    return ContentFile(bytes(buf), name=name)
+
+def fetch_item_image(item_id, url):
+    """Chạy trong worker: tải ảnh rồi gắn vào món nếu món vẫn đang chờ đúng link này"""
+    try:
+        content = download(url)
+        Image.open(io.BytesIO(content.read())).verify(); content.seek(0)
+        item = Item.objects.filter(pk=item_id, image_source=url, image_status='pending').first()
+        if item:
+            item.image = content; item.image_status = 'ready'; item.save()
+    except Exception as e:
+        logger.warning("Không tải được ảnh %s cho món %s: %s", url, item_id, e)
+        if Item.objects.filter(pk=item_id, image_source=url, image_status='pending').update(image_status='failed'):
+            bump_revision()
+    finally:
+        connection.close()  # Mỗi thread worker có kết nối DB riêng
+
+def schedule(item_id, url):
+    global _executor
+    with _lock:
+        if _executor is None: _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='emenu-image')
+        future = _executor.submit(fetch_item_image, item_id, url)
+        _pending.add(future)
+    future.add_done_callback(_pending.discard)
+    return future
+
+def drain(timeout=None):
+    """Chờ các lượt tải đang chạy xong (dùng cho test/lệnh quản trị)"""
+    wait(list(_pending), timeout)
@@ -0,0 +1,39 @@
+import logging, threading, time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .events import broker
+from .models import Table
+
+logger = logging.getLogger(__name__)
+
+# Bàn đặt trước tự trả lại sau TTL giây nếu khách không tới (bàn chuyển 'occupied' khi gọi món)
+RESERVATION_TTL = getattr(settings, 'EMENU_RESERVATION_TTL', 15 * 60)
+SWEEP_INTERVAL = getattr(settings, 'EMENU_RESERVATION_SWEEP_SECONDS', 30)
+
+_lock = threading.Lock()
+_last_sweep = 0.0
+
+def expires_at(now=None):
+    return (now or timezone.now()) + timedelta(seconds=RESERVATION_TTL)
+
+def sweep(now=None):
+    """Trả các bàn hết hạn rồi đẩy trạng thái mới của chúng tới client đang nghe (sự kiện 'table')"""
+    from .serializers import TableSerializer
+    ids = Table.objects.release_expired(now)
+    if ids:
+        for table in Table.objects.with_open_order().filter(pk__in=ids):
+            broker.publish('table', TableSerializer(table).data)
+        logger.info("Đã trả %d bàn đặt trước quá hạn: %s", len(ids), ids)
+    return ids
+
+def maybe_sweep():
+    """Quét tối đa 1 lần mỗi SWEEP_INTERVAL giây trong tiến trình này (gọi từ request / vòng lặp SSE)"""
+    global _last_sweep
+    with _lock:
+        if time.monotonic() - _last_sweep < SWEEP_INTERVAL: return []
+        _last_sweep = time.monotonic()
+    try: return sweep()
+    except Exception:
+        logger.exception("Lỗi khi quét bàn đặt trước")
+        return []
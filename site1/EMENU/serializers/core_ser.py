@@ -1,21 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db import transaction
 from ..models import Category, Item
-import base64, uuid, os, requests
+import base64, uuid
 from django.core.files.base import ContentFile
-from urllib.parse import urlparse
+from ..images import derivative_urls
+from ..remote_images import RemoteImage, schedule as schedule_image_fetch
 
 class FlexibleImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('http'):
-            try:
-                response = requests.get(data, timeout=10)
-                if response.status_code == 200:
-                    parsed = urlparse(data)
-                    file_name = os.path.basename(parsed.path) or f"{uuid.uuid4()}.jpg"
-                    data = ContentFile(response.content, name=file_name)
-                else: raise serializers.ValidationError(f"Lỗi link: {response.status_code}")
-            except Exception as e: raise serializers.ValidationError(str(e))
+            # Không tải trong request: trả về link để ProductFormSerializer giao cho worker nền
+            if not data.startswith(('http://', 'https://')): raise serializers.ValidationError("Link ảnh không hợp lệ")
+            return RemoteImage(data)
         elif isinstance(data, str) and 'data:' in data and ';base64,' in data:
             try:
                 header, img_str = data.split(';base64,')
@@ -41,10 +38,11 @@ class CategorySerializer(serializers.ModelSerializer):
 class ItemSerializer(serializers.ModelSerializer):
     category_name = serializers.SerializerMethodField()
     img = serializers.SerializerMethodField() 
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Item
-        fields = ['id', 'name', 'price', 'category_name', 'img', 'category']
+        fields = ['id', 'name', 'price', 'category_name', 'img', 'images', 'image_status', 'category']
 
     def get_category_name(self, obj):
         return obj.category.name if obj.category else "Khác"
@@ -57,10 +55,33 @@ class ItemSerializer(serializers.ModelSerializer):
                 return obj.image.url 
         except: pass
         return ""
+
+    def get_images(self, obj):
+        # Ảnh dẫn xuất thumb/card/detail (+ _webp), cùng kiểu link tương đối như img
+        return derivative_urls(obj.image_hash, obj.image.name) if obj.image else {}
 class ProductFormSerializer(serializers.ModelSerializer):
     category = serializers.CharField()
     image = FlexibleImageField(required=False, allow_null=True)
-    class Meta: model = Item; fields = ['id', 'name', 'price', 'category', 'image']
+    class Meta: model = Item; fields = ['id', 'name', 'price', 'category', 'image', 'image_status']; read_only_fields = ['image_status']
+
+    def _take_remote(self, data):
+        if isinstance(data.get('image'), RemoteImage):
+            url = data.pop('image').url
+            data.update(image_status='pending', image_source=url)
+            return url
+        if 'image' in data: data.update(image_status='ready', image_source='')
+
+    def _schedule(self, item, url):
+        if url: transaction.on_commit(lambda: schedule_image_fetch(item.pk, url))
+        return item
+
+    def create(self, validated_data):
+        url = self._take_remote(validated_data)
+        return self._schedule(super().create(validated_data), url)
+
+    def update(self, instance, validated_data):
+        url = self._take_remote(validated_data)
+        return self._schedule(super().update(instance, validated_data), url)
     def validate_category(self, value):
         if str(value).isdigit():
             try: return Category.objects.get(id=int(value))
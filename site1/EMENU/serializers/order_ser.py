@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.utils import timezone
 from ..models import Order, OrderItem, Table
+from ..images import derivative_urls
 
 class OrderItemSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='id_chitiet', read_only=True)
@@ -35,25 +36,30 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta: 
         model = Order
-        fields = ['id', 'tableId', 'tableNumber', 'total', 'status', 'createdAt', 'items']
+        fields = ['id', 'tableId', 'tableNumber', 'total', 'status', 'version', 'createdAt', 'items']
 
     # 👇 HÀM MỚI: Tự động cộng dồn các món giống nhau
     def get_items(self, obj):
         all_items = obj.items.all()
         grouped = {} # Dictionary để gom nhóm: { product_id: {data...} }
+        # ?since=: chỉ dựng lại các món có dòng đổi sau phiên bản client đang có
+        since = self.context.get('since')
+        changed = None if since is None else {i.item_id for i in all_items if i.version > since}
         
         for item in all_items:
             pid = item.item.id
+            if changed is not None and pid not in changed: continue
             
             # Nếu món này chưa có trong danh sách gộp -> Thêm mới
             if pid not in grouped:
                 # Lấy link ảnh
-                img_url = ""
+                img_url, images = "", {}
                 try:
                     if item.item.image:
                         req = self.context.get('request')
                         if req: img_url = req.build_absolute_uri(item.item.image.url)
                         else: img_url = item.item.image.url
+                        images = derivative_urls(item.item.image_hash, item.item.image.name, req)
                 except: pass
 
                 grouped[pid] = {
@@ -64,7 +70,8 @@ class OrderSerializer(serializers.ModelSerializer):
                     'quantity': item.quantity, # Khởi tạo số lượng
                     'note': item.note,
                     'isServed': item.is_served,
-                    'image': img_url
+                    'image': img_url,
+                    'images': images
                 }
             else:
                 # Nếu món này đã có -> CỘNG DỒN SỐ LƯỢNG
@@ -84,14 +91,23 @@ class TableSerializer(serializers.ModelSerializer):
     current_order_total = serializers.SerializerMethodField()
     duration = serializers.SerializerMethodField()
     class Meta: model = Table; fields = '__all__'
+
+    def _open_order(self, obj):
+        # Danh sách bàn đã được gắn sẵn qua Table.objects.with_open_order() -> không query thêm
+        if not hasattr(obj, 'open_order_total'):
+            order = Order.objects.open().filter(table=obj).order_by('-id_donhang').only('total', 'created_at').first()
+            obj.open_order_total = order.total if order else None
+            obj.open_order_created_at = order.created_at if order else None
+        return obj.open_order_total, obj.open_order_created_at
+
     def get_current_order_total(self, obj):
-        order = Order.objects.filter(table=obj, status='pending').last()
-        return order.total if order else 0
+        total, _ = self._open_order(obj)
+        return total or 0
     def get_duration(self, obj):
-        order = Order.objects.filter(table=obj, status='pending').last()
-        if order:
-            delta = timezone.now() - order.created_at
+        _, created_at = self._open_order(obj)
+        if created_at:
+            delta = timezone.now() - created_at
             m = int(delta.total_seconds()) // 60
             h = m // 60
             return f"{h}h {m%60}p" if h > 0 else f"{m}p"
-        return ""
\ No newline at end of file
+        return ""
@@ -0,0 +1,89 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from .models import Booking, Category, Item, Order, Revenue, DailyRevenue, Table
+from . import analytics, caching
+from .menu_cache import bump_revision
+from .analytics import invalidate as invalidate_analytics
+from .images import build_derivatives, derivative_names
+from .storage import menu_storage
+
+# Mọi thay đổi menu đều làm snapshot cũ hết hiệu lực
+for model in (Category, Item):
+    post_save.connect(bump_revision, sender=model, dispatch_uid=f'menu_rev_save_{model.__name__}')
+    post_delete.connect(bump_revision, sender=model, dispatch_uid=f'menu_rev_delete_{model.__name__}')
+
+# Bàn / đơn đổi -> danh sách bàn và dashboard cũ; món đổi tên, ảnh -> món bán chạy trên dashboard
+CACHE_DEPENDENCIES = {Table: ('tables',), Order: ('tables', 'dashboard'), Revenue: ('dashboard',),
+                      Booking: ('dashboard',), Item: ('dashboard',)}
+
+def invalidate_cache(sender, **kwargs):
+    caching.changed(*CACHE_DEPENDENCIES[sender])
+
+for model in CACHE_DEPENDENCIES:
+    post_save.connect(invalidate_cache, sender=model, dispatch_uid=f'cache_save_{model.__name__}')
+    post_delete.connect(invalidate_cache, sender=model, dispatch_uid=f'cache_delete_{model.__name__}')
+
+# Bảng tổng hợp theo ngày đi theo mọi thay đổi của Revenue qua save()/delete(): sửa = trừ bản cũ + cộng bản mới.
+# QuerySet.update() / xoá bằng SQL không phát signal -> chạy lại `manage.py backfill_revenue_rollups`
+def remember_revenue(sender, instance, raw=False, **kwargs):
+    instance._old_rollup = None if raw or instance.pk is None else \
+        Revenue.objects.filter(pk=instance.pk).values_list('paid_at', 'method', 'amount').first()
+
+def rollup_revenue(sender, instance, created, raw=False, **kwargs):
+    if raw: return
+    old, new = getattr(instance, '_old_rollup', None), (instance.paid_at, instance.method, instance.amount)
+    instance._old_rollup = None
+    if not created and old:
+        if (old[0].date(), old[1], old[2]) == (new[0].date(), new[1], new[2]): return
+        DailyRevenue.add(old[0].date(), old[1], -old[2], -1)
+    DailyRevenue.add(new[0].date(), new[1], new[2])
+
+def unroll_revenue(sender, instance, **kwargs):
+    # Lưu trữ đơn (archive.py) xoá dòng nhưng doanh thu vẫn còn ở bảng lưu trữ -> không trừ
+    if not analytics.is_paused(): DailyRevenue.add(instance.paid_at.date(), instance.method, -instance.amount, -1)
+
+pre_save.connect(remember_revenue, sender=Revenue, dispatch_uid='revenue_daily_remember')
+post_save.connect(rollup_revenue, sender=Revenue, dispatch_uid='revenue_daily_rollup')
+post_delete.connect(unroll_revenue, sender=Revenue, dispatch_uid='revenue_daily_unroll')
+
+# Doanh thu mới luôn rơi vào khung đang mở; chỉ khi sửa/xoá bản ghi cũ thì kết quả thống kê đã cache mới sai
+def revenue_changed(sender, instance, created=False, **kwargs):
+    if not created: invalidate_analytics()
+
+post_save.connect(revenue_changed, sender=Revenue, dispatch_uid='revenue_analytics_save')
+post_delete.connect(revenue_changed, sender=Revenue, dispatch_uid='revenue_analytics_delete')
+
+# Sinh ảnh dẫn xuất khi ảnh món thay đổi
+def track_image_change(sender, instance, raw=False, **kwargs):
+    if raw: return
+    old = Item.objects.filter(pk=instance.pk).values_list('image', 'image_hash').first() if instance.pk else None
+    instance._old_image = old if old and old[0] != (instance.image.name or '') else None
+    instance._image_changed = instance._old_image is not None or not instance.pk or (bool(instance.image) and not instance.image_hash)
+
+def refresh_derivatives(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, '_image_changed', False): return
+    instance._image_changed = False
+    if getattr(instance, '_old_image', None):
+        release_image(*instance._old_image); instance._old_image = None
+    try: image_hash = build_derivatives(instance.image.name) if instance.image else ''
+    except Exception: image_hash = ''
+    if image_hash != instance.image_hash:
+        instance.image_hash = image_hash
+        Item.objects.filter(pk=instance.pk).update(image_hash=image_hash)
+        bump_revision()
+
+# Ảnh gốc lưu theo hash nội dung và dùng chung giữa các món: chỉ xoá khi không còn món nào trỏ tới
+def release_image(name, image_hash=''):
+    def _release():
+        if not name or Item.objects.filter(image=name).exists(): return
+        menu_storage.delete(name)
+        for derived in derivative_names(image_hash, name).values(): default_storage.delete(derived)
+    transaction.on_commit(_release)
+
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image: release_image(instance.image.name, instance.image_hash)
+
+pre_save.connect(track_image_change, sender=Item, dispatch_uid='item_image_track')
+post_save.connect(refresh_derivatives, sender=Item, dispatch_uid='item_image_derivatives')
+post_delete.connect(release_deleted_image, sender=Item, dispatch_uid='item_image_release')
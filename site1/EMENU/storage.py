@@ -0,0 +1,32 @@
+import hashlib, os
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+# Đuôi file cùng một định dạng gom về một tên để ảnh trùng byte luôn trùng tên
+_EXT_ALIASES = {'.jpeg': '.jpg', '.jpe': '.jpg'}
+
+def content_name(directory, digest, original_name):
+    ext = os.path.splitext(original_name or '')[1].lower()
+    return os.path.join(directory, digest + _EXT_ALIASES.get(ext, ext)).replace('\\', '/')
+
+def file_digest(content):
+    h = hashlib.sha256()
+    for chunk in content.chunks(): h.update(chunk)
+    content.seek(0)
+    return h.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Lưu ảnh theo hash nội dung: tên file = <thư mục upload>/<sha256>.<đuôi>.
+    Cùng một ảnh upload nhiều lần chỉ có 1 file trên đĩa; các món dùng chung file đó
+    (số món tham chiếu chính là số tham chiếu, xem signals.release_image)."""
+
+    def save(self, name, content, max_length=None):
+        if name is None: name = content.name
+        if not hasattr(content, 'chunks'): content = File(content, name)
+        name = content_name(os.path.dirname(name), file_digest(content), name)
+        if self.exists(name): return name
+        return super().save(name, content, max_length=max_length)
+
+
+menu_storage = ContentAddressedStorage()
@@ -1,3 +1,1107 @@
-from django.test import TestCase
+import asyncio, csv, io, json, logging, math, os, shutil, tempfile, threading, time, unittest, zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.response import Response
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import Category, Item, Table, Order, OrderItem, Revenue, DailyRevenue, Notification, ArchivedOrder, ArchivedOrderItem, ArchivedRevenue
+from .events import EventBroker, broker
+from . import analytics, caching, exports, geofence, remote_images, reservations
+from .views import async_views
+
+# Tọa độ nằm trong vùng cho phép đặt món
+SHOP_GPS = {'lat': 10.824682, 'lon': 106.720029}
+
+
+class CreateOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name='Nigiri')
+        cls.items = [Item.objects.create(category=cat, name=f'Món {i}', price=1000 * (i + 1)) for i in range(20)]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def submit(self, table, lines):
+        payload = {**SHOP_GPS, 'table_id': table.id, 'items': lines}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post('/api/orders/create/', payload, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        return res, len(ctx.captured_queries)
+
+    def cart(self, items, qty=1):
+        return [{'product_id': i.id, 'quantity': qty} for i in items]
+
+    def test_query_count_independent_of_cart_size(self):
+        _, small = self.submit(Table.objects.create(number='A1'), self.cart(self.items[:1]))
+        _, large = self.submit(Table.objects.create(number='A2'), self.cart(self.items))
+        self.assertEqual(small, large)
+
+    def test_merge_query_count_independent_of_cart_size(self):
+        t1, t2 = Table.objects.create(number='B1'), Table.objects.create(number='B2')
+        self.submit(t1, self.cart(self.items[:1]))
+        self.submit(t2, self.cart(self.items[:10]))
+        # Nửa giỏ cộng dồn vào dòng cũ, nửa còn lại là dòng mới
+        _, small = self.submit(t1, self.cart(self.items[:2]))
+        _, large = self.submit(t2, self.cart(self.items))
+        self.assertEqual(small, large)
+
+    def test_merges_quantities_and_recomputes_total(self):
+        table = Table.objects.create(number='C1')
+        a, b = self.items[0], self.items[1]
+        self.submit(table, [{'product_id': a.id, 'quantity': 2, 'note': 'ít cay'}])
+        res, _ = self.submit(table, [{'product_id': a.id, 'quantity': 1, 'note': 'thêm gừng'},
+                                     {'itemId': b.id, 'quantity': 3}, {'id': b.id, 'quantity': 1}])
+        order = Order.objects.get(table=table)
+        lines = {l.item_id: l for l in OrderItem.objects.filter(order=order)}
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[a.id].quantity, 3)
+        self.assertEqual(lines[a.id].note, 'ít cay, thêm gừng')
+        self.assertEqual(lines[b.id].quantity, 4)
+        self.assertEqual(order.total, 3 * a.price + 4 * b.price)
+        self.assertEqual(res.data['total'], order.total)
+
+    def test_unknown_item_rejected_without_writes(self):
+        table = Table.objects.create(number='D1')
+        res = self.client.post('/api/orders/create/', {**SHOP_GPS, 'table_id': table.id,
+                               'items': [{'product_id': self.items[0].id}, {'product_id': 999999}]}, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(OrderItem.objects.filter(order__table=table).exists())
+
+
+class GeofenceTests(TestCase):
+    SQUARE = [(10.80, 106.60), (10.81, 106.60), (10.81, 106.61), (10.80, 106.61)]
+
+    def test_index_matches_full_scan(self):
+        fences = [geofence.make_fence({'lat': 10.8 + i * 0.003, 'lon': 106.7, 'radius': 100}) for i in range(50)]
+        fences.append(geofence.make_fence({'polygon': self.SQUARE}))
+        index = geofence.GeofenceSet(fences)
+        for lat, lon in [(10.8, 106.7), (10.8045, 106.7), (10.8015, 106.7), (10.805, 106.605), (10.815, 106.605)]:
+            full = [f for f in fences if f.contains(lat, lon)]
+            self.assertEqual(index.find(lat, lon), full[0] if full else None)
+
+    def test_point_just_inside_circle_edge_is_found(self):
+        fence = geofence.make_fence({'lat': 10.8, 'lon': 106.7, 'radius': 150})
+        index = geofence.GeofenceSet([fence])
+        north = 10.8 + math.degrees(149.9 / geofence.EARTH_RADIUS)  # 149.9m về phía bắc
+        self.assertTrue(fence.contains(north, 106.7))
+        self.assertIs(index.find(north, 106.7), fence)
+
+    @override_settings(EMENU_GEOFENCES=[{'name': 'CN2', 'polygon': SQUARE}])
+    def test_create_order_uses_configured_fences(self):
+        table = Table.objects.create(number='G1')
+        item = Item.objects.create(category=Category.objects.create(name='G'), name='G', price=1000)
+        payload = {'table_id': table.id, 'items': [{'id': item.id, 'quantity': 1}]}
+        geofence._log._last.clear()
+        with self.assertLogs('EMENU.geofence', 'INFO') as logs:
+            for _ in range(3):
+                res = self.client.post('/api/orders/create/', {**payload, **SHOP_GPS}, content_type='application/json')
+                self.assertEqual(res.status_code, 403)
+        self.assertEqual(len(logs.records), 1)  # Log bị giới hạn tần suất
+        res = self.client.post('/api/orders/create/', {**payload, 'lat': 10.805, 'lon': 106.605}, content_type='application/json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self.client.post('/api/orders/create/', payload, content_type='application/json').status_code, 400)
+        res = self.client.post('/api/orders/create/', {**payload, 'lat': 'abc', 'lon': 1}, content_type='application/json')
+        self.assertEqual(res.status_code, 400)
+
+
+class MenuSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cat = Category.objects.create(name='Maki')
+        for i in range(10): Item.objects.create(category=cls.cat, name=f'Cuộn {i}', price=50000)
+
+    def setUp(self):
+        caching.clear()
+
+    def test_repeat_loads_hit_snapshot_without_queries(self):
+        for url in ('/api/menu/', '/menu/data/', '/api/items/'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.content, second.content)
+
+    def test_items_snapshot_keeps_pagination_per_page(self):
+        Item.objects.bulk_create([Item(category=self.cat, name=f'Thêm {i}', price=1000) for i in range(50)])
+        first, second = self.client.get('/api/items/').json(), self.client.get('/api/items/?page=2').json()
+        self.assertEqual((first['count'], len(first['results']), len(second['results'])), (60, 50, 10))
+        self.assertIsNone(second['next'])
+        self.assertFalse({i['id'] for i in first['results']} & {i['id'] for i in second['results']})
+
+    def test_get_menu_serializes_categories_in_one_query(self):
+        with self.assertNumQueries(1):
+            res = self.client.get('/api/menu/')
+        self.assertEqual(len(res.json()), 10)
+        self.assertEqual(res.json()[0]['category_name'], 'Maki')
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/menu/')['ETag']
+        res = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_item_and_category_changes_invalidate_snapshot(self):
+        etag = self.client.get('/api/menu/')['ETag']
+        Item.objects.create(category=self.cat, name='Cuộn mới', price=60000)
+        res = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()), 11)
+
+        etag = res['ETag']
+        self.cat.name = 'Maki đặc biệt'; self.cat.save()
+        res = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()[0]['category_name'], 'Maki đặc biệt')
+
+
+class TableListingTests(TestCase):
+    def setUp(self):
+        caching.clear()
+
+    def seed(self, n):
+        start = Table.objects.count()
+        Table.objects.bulk_create([Table(number=f'Bàn {i}') for i in range(start, start + n)])
+        Order.objects.bulk_create([Order(table=t, total=1000 * t.id) for t in Table.objects.filter(order__isnull=True)])
+        caching.invalidate('tables')  # bulk_create không phát signal
+
+    def list_queries(self):
+        reservations.maybe_sweep()  # Chu kỳ quét bàn hết hạn đã chạy -> không tính vào số query
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get('/api/tables/')
+        self.assertEqual(res.status_code, 200)
+        return res, len(ctx.captured_queries)
+
+    def test_query_count_fixed_for_30_and_300_tables(self):
+        self.seed(30)
+        _, small = self.list_queries()
+        self.seed(270)
+        _, large = self.list_queries()
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 2)  # COUNT phân trang + 1 SELECT có subquery
+
+    def test_reports_latest_open_order(self):
+        table = Table.objects.create(number='T1')
+        Order.objects.create(table=table, total=100, status='paid')
+        Order.objects.create(table=table, total=200)
+        Order.objects.create(table=table, total=300)
+        Table.objects.create(number='T2')
+        rows = {r['number']: r for r in self.list_queries()[0].json()['results']}
+        self.assertEqual(rows['T1']['current_order_total'], 300)
+        self.assertEqual(rows['T1']['duration'], '0p')
+        self.assertEqual(rows['T2']['current_order_total'], 0)
+        self.assertEqual(rows['T2']['duration'], '')
+
+
+class OrderListingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name='Sashimi')
+        cls.items = [Item.objects.create(category=cat, name=f'Lát {i}', price=30000) for i in range(5)]
+        cls.table = Table.objects.create(number='K1')
+
+    def seed(self, n):
+        for _ in range(n):
+            order = Order.objects.create(table=self.table)
+            OrderItem.objects.bulk_create([OrderItem(order=order, item=i, quantity=2) for i in self.items])
+
+    def list_queries(self, url='/api/orders/'):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res.json(), len(ctx.captured_queries)
+
+    def test_query_count_fixed_per_page(self):
+        self.seed(3)
+        _, small = self.list_queries()
+        self.seed(60)
+        page, large = self.list_queries()
+        self.assertEqual(small, large)
+        self.assertEqual(large, 3)  # orders+bàn, dòng món, món
+        self.assertEqual(len(page['results']), 50)
+        self.assertEqual(page['results'][0]['items'][0]['quantity'], 2)
+
+    def test_cursor_pagination_walks_all_orders_newest_first(self):
+        self.seed(120)
+        ids, url = [], '/api/orders/?page_size=50'
+        while url:
+            page, _ = self.list_queries(url)
+            ids += [o['id'] for o in page['results']]
+            url = page['next']
+        self.assertEqual(ids, sorted(Order.objects.values_list('id_donhang', flat=True), reverse=True))
+
+    def test_detail_query_count(self):
+        self.seed(1)
+        _, n = self.list_queries(f'/api/orders/{Order.objects.get().pk}/')
+        self.assertEqual(n, 3)
+
+
+class EventStreamTests(TestCase):
+    def test_read_returns_only_events_after_cursor(self):
+        b = EventBroker()
+        first = b.publish('order', {'table_id': 1})
+        b.publish('checkout', {'table_id': 1})
+        b.publish('order', {'table_id': 2})
+        cursor, events = b.read(first['id'])
+        self.assertEqual([e['type'] for e in events], ['checkout', 'order'])
+        self.assertEqual(cursor, b.last_id)
+        self.assertEqual(b.read(cursor), (cursor, []))
+        self.assertEqual([json.loads(e['json']) for e in b.read(first['id'], {'order'})[1]], [{'table_id': 2}])
+
+    def test_stale_cursor_asks_client_to_resync(self):
+        b = EventBroker(size=2)
+        start = b.last_id
+        for i in range(5): b.publish('order', {'i': i})
+        self.assertEqual(b.read(start)[1][0]['type'], 'resync')
+
+    def test_waiters_wake_on_publish(self):
+        b = EventBroker()
+        start = b.last_id
+        threading.Timer(0.05, b.publish, ('order', {})).start()
+        self.assertEqual(len(b.wait(start, 5)[1]), 1)
+
+        async def consume(): return await b.await_events(b.last_id, 5)
+        threading.Timer(0.05, b.publish, ('checkout', {})).start()
+        self.assertEqual(asyncio.run(consume())[1][0]['type'], 'checkout')
+
+    def test_request_payment_is_pushed_to_stream(self):
+        table = Table.objects.create(number='Bàn 9')
+        since = broker.last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/tables/request-payment/', {'table_id': table.id})
+        self.assertEqual(self.client.get(f'/api/notifications/stream/?since={since}').status_code, 401)
+        cashier = APIClient()
+        cashier.force_authenticate(User.objects.create_superuser('cashier', password='x'))
+        token = cashier.get('/api/notifications/stream-token/').json()['token']
+        res = self.client.get(f'/api/notifications/stream/?since={since}&token={token}')
+        self.assertEqual(res['Content-Type'], 'text/event-stream')
+        chunks = iter(res.streaming_content)
+        next(chunks)  # retry:
+        event = next(chunks).decode()
+        self.assertIn('event: payment_request', event)
+        self.assertIn('Bàn 9', event)
+        res.close()
+
+    def test_notifications_since_filter(self):
+        table = Table.objects.create(number='Bàn 10')
+        self.client.post('/api/tables/request-payment/', {'table_id': table.id})
+        last = self.client.get('/api/notifications/').json()[0]['id']
+        self.client.post('/api/tables/request-payment/', {'table_id': table.id})
+        self.assertEqual(len(self.client.get(f'/api/notifications/?since={last}').json()), 1)
+
+
+class KitchenQueueTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Bếp')
+        self.salmon, self.tuna = Item.objects.create(category=cat, name='Salmon', price=1), Item.objects.create(category=cat, name='Tuna', price=1)
+        t1, t2 = Table.objects.create(number='K-1'), Table.objects.create(number='K-2')
+        o1, o2 = Order.objects.create(table=t1), Order.objects.create(table=t2)
+        self.lines = OrderItem.objects.bulk_create([
+            OrderItem(order=o1, item=self.salmon, quantity=2), OrderItem(order=o2, item=self.salmon, quantity=1),
+            OrderItem(order=o2, item=self.tuna, quantity=3), OrderItem(order=o1, item=self.tuna, is_served=True),
+            OrderItem(order=Order.objects.create(table=t1, status='paid'), item=self.tuna)])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('chef', password='x'))
+
+    def test_queue_groups_unserved_lines_in_one_query(self):
+        with self.assertNumQueries(1):
+            items = self.client.get('/api/kitchen/queue/').json()['items']
+        self.assertEqual([(g['name'], g['quantity'], g['tables']) for g in items],
+                         [('Salmon', 3, ['K-1', 'K-2']), ('Tuna', 3, ['K-2'])])
+        self.assertEqual(sum(len(g['lines']) for g in items), 3)
+
+    def test_stream_requires_staff_session_or_signed_token(self):
+        self.assertEqual(self.client.get('/api/kitchen/stream/').status_code, 401)
+        self.assertEqual(self.client.get('/api/kitchen/stream/?token=forged').status_code, 401)
+        token = self.client.get('/api/kitchen/stream-token/').json()['token']
+        guest = APIClient()
+        guest.force_login(User.objects.create_user('guest', password='x'))
+        self.assertEqual(guest.get('/api/kitchen/stream/').status_code, 403)
+        res = APIClient().get(f'/api/kitchen/stream/?token={token}')
+        self.assertEqual((res.status_code, res['Content-Type']), (200, 'text/event-stream'))
+        res.close()  # Đóng stream = kết thúc request (đóng kết nối DB) -> để cuối test
+
+    def test_batch_serve_updates_and_publishes(self):
+        since = broker.last_id
+        ids = [self.lines[0].pk, self.lines[1].pk, self.lines[3].pk]  # Dòng cuối đã ra món từ trước
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/kitchen/serve/', {'ids': ids}, format='json')
+        self.assertEqual(res.json()['updated'], 2)
+        event = broker.read(since)[1][0]
+        self.assertEqual((event['type'], json.loads(event['json'])['ids']), ('kitchen', ids[:2]))
+        items = self.client.get('/api/kitchen/queue/').json()['items']
+        self.assertEqual([g['name'] for g in items], ['Tuna'])
+        self.assertEqual(self.client.post('/api/kitchen/serve/', {'ids': ['x']}, format='json').status_code, 400)
+        self.assertEqual(APIClient().get('/api/kitchen/queue/').status_code, 401)
+
+
+class OrderDeltaSyncTests(TestCase):
+    def setUp(self):
+        cat = Category.objects.create(name='Delta')
+        self.a, self.b = Item.objects.create(category=cat, name='A', price=1000), Item.objects.create(category=cat, name='B', price=2000)
+        self.table = Table.objects.create(number='V1')
+        self.client = APIClient()
+        self.staff = APIClient(); self.staff.force_authenticate(User.objects.create_superuser('bep', password='x'))
+
+    def order(self, item, qty=1):
+        payload = {**SHOP_GPS, 'table_id': self.table.id, 'items': [{'id': item.id, 'quantity': qty}]}
+        return self.client.post('/api/orders/create/', payload, format='json').json()
+
+    def test_since_returns_304_or_only_changed_items(self):
+        v1 = self.order(self.a)['version']
+        self.assertEqual(self.client.get(f'/api/orders/table/{self.table.id}/?since={v1}').status_code, 304)
+        v2 = self.order(self.b, 2)['version']
+        self.assertGreater(v2, v1)
+        data = self.client.get(f'/api/orders/table/{self.table.id}/?since={v1}').json()
+        self.assertEqual((data['delta'], data['version'], data['total']), (True, v2, 5000))
+        self.assertEqual([(i['name'], i['quantity']) for i in data['items']], [('B', 2)])
+
+        line = OrderItem.objects.get(item=self.a)
+        self.staff.post('/api/kitchen/serve/', {'ids': [line.pk]}, format='json')
+        data = self.client.get(f'/api/orders/table/{self.table.id}/?since={v2}').json()
+        self.assertEqual([(i['name'], i['isServed']) for i in data['items']], [('A', True)])
+
+        self.staff.post(f'/api/tables/{self.table.id}/checkout/', {'payment_method': 'cash'})
+        res = self.client.get(f'/api/orders/table/{self.table.id}/?since={data["version"]}')
+        self.assertEqual((res.status_code, res.content), (200, b''))  # Bàn không còn đơn mở, như khi không có ?since=
+        # Đơn mới của bàn luôn có phiên bản lớn hơn đơn cũ
+        self.assertGreater(self.order(self.a)['version'], data['version'])
+
+    def test_long_poll_times_out_with_304(self):
+        v = self.order(self.a)['version']
+        started = time.monotonic()
+        res = self.client.get(f'/api/orders/table/{self.table.id}/?since={v}&wait=0.3')
+        self.assertEqual(res.status_code, 304)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name='Async')
+        cls.items = [Item.objects.create(category=cat, name=f'Async {i}', price=1000 * i) for i in range(3)]
+        cls.table = Table.objects.create(number='AS1')
+        cls.order = Order.objects.create(table=cls.table, total=3000, version=5)
+        OrderItem.objects.create(order=cls.order, item=cls.items[1], quantity=3, version=5)
+
+    async def call(self, view, path, *args):
+        return await view(AsyncRequestFactory().get(path), *args)
+
+    async def test_menu_endpoints_match_sync_views(self):
+        for view, path, args in ((async_views.get_menu_data, '/menu/data/', ()), (async_views.get_menu, '/api/menu/', ()),
+                                 (async_views.get_menu_by_category, '/api/menu/category/x/', (self.items[0].category_id,))):
+            caching.clear()
+            res = await self.call(view, path, *args)
+            caching.clear()
+            expected = await self.async_client.get(path if not args else f'/api/menu/category/{args[0]}/')
+            self.assertEqual(json.loads(res.content), json.loads(expected.content), path)
+
+    async def test_order_by_table_full_304_and_long_poll(self):
+        path = f'/api/orders/table/{self.table.id}/'
+        res = await self.call(async_views.get_order_by_table, path, self.table.id)
+        self.assertEqual(json.loads(res.content)['items'][0]['quantity'], 3)
+        res = await self.call(async_views.get_order_by_table, path + '?since=5', self.table.id)
+        self.assertEqual(res.status_code, 304)
+
+        async def change():
+            await asyncio.sleep(0.2)
+            await OrderItem.objects.filter(order=self.order).aupdate(quantity=4, version=6)
+            await Order.objects.filter(pk=self.order.pk).aupdate(version=6)
+            broker.publish('order', {'table_id': self.table.id})
+        task = asyncio.create_task(change())
+        res = await self.call(async_views.get_order_by_table, path + '?since=5&wait=5', self.table.id)
+        await task
+        data = json.loads(res.content)
+        self.assertEqual((data['delta'], data['version'], data['items'][0]['quantity']), (True, 6, 4))
+
+
+class OrderLongPollTests(TransactionTestCase):
+    def test_wakes_up_on_change_from_another_request(self):
+        item = Item.objects.create(category=Category.objects.create(name='LP'), name='LP', price=1000)
+        table = Table.objects.create(number='LP1')
+        payload = {**SHOP_GPS, 'table_id': table.id, 'items': [{'id': item.id, 'quantity': 1}]}
+        v = APIClient().post('/api/orders/create/', payload, format='json').json()['version']
+
+        def order_again():
+            time.sleep(0.3)
+            APIClient().post('/api/orders/create/', payload, format='json')
+            connection.close()
+        threading.Thread(target=order_again).start()
+        started = time.monotonic()
+        res = APIClient().get(f'/api/orders/table/{table.id}/?since={v}&wait=10')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['items'][0]['quantity'], 2)
+        self.assertLess(time.monotonic() - started, 5)
+
+
+class RevenueRollupTests(TestCase):
+    def setUp(self):
+        caching.clear()
+        self.table = Table.objects.create(number='R1')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('boss', password='x'))
+
+    def pay(self, amount, method):
+        Order.objects.create(table=self.table, total=amount)
+        res = self.client.post(f'/api/tables/{self.table.id}/checkout/', {'payment_method': method})
+        self.assertEqual(res.status_code, 200)
+
+    def test_checkout_updates_rollup_and_dashboard_reads_it(self):
+        self.pay(100000, 'cash'); self.pay(50000, 'cash'); self.pay(70000, 'transfer')
+        today = timezone.now().date()
+        self.assertEqual(DailyRevenue.objects.get(day=today, method='cash').total, 150000)
+        with CaptureQueriesContext(connection) as ctx:
+            rev = self.client.get('/api/dashboard/stats/?range=month').json()['revenue']
+        self.assertEqual((rev['total'], rev['cash'], rev['transfer'], rev['orders']), (220000, 150000, 70000, 3))
+        self.assertEqual(sum('revenue_daily' in q['sql'] for q in ctx.captured_queries), 1)
+
+    def test_edit_and_delete_keep_rollup_in_sync(self):
+        self.pay(100000, 'cash'); self.pay(50000, 'cash')
+        revenue = Revenue.objects.get(amount=50000)
+        revenue.amount, revenue.method = 60000, 'transfer'; revenue.save()
+        rollup = lambda: sorted(DailyRevenue.objects.filter(count__gt=0).values_list('method', 'total', 'count'))
+        self.assertEqual(rollup(), [('cash', 100000, 1), ('transfer', 60000, 1)])
+        self.assertEqual(self.client.delete(f'/api/orders/{revenue.order_id}/').status_code, 204)  # Xoá Revenue theo cascade
+        self.assertEqual(rollup(), [('cash', 100000, 1)])
+
+    def test_backfill_rebuilds_from_revenues(self):
+        order = Order.objects.create(table=self.table, total=0, status='paid')
+        old = Revenue.objects.create(order=order, method='card', amount=30000)
+        Revenue.objects.filter(pk=old.pk).update(paid_at=datetime.now() - timedelta(days=1))
+        Revenue.objects.create(order=order, method='card', amount=20000)
+        DailyRevenue.objects.all().delete()
+        call_command('backfill_revenue_rollups', stdout=open('/dev/null', 'w'))
+        self.assertEqual(sorted(DailyRevenue.objects.values_list('total', 'count')), [(20000, 1), (30000, 1)])
+        self.assertEqual(self.client.get('/api/dashboard/stats/?range=yesterday').json()['revenue']['total'], 30000)
+
+
+class SalesAnalyticsTests(TestCase):
+    def setUp(self):
+        caching.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('boss', password='x'))
+        self.drinks, self.food = Category.objects.create(name='Nước'), Category.objects.create(name='Món chính')
+        self.tea = Item.objects.create(category=self.drinks, name='Trà', price=10000)
+        self.rice = Item.objects.create(category=self.food, name='Cơm', price=40000)
+        self.table = Table.objects.create(number='A1')
+
+    def sell(self, paid_at, method, *lines, status='paid'):
+        order = Order.objects.create(table=self.table, status=status, total=sum(i.price * q for i, q in lines))
+        for item, qty in lines: OrderItem.objects.create(order=order, item=item, quantity=qty)
+        if status == 'paid':
+            rev = Revenue.objects.create(order=order, method=method, amount=order.total)
+            Revenue.objects.filter(pk=rev.pk).update(paid_at=paid_at)
+
+    def get(self, **params):
+        res = self.client.get('/api/dashboard/analytics/', params)
+        self.assertEqual(res.status_code, 200, res.content)
+        return res.json()
+
+    def test_buckets_filters_and_single_query(self):
+        self.sell(datetime(2026, 3, 2, 9, 15), 'cash', (self.tea, 2), (self.rice, 1))
+        self.sell(datetime(2026, 3, 2, 9, 50), 'card', (self.rice, 2))
+        self.sell(datetime(2026, 3, 4, 20, 0), 'cash', (self.tea, 1))
+        self.sell(datetime(2026, 3, 2, 9, 30), None, (self.tea, 50), status='cancelled')
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.get(bucket='day', **{'from': '2026-03-01', 'to': '2026-03-05'})
+        self.assertEqual(len([q for q in ctx.captured_queries if 'revenues' in q['sql']]), 1)
+        self.assertEqual(len(data['series']), 5)
+        self.assertEqual([(s['bucket'][:10], s['revenue'], s['orders'], s['items_sold']) for s in data['series'] if s['orders']],
+                         [('2026-03-02', 140000, 2, 5), ('2026-03-04', 10000, 1, 1)])
+        self.assertEqual([(i['name'], i['quantity']) for i in data['items']], [('Trà', 3), ('Cơm', 3)])
+
+        hours = self.get(bucket='hour', method='cash', **{'from': '2026-03-02T09:00', 'to': '2026-03-02T10:00'})
+        self.assertEqual([(s['revenue'], s['items_sold']) for s in hours['series']], [(60000, 3)])
+        drinks = self.get(bucket='month', category=str(self.drinks.id), **{'from': '2026-03-01', 'to': '2026-03-31'})
+        self.assertEqual(drinks['totals'], {'revenue': 30000, 'orders': 2, 'items_sold': 3, 'item_sales': 30000})
+        self.assertEqual(self.client.get('/api/dashboard/analytics/', {'bucket': 'year'}).status_code, 400)
+
+    def test_closed_buckets_are_cached_and_only_new_data_is_queried(self):
+        now = datetime(2026, 3, 10, 15, 30)
+        self.sell(datetime(2026, 3, 9, 12, 0), 'cash', (self.tea, 1))
+        params = analytics.parse_params({'bucket': 'day', 'from': '2026-03-01'}, now=now)
+        self.assertFalse(analytics.report(params)['cached'])
+        self.sell(datetime(2026, 3, 10, 11, 0), 'cash', (self.rice, 1))
+        with CaptureQueriesContext(connection) as ctx:
+            data = analytics.report(analytics.parse_params({'bucket': 'day', 'from': '2026-03-01'}, now=now))
+        # Chỉ khung hôm nay (chưa đóng) được truy vấn lại
+        self.assertTrue(data['cached'])
+        self.assertIn("2026-03-10 00:00:00", ctx.captured_queries[-1]['sql'])
+        self.assertEqual(data['totals']['revenue'], 50000)
+        # Các giờ đã qua của hôm nay cũng được cache -> lần sau chỉ còn giờ hiện tại
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(analytics.report(params)['totals']['revenue'], 50000)
+        self.assertIn("2026-03-10 15:00:00", ctx.captured_queries[-1]['sql'])
+
+        closed = analytics.parse_params({'bucket': 'day', 'from': '2026-03-01', 'to': '2026-03-09'}, now=now)
+        analytics.report(closed)
+        with self.assertNumQueries(0): self.assertEqual(analytics.report(closed)['totals']['revenue'], 10000)
+        # Xoá doanh thu cũ -> bỏ cache
+        Revenue.objects.filter(amount=10000).delete()
+        self.assertEqual(analytics.report(closed)['totals']['revenue'], 0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('boss', password='x'))
+        table = Table.objects.create(number='Bàn "1"')
+        item = Item.objects.create(category=Category.objects.create(name='Sushi'), name='Cá hồi <tươi>', price=50000)
+        for day in range(1, 6):
+            order = Order.objects.create(table=table, status='paid', total=50000 * day)
+            OrderItem.objects.create(order=order, item=item, quantity=day, note='ít cay\x01')
+            rev = Revenue.objects.create(order=order, method='cash', amount=order.total)
+            Revenue.objects.filter(pk=rev.pk).update(paid_at=datetime(2026, 3, day, 12))
+
+    def test_csv_endpoint_streams_date_range(self):
+        res = self.client.get('/api/export/revenues.csv', {'from': '2026-03-02', 'to': '2026-03-04'})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        self.assertIn('revenues_20260302_20260305.csv', res['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(b''.join(res.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0], ['id', 'paid_at', 'method', 'amount', 'order_id', 'table'])
+        self.assertEqual([(r[1], r[3], r[5]) for r in rows[1:]],
+                         [('2026-03-02 12:00:00', '100000', 'Bàn "1"'), ('2026-03-03 12:00:00', '150000', 'Bàn "1"'),
+                          ('2026-03-04 12:00:00', '200000', 'Bàn "1"')])
+        self.assertEqual(self.client.get('/api/export/users.csv').status_code, 400)
+        self.assertEqual(self.client.get('/api/export/revenues.pdf').status_code, 400)
+
+    def test_pages_by_primary_key(self):
+        with CaptureQueriesContext(connection) as ctx:
+            lines = b''.join(exports.stream('order_items', 'json', chunk_size=2)).decode().splitlines()
+        self.assertEqual(len(ctx.captured_queries), 4)  # bảng lưu trữ (trống) + 2 + 2 + 1 dòng
+        self.assertEqual(json.loads(lines[0])['columns'][:3], ['id', 'order_id', 'ordered_at'])
+        chunks = [json.loads(l) for l in lines[1:]]
+        self.assertEqual([q for c in chunks for q in c[8]], [1, 2, 3, 4, 5])  # cột quantity
+        self.assertEqual(chunks[0][10], [50000, 100000])  # cột amount
+
+    def test_xlsx_is_valid_workbook(self):
+        path = os.path.join(tempfile.mkdtemp(), 'items.xlsx')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('export_data', 'order_items', format='xlsx', output=path, chunk_size=2, stdout=io.StringIO())
+        with zipfile.ZipFile(path) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertIn('name="order_items"', zf.read('xl/workbook.xml').decode())
+            sheet = zf.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 6)
+        self.assertIn('<t>Cá hồi &lt;tươi&gt;</t>', sheet)
+        self.assertIn('<t>ít cay</t>', sheet)  # Ký tự điều khiển bị bỏ để XML hợp lệ
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        caching.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('boss', password='x'))
+        self.table = Table.objects.create(number='B1')
+        self.item = Item.objects.create(category=Category.objects.create(name='Sushi'), name='Cá hồi', price=50000)
+        self.now = timezone.now()
+        for days_ago in (100, 95, 92, 5):
+            self.sell(self.now - timedelta(days=days_ago), qty=2)
+        old_open = Order.objects.create(table=self.table, total=0)  # Đơn cũ chưa thanh toán: không được lưu trữ
+        Order.objects.filter(pk=old_open.pk).update(created_at=self.now - timedelta(days=200))
+        for days_ago in (30, 1):
+            n = Notification.objects.create(table=self.table, message='yêu cầu thanh toán')
+            Notification.objects.filter(pk=n.pk).update(created_at=self.now - timedelta(days=days_ago))
+        call_command('backfill_revenue_rollups', stdout=io.StringIO())  # paid_at vừa bị dời về quá khứ
+
+    def sell(self, when, qty):
+        order = Order.objects.create(table=self.table, status='paid', total=50000 * qty)
+        OrderItem.objects.create(order=order, item=self.item, quantity=qty)
+        rev = Revenue.objects.create(order=order, method='cash', amount=order.total)
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+        Revenue.objects.filter(pk=rev.pk).update(paid_at=when)
+
+    def snapshot(self):
+        params = analytics.parse_params({'bucket': 'month', 'from': (self.now - timedelta(days=120)).date().isoformat()})
+        return {
+            'analytics': {k: v for k, v in analytics.report(params).items() if k != 'cached'},
+            'best': self.client.get('/api/dashboard/stats/').json()['best_sellers'][0]['sold_count'],
+            'rollup': sorted(DailyRevenue.objects.values_list('day', 'total')),
+            'export': b''.join(exports.stream('revenues', 'csv')).count(b'\n'),
+        }
+
+    def test_archive_moves_old_paid_orders_and_reads_stay_the_same(self):
+        before = self.snapshot()
+        gen = cache.get(analytics.GENERATION_KEY)
+        call_command('archive_orders', days=30, batch_size=2, notification_days=7, stdout=io.StringIO())
+
+        self.assertEqual((Order.objects.count(), ArchivedOrder.objects.count()), (2, 3))
+        self.assertEqual((OrderItem.objects.count(), ArchivedOrderItem.objects.count()), (1, 3))
+        self.assertEqual((Revenue.objects.count(), ArchivedRevenue.objects.count()), (1, 3))
+        self.assertEqual(list(Notification.objects.values_list('message', flat=True)), ['yêu cầu thanh toán'])
+        line = ArchivedOrderItem.objects.first()
+        self.assertEqual((line.item_name, line.price, line.category_name, line.order.table_number), ('Cá hồi', 50000, 'Sushi', 'B1'))
+        # Chuyển dòng không làm cache thống kê mất hiệu lực, và bảng tổng hợp theo ngày không bị trừ
+        self.assertEqual(cache.get(analytics.GENERATION_KEY), gen)
+        caching.clear()
+        self.assertEqual(self.snapshot(), before)
+        call_command('backfill_revenue_rollups', stdout=io.StringIO())
+        self.assertEqual(sorted(DailyRevenue.objects.values_list('day', 'total')), before['rollup'])
+
+
+class ReservationExpiryTests(TestCase):
+    def setUp(self):
+        caching.clear()
+        reservations._last_sweep = 0
+
+    def test_reserve_sets_expiry_and_publishes(self):
+        table = Table.objects.create(number='H1')
+        since = broker.last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(f'/api/tables/{table.id}/reserve/')
+        self.assertEqual(res.status_code, 200)
+        table.refresh_from_db()
+        self.assertAlmostEqual((table.expires_at - table.reserved_at).total_seconds(), reservations.RESERVATION_TTL)
+        self.assertEqual([e['type'] for e in broker.read(since)[1]], ['table'])
+
+    def test_sweep_releases_only_expired_reservations(self):
+        past, future = timezone.now() - timedelta(minutes=1), timezone.now() + timedelta(minutes=5)
+        expired = Table.objects.create(number='H2', status='reserved', reserved_at=past, expires_at=past)
+        waiting = Table.objects.create(number='H3', status='reserved', reserved_at=past, expires_at=future)
+        seated = Table.objects.create(number='H4', status='occupied', expires_at=past)
+        since = broker.last_id
+        with self.assertNumQueries(3):  # SELECT id + 1 UPDATE + đọc lại bàn để phát sự kiện
+            self.assertEqual(reservations.sweep(), [expired.id])
+        for table in (expired, waiting, seated): table.refresh_from_db()
+        self.assertEqual((expired.status, expired.expires_at), ('available', None))
+        # Bàn chưa tới hạn và bàn đang có khách giữ nguyên trạng thái lẫn hạn giữ chỗ
+        self.assertEqual((waiting.status, waiting.expires_at), ('reserved', future))
+        self.assertEqual((seated.status, seated.expires_at), ('occupied', past))
+        events = broker.read(since)[1]
+        self.assertEqual([json.loads(e['json'])['id'] for e in events], [expired.id])
+        self.assertEqual(reservations.maybe_sweep(), [])  # Chưa tới chu kỳ quét tiếp theo
+
+    def test_ordering_on_reserved_table_seats_it_and_sweep_keeps_it(self):
+        cat = Category.objects.create(name='Hẹn')
+        item = Item.objects.create(category=cat, name='Món', price=1000)
+        table = Table.objects.create(number='H6')
+        self.client.post(f'/api/tables/{table.id}/reserve/')
+        res = self.client.post('/api/orders/create/', {**SHOP_GPS, 'table_id': table.id, 'items': [{'product_id': item.id, 'quantity': 1}]}, content_type='application/json')
+        self.assertEqual(res.status_code, 201)
+        table.refresh_from_db()
+        self.assertEqual((table.status, table.reserved_at, table.expires_at), ('occupied', None, None))
+        # Bàn còn 'reserved' (dữ liệu cũ) nhưng đã có đơn mở -> bộ quét không trả
+        Table.objects.filter(pk=table.pk).update(status='reserved', expires_at=timezone.now())
+        self.assertEqual(reservations.sweep(timezone.now() + timedelta(minutes=16)), [])
+        self.assertEqual(Table.objects.get(pk=table.pk).status, 'reserved')
+
+    def test_listing_and_reserving_release_expired_tables(self):
+        past = timezone.now() - timedelta(minutes=1)
+        table = Table.objects.create(number='H5', status='reserved', reserved_at=past, expires_at=past)
+        rows = {r['number']: r for r in self.client.get('/api/tables/').json()['results']}
+        self.assertEqual(rows['H5']['status'], 'available')
+        Table.objects.filter(pk=table.pk).update(status='reserved', expires_at=past)
+        self.assertEqual(self.client.post(f'/api/tables/{table.id}/reserve/').status_code, 200)
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name='Roll')
+        Item.objects.bulk_create([Item(category=cat, name=f'Roll {i}', price=1000) for i in range(3)])
+
+    def setUp(self):
+        caching.clear()
+
+    def test_disabled_by_default(self):
+        self.assertNotIn('Server-Timing', APIClient().get('/api/menu/'))
+
+    @override_settings(EMENU_METRICS=True, EMENU_QUERY_BUDGET=20, EMENU_QUERY_BUDGETS={'get_menu_data': 0})
+    def test_server_timing_log_and_budget(self):
+        client = APIClient()  # Middleware được nạp lại theo settings mới
+        with self.assertLogs('EMENU.metrics', 'INFO') as logs:
+            res = client.get('/menu/data/')
+        self.assertRegex(res['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+, total;dur=[\d.]+')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['endpoint'], line['status'], line['bytes']), ('get_menu_data', 200, len(res.content)))
+        self.assertGreaterEqual(line['queries'], 1)
+        self.assertIn('Vượt ngân sách query', logs.records[1].getMessage())
+
+        with self.assertLogs('EMENU.metrics', 'INFO') as logs:
+            client.get('/api/menu/')
+        self.assertEqual([r.levelname for r in logs.records], ['INFO'])
+
+
+class CacheLayerTests(TestCase):
+    def setUp(self):
+        caching.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('cache', password='x'))
+
+    def test_workers_share_backend_and_bus_invalidates_local_copies(self):
+        bus, builds = caching.LocalBus(), []
+        a, b = caching.Namespace('test', 60, bus=bus), caching.Namespace('test', 60, bus=bus)  # 2 worker
+        build = lambda: builds.append(1) or {'n': len(builds)}
+        self.assertEqual(a.get_or_set('k', build), {'n': 1})
+        self.assertEqual(b.get_or_set('k', build), {'n': 1})  # Trúng cache dùng chung, không dựng lại
+        self.assertEqual(b.local('k'), {'n': 1})
+        a.invalidate()
+        self.assertIsNone(b.local('k'))  # Bus đã xoá bản trong RAM của worker b
+        self.assertEqual(b.get_or_set('k', build), {'n': 2})
+        self.assertEqual(a.get_or_set('k', build), {'n': 2})
+        self.assertEqual([(s['local_hits'], s['shared_hits'], s['misses']) for s in (a.stats(), b.stats())], [(0, 1, 1), (1, 1, 1)])
+
+    def test_invalidation_during_build_is_not_masked(self):
+        ns = caching.Namespace('test', 60, bus=caching.LocalBus())
+        def build():
+            ns.invalidate()  # Dữ liệu đổi trong lúc đang dựng
+            return 'OLD-DATA'
+        self.assertEqual(ns.get_or_set('k', build), 'OLD-DATA')
+        self.assertEqual(ns.get_or_set('k', lambda: 'NEW-DATA'), 'NEW-DATA')
+
+    def test_missed_bus_message_is_caught_by_generation_poll(self):
+        a = caching.Namespace('test', 60, bus=caching.LocalBus())
+        b = caching.Namespace('test', 60, poll=0, bus=caching.LocalBus())
+        a.set('k', 1)
+        self.assertEqual(b.get('k'), 1)
+        a.invalidate()
+        self.assertIsNone(b.get('k'))
+
+    def test_local_lru_evicts_oldest_key(self):
+        ns = caching.Namespace('test', 60, local_size=2, bus=caching.LocalBus())
+        for k in 'abc': ns.set(k, k)
+        self.assertEqual([ns.local(k) for k in 'abc'], [None, 'b', 'c'])
+        self.assertEqual(ns.get('a'), 'a')  # Vẫn còn ở cache dùng chung
+
+    def test_table_listing_cached_until_order_changes(self):
+        cat = Category.objects.create(name='Cache')
+        item = Item.objects.create(category=cat, name='Món', price=1000)
+        table = Table.objects.create(number='K1')
+        self.client.get('/api/tables/')
+        with self.assertNumQueries(0):
+            self.client.get('/api/tables/')
+        res = self.client.post('/api/orders/create/', {**SHOP_GPS, 'table_id': table.id, 'items': [{'product_id': item.id, 'quantity': 2}]}, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self.client.get('/api/tables/').json()['results'][0]['current_order_total'], 2000)
+        self.client.post('/api/orders/create/', {**SHOP_GPS, 'table_id': table.id, 'items': [{'product_id': item.id, 'quantity': 1}]}, format='json')
+        self.assertEqual(self.client.get('/api/tables/').json()['results'][0]['current_order_total'], 3000)
+
+    def test_dashboard_cached_until_checkout_and_stats_exposed(self):
+        table = Table.objects.create(number='K2')
+        self.assertEqual(self.client.get('/api/dashboard/stats/').json()['revenue']['total'], 0)
+        with self.assertNumQueries(0):
+            self.client.get('/api/dashboard/stats/')
+        Order.objects.create(table=table, total=5000)
+        self.client.post(f'/api/tables/{table.id}/checkout/', {'payment_method': 'cash'})
+        self.assertEqual(self.client.get('/api/dashboard/stats/').json()['revenue']['total'], 5000)
+        stats = self.client.get('/api/cache/stats/').json()['namespaces']['dashboard']
+        self.assertEqual((stats['local_hits'], stats['misses']), (1, 2))
+        self.assertGreater(stats['invalidations'], 0)
+        self.assertEqual(APIClient().get('/api/cache/stats/').status_code, 401)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        caching.clear()
+        self.client = APIClient()
+        cat = Category.objects.create(name='Retry')
+        self.item = Item.objects.create(category=cat, name='Món', price=1000)
+        self.table = Table.objects.create(number='I1')
+
+    def order(self, key, quantity=2):
+        return self.client.post('/api/orders/create/', {**SHOP_GPS, 'table_id': self.table.id, 'items': [{'product_id': self.item.id, 'quantity': quantity}]},
+                                format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_order_is_replayed_without_running_view(self):
+        first = self.order('k1')
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+        calls = []
+        get = cache.get
+        cache.get = lambda *a, **kw: calls.append(a[0]) or get(*a, **kw)
+        try:
+            with self.assertNumQueries(0):
+                retry = self.order('k1')
+        finally: del cache.get
+        self.assertEqual(len(calls), 1)  # Lần gửi lại: đúng 1 lần đọc cache
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+        # Key mới -> chạy bình thường, cộng dồn; dùng lại key với giỏ khác -> 422
+        self.assertEqual(self.order('k2').json()['total'], 4000)
+        self.assertEqual(self.order('k1', quantity=5).status_code, 422)
+        self.assertEqual(OrderItem.objects.get().quantity, 4)
+
+    def test_retried_checkout_writes_one_revenue(self):
+        self.client.force_authenticate(User.objects.create_superuser('cashier', password='x'))
+        Order.objects.create(table=self.table, total=5000)
+        for _ in range(3):
+            res = self.client.post(f'/api/tables/{self.table.id}/checkout/', {'payment_method': 'cash'}, HTTP_IDEMPOTENCY_KEY='pay-1')
+            self.assertEqual(res.status_code, 200)
+        self.assertEqual(Revenue.objects.count(), 1)
+        # Lần gửi lại vẫn phải qua xác thực
+        self.assertEqual(APIClient().post(f'/api/tables/{self.table.id}/checkout/', {}, HTTP_IDEMPOTENCY_KEY='pay-1').status_code, 401)
+
+    def test_concurrent_duplicate_gets_409_while_first_is_running(self):
+        from rest_framework.decorators import api_view
+        from rest_framework.test import APIRequestFactory
+        from .idempotency import idempotent
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        @api_view(['POST'])
+        @idempotent
+        def slow(request):
+            calls.append(1); started.set(); release.wait(5)
+            return Response({'ok': True}, 201)
+
+        post = lambda: slow(APIRequestFactory().post('/slow/', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='same'))
+        with ThreadPoolExecutor(1) as pool:
+            first = pool.submit(post)
+            started.wait(5)
+            duplicate = post()
+            release.set()
+            self.assertEqual(first.result().status_code, 201)
+        self.assertEqual((duplicate.status_code, duplicate['Retry-After']), (409, '1'))
+        self.assertEqual((post().status_code, len(calls)), (201, 1))
+
+
+def make_image(fmt='PNG', size=(800, 600)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buf, fmt)
+    return buf.getvalue()
+
+
+class MediaTestCase(TestCase):
+    """Ghi ảnh vào MEDIA_ROOT tạm, xoá khi xong"""
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable(); self.addCleanup(override.disable)
+
+
+class DashboardBestSellerTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        caching.clear()
+
+    def test_best_sellers_use_one_query_and_thumbnail_urls(self):
+        cat = Category.objects.create(name='Sushi')
+        table = Table.objects.create(number='S1')
+        order = Order.objects.create(table=table, status='paid')
+        unpaid = Order.objects.create(table=table)
+        for i in range(6):
+            item = Item.objects.create(category=cat, name=f'Món {i}', price=1000,
+                                       image=default_storage.save(f'menu/m{i}.png', ContentFile(make_image())))
+            OrderItem.objects.create(order=order, item=item, quantity=i + 1)
+            # Đơn chưa thanh toán không được tính vào món bán chạy
+            OrderItem.objects.create(order=unpaid, item=item, quantity=10 - i)
+        with CaptureQueriesContext(connection) as ctx:
+            best = self.client.get('/api/dashboard/stats/').json()['best_sellers']
+        self.assertEqual(sum('order_items' in q['sql'] for q in ctx.captured_queries), 1)
+        self.assertEqual([b['sold_count'] for b in best], [6, 5, 4, 3, 2])
+        self.assertRegex(best[0]['img'], r'^http://testserver/media/menu/derived/.+/thumb\.png$')
+
+        # Ảnh cũ chưa có bộ dẫn xuất -> tạo thumbnail lần đầu rồi dùng lại
+        Item.objects.update(image_hash='')
+        caching.invalidate('dashboard')  # update() không phát signal
+        best = self.client.get('/api/dashboard/stats/').json()['best_sellers']
+        self.assertTrue(best[0]['img'].endswith('/media/menu/thumbs/m5_200x200.png'))
+        with default_storage.open('menu/thumbs/m5_200x200.png') as f:
+            self.assertLessEqual(max(Image.open(f).size), 200)
+
+
+class ImageDerivativeTests(MediaTestCase):
+    def test_saving_item_image_builds_derivatives(self):
+        cat = Category.objects.create(name='Sushi')
+        item = Item.objects.create(category=cat, name='Cơm cuộn', price=1000,
+                                   image=ContentFile(make_image('JPEG', (2000, 1500)), name='big.jpg'))
+        item.refresh_from_db()
+        self.assertEqual(len(item.image_hash), 64)
+        images = self.client.get('/api/menu/').json()[0]['images']
+        self.assertEqual(set(images), {'thumb', 'card', 'detail', 'thumb_webp', 'card_webp', 'detail_webp'})
+        for key, size in (('thumb', 200), ('card', 480), ('detail', 1080), ('detail_webp', 1080)):
+            with default_storage.open(images[key].replace('/media/', '', 1)) as f:
+                self.assertEqual(max(Image.open(f).size), size)
+
+    def test_backfill_command_processes_existing_items(self):
+        cat = Category.objects.create(name='Sushi')
+        name = default_storage.save('menu/old.png', ContentFile(make_image()))
+        Item.objects.bulk_create([Item(category=cat, name=f'Cũ {i}', price=1, image=name) for i in range(3)])
+        call_command('build_image_derivatives', workers=1, stdout=io.StringIO())
+        hashes = set(Item.objects.values_list('image_hash', flat=True))
+        self.assertEqual(len(hashes), 1)
+        self.assertTrue(default_storage.exists(f'menu/derived/{hashes.pop()[:2]}'))
+
+
+class ContentAddressedImageTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cat = Category.objects.create(name='Sushi')
+        self.png = make_image()
+
+    def add_item(self, name, data, filename):
+        return Item.objects.create(category=self.cat, name=name, price=1, image=ContentFile(data, name=filename))
+
+    def test_identical_uploads_share_one_file_until_last_reference_goes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            a = self.add_item('A', self.png, 'a.png')
+            b = self.add_item('B', self.png, 'khac_ten.PNG')
+        self.assertEqual(a.image.name, b.image.name)
+        self.assertRegex(a.image.name, r'^menu/[0-9a-f]{64}\.png$')
+        self.assertEqual(len(default_storage.listdir('menu')[1]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True): a.delete()
+        self.assertTrue(default_storage.exists(b.image.name))
+        with self.captureOnCommitCallbacks(execute=True): b.delete()
+        self.assertFalse(default_storage.exists(b.image.name))
+
+    def test_replacing_image_releases_old_blob(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = self.add_item('A', self.png, 'a.png')
+        old = item.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            item.image = ContentFile(make_image('JPEG'), name='moi.jpeg'); item.save()
+        self.assertTrue(item.image.name.endswith('.jpg'))
+        self.assertFalse(default_storage.exists(old))
+
+    def test_dedupe_command_collapses_existing_copies(self):
+        names = [default_storage.save(f'menu/sushi_demo_{i}.jpg', ContentFile(self.png)) for i in range(4)]
+        orphan = default_storage.save('menu/khong_dung.jpg', ContentFile(make_image('JPEG')))
+        Item.objects.bulk_create([Item(category=self.cat, name=n, price=1, image=n) for n in names[:3]])
+        call_command('dedupe_menu_images', stdout=io.StringIO())
+        refs = set(Item.objects.values_list('image', flat=True))
+        self.assertEqual(len(refs), 1)
+        self.assertTrue(default_storage.exists(refs.pop()))
+        self.assertEqual(len(default_storage.listdir('menu')[1]), 2)  # 1 ảnh chung + ảnh mồ côi giữ nguyên
+        self.assertTrue(default_storage.exists(orphan))
+
+
+class FakeImageHost(BaseHTTPRequestHandler):
+    """Máy chủ ảnh giả chạy local cho test tải ảnh nền"""
+    routes = {}
+    def do_GET(self):
+        status, ctype, body = self.routes.get(self.path, (404, 'text/plain', b'not found'))
+        self.send_response(status); self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body))); self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args): pass
+
+
+class RemoteImageTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable(); self.addCleanup(override.disable)
+
+        FakeImageHost.routes = {'/mon.png': (200, 'image/png', make_image()), '/trang.html': (200, 'text/html', b'<html>'),
+                                '/to.png': (200, 'image/png', make_image() + b'\0' * 2048)}
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeImageHost)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close); self.addCleanup(server.shutdown)
+        self.base = f'http://127.0.0.1:{server.server_port}'
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin2', password='x'))
+        self.cat = Category.objects.create(name='Sushi')
+
+    def create(self, path):
+        res = self.client.post('/api/items/', {'name': 'Món link', 'price': 1000, 'category': self.cat.id,
+                                                'image': self.base + path}, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(res.data['image_status'], 'pending')
+        remote_images.drain(10)
+        return Item.objects.get(pk=res.data['id'])
+
+    def test_remote_image_fetched_in_background(self):
+        item = self.create('/mon.png')
+        self.assertEqual(item.image_status, 'ready')
+        self.assertTrue(item.image.name.endswith('.png'))
+        self.assertEqual(len(item.image_hash), 64)
+
+    def test_non_image_content_type_marks_failed(self):
+        with self.assertLogs('EMENU.remote_images', 'WARNING'):
+            item = self.create('/trang.html')
+        self.assertEqual(item.image_status, 'failed')
+        self.assertFalse(item.image)
+
+    def test_download_is_capped(self):
+        with self.assertRaises(remote_images.RemoteImageError):
+            remote_images.download(self.base + '/to.png', max_bytes=1024)
+        self.assertGreater(len(remote_images.download(self.base + '/mon.png').read()), 0)
+
+
+class ImportMenuTests(TestCase):
+    def write(self, name, text):
+        path = os.path.join(tempfile.mkdtemp(), name)
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), True)
+        with open(path, 'w', encoding='utf-8') as f: f.write(text)
+        return path
+
+    def run_import(self, *args):
+        out = io.StringIO()
+        call_command('import_menu', *args, stdout=out)
+        return out.getvalue()
+
+    def test_streamed_json_array_matches_json_load(self):
+        from .management.commands.import_menu import iter_json_array
+        rows = [{'ten_mon': f'Món "{i}" ]', 'gia': i, 'phan_loai': 'A'} for i in range(50)]
+        text = json.dumps(rows, ensure_ascii=False, indent=1)
+        self.assertEqual(list(iter_json_array(io.StringIO(text), chunk_size=7)), rows)
+
+    def test_upserts_by_natural_key_and_removes_missing(self):
+        Item.objects.create(category=Category.objects.create(name='Cũ'), name='Món bỏ', price=1)
+        path = self.write('menu.json', json.dumps([
+            {'ten_mon': 'Sushi Cá Hồi', 'gia': 94000, 'phan_loai': 'Nigiri'},
+            {'ten_mon': 'Sushi Tôm', 'gia': 74000, 'phan_loai': 'Nigiri'},
+            {'ten_mon': 'Maki Dưa Leo', 'gia': 40000, 'phan_loai': 'Maki'}], ensure_ascii=False))
+        self.assertIn('Thêm 3, cập nhật 0, xoá 1 món', self.run_import(path, '--batch-size', '2'))
+        self.assertFalse(Category.objects.filter(name='Cũ').exists())
+        salmon = Item.objects.get(name='Sushi Cá Hồi')
+
+        csv_path = self.write('menu.csv', 'ten_mon,gia,phan_loai\nSushi Cá Hồi,99000,Nigiri\nSushi Tôm,74000,Nigiri\n')
+        self.assertIn('Thêm 0, cập nhật 2, xoá 1 món', self.run_import(csv_path))
+        self.assertEqual(Item.objects.get(pk=salmon.pk).price, 99000)  # cùng id -> đơn cũ vẫn trỏ đúng món
+
+        nd = self.write('menu.ndjson', '{"name": "Udon", "price": 50000, "category": "Mì"}\n')
+        self.assertIn('Thêm 1, cập nhật 0, xoá 0 món', self.run_import(nd, '--keep-missing'))
+        self.assertEqual(Item.objects.count(), 3)
+
+
+def supports_row_locking():
+    # SQLite bỏ qua SELECT ... FOR UPDATE; chỉ chạy test đồng thời khi DB thật sự tuần tự hoá được transaction
+    return connection.features.has_select_for_update or \
+        connection.settings_dict.get('OPTIONS', {}).get('transaction_mode') == 'IMMEDIATE'
+
+
+@unittest.skipUnless(supports_row_locking(), 'Cần DB hỗ trợ khoá dòng (MySQL/PostgreSQL) hoặc SQLite transaction_mode=IMMEDIATE')
+class ConcurrentOrderStressTests(TransactionTestCase):
+    SUBMISSIONS, THREADS = 200, 16
+
+    def test_concurrent_submissions_keep_order_invariants(self):
+        cat = Category.objects.create(name='Sushi')
+        a = Item.objects.create(category=cat, name='A', price=12000)
+        b = Item.objects.create(category=cat, name='B', price=7000)
+        table = Table.objects.create(number='Bàn đông')
+        payload = {**SHOP_GPS, 'table_id': table.id, 'items': [{'product_id': a.id, 'quantity': 1},
+                                                                {'product_id': b.id, 'quantity': 2}]}
+
+        def submit(_):
+            try: return APIClient().post('/api/orders/create/', payload, format='json').status_code
+            finally: connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.THREADS) as pool:
+            codes = list(pool.map(submit, range(self.SUBMISSIONS)))
+        elapsed = time.perf_counter() - started
+        logging.getLogger(__name__).info('%d lượt đặt món đồng thời: %.1f req/s', self.SUBMISSIONS, self.SUBMISSIONS / elapsed)
+
+        self.assertEqual(codes, [201] * self.SUBMISSIONS)
+        order = Order.objects.open().get(table=table)  # đúng 1 đơn mở
+        lines = {l.item_id: l.quantity for l in OrderItem.objects.filter(order=order)}
+        self.assertEqual(lines, {a.id: self.SUBMISSIONS, b.id: 2 * self.SUBMISSIONS})
+        self.assertEqual(order.total, self.SUBMISSIONS * (a.price + 2 * b.price))
@@ -1,3 +1,4 @@
 from .core_views import get_Emenu, login, get_current_user, EmployeeViewSet, CategoryViewSet, ItemViewSet, get_menu, get_menu_data, get_menu_by_category
 from .order_views import OrderViewSet, TableViewSet, get_order_by_table, create_order, checkout, cancel_order, request_payment
-from .manage_views import reserve_table, get_notifications, get_dashboard_stats, create_booking, delete_booking
\ No newline at end of file
+from .manage_views import reserve_table, get_notifications, notification_stream, notification_stream_token, get_dashboard_stats, get_sales_analytics, get_cache_stats, export_data, create_booking, delete_booking
+from .kitchen_views import kitchen_queue, kitchen_serve, kitchen_stream, kitchen_stream_token
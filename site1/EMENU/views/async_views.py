@@ -0,0 +1,66 @@
+"""Bản async (ASGI) của các endpoint đọc công khai: cùng URL, cùng dữ liệu trả về như bản DRF đồng bộ.
+site1/urls.py chọn bản này khi EMENU_ASYNC_VIEWS bật (asgi.py bật sẵn), nên dưới uvicorn request
+không phải nhảy sang thread chỉ để chạy view, và long-poll chờ bằng asyncio thay vì giữ 1 thread."""
+import time
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from ..models import Item, Order
+from ..serializers import ItemSerializer, OrderSerializer
+from ..events import broker
+from ..menu_cache import asnapshot_response
+from .core_views import menu_queryset, menu_data_queryset, menu_data
+from .order_views import LONGPOLL_MAX_SECONDS, ORDER_EVENTS, _touches_table
+
+def _json(data, status=200):
+    if data is None:
+        # Giống Response(None) của DRF: body rỗng, không Content-Type
+        res = HttpResponse(status=status); del res['Content-Type']
+        return res
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+@require_GET
+async def get_menu(request):
+    async def build():
+        return ItemSerializer([i async for i in menu_queryset()], many=True, context={'request': request}).data
+    try: return await asnapshot_response(request, 'menu', build)
+    except Exception: return _json([])
+
+@require_GET
+async def get_menu_data(request):
+    async def build():
+        return menu_data([i async for i in menu_data_queryset()], request)
+    try: return await asnapshot_response(request, f"data:{request.build_absolute_uri('/')}", build)
+    except Exception as e: return _json({'error': str(e)}, 500)
+
+@require_GET
+async def get_menu_by_category(request, id_danhmuc):
+    try:
+        items = [i async for i in Item.objects.select_related('category').filter(category_id=id_danhmuc)]
+        return _json(ItemSerializer(items, many=True, context={'request': request}).data)
+    except Exception: return _json([])
+
+@require_GET
+async def get_order_by_table(request, table_id):
+    """Giống order_views.get_order_by_table (kể cả ?since= / &wait=), long-poll chờ bằng broker.await_events"""
+    try:
+        since = request.GET.get('since', '')
+        if not since.isdigit():
+            order = await Order.objects.open().filter(table=table_id).select_related('table').prefetch_related('items__item').alast()
+            return _json(OrderSerializer(order, context={'request': request}).data if order else None)
+
+        since = int(since)
+        try: wait = min(max(float(request.GET.get('wait') or 0), 0), LONGPOLL_MAX_SECONDS)
+        except ValueError: wait = 0
+        cursor = broker.last_id
+        head = lambda: Order.objects.open().filter(table=table_id).order_by('-id_donhang').values('id_donhang', 'version').afirst()
+        current, deadline = await head(), time.monotonic() + wait
+        while current and current['version'] <= since and (left := deadline - time.monotonic()) > 0:
+            cursor, events = await broker.await_events(cursor, left, ORDER_EVENTS)
+            if not events or any(_touches_table(e, table_id) for e in events): current = await head()
+        if current is None: return _json(None)
+        if current['version'] <= since: return HttpResponse(status=304)
+        order = await Order.objects.select_related('table').prefetch_related('items__item').aget(pk=current['id_donhang'])
+        data = OrderSerializer(order, context={'request': request, 'since': since}).data
+        data['delta'] = True
+        return _json(data)
+    except Exception as e: return _json({'error': str(e)}, 500)
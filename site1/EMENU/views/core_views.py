@@ -9,6 +9,8 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from ..models import Category, Item
 from ..serializers import LoginSerializer, CategorySerializer, ItemSerializer, ProductFormSerializer
+from ..menu_cache import snapshot_response
+from ..images import derivative_urls
 def get_Emenu(request): return render(request, 'Emenu.html')
 
 @api_view(['POST'])
@@ -70,28 +72,41 @@ class ItemViewSet(viewsets.ModelViewSet):
     def get_permissions(self): return [AllowAny()] if self.action in ['list', 'retrieve'] else [IsAdminUser()]
     def get_serializer_class(self): return ProductFormSerializer if self.action in ['create', 'update', 'partial_update'] else ItemSerializer
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        return Response(ItemSerializer(queryset, many=True, context={'request': request}).data)
+        def build():
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()).select_related('category'))
+            return self.get_paginated_response(ItemSerializer(page, many=True, context={'request': request}).data).data
+        # Mỗi trang / bộ lọc 1 snapshot; link next/previous là tuyệt đối nên key theo cả host
+        return snapshot_response(request, f'items:{request.build_absolute_uri()}', build)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 @authentication_classes([])
 def get_menu(request):
-    try: return Response(ItemSerializer(Item.objects.all().order_by('category', 'id'), many=True, context={'request': request}).data)
+    try: return snapshot_response(request, 'menu', lambda: ItemSerializer(menu_queryset(), many=True, context={'request': request}).data)
     except: return Response([], 200)
 
+# Dùng chung với views/async_views.py: view async lấy danh sách món bằng ORM async rồi dựng cùng dữ liệu
+def menu_queryset(): return Item.objects.select_related('category').order_by('category', 'id')
+
+def menu_data_queryset(): return Item.objects.select_related('category').order_by('category__id', 'id')
+
+def menu_data(items, request):
+    categories = sorted(list(set(i.category.name for i in items if i.category)))
+    products = []
+    for i in items:
+        img = request.build_absolute_uri(i.image.url) if i.image and request else (i.image.url if i.image else "")
+        images = derivative_urls(i.image_hash, i.image.name, request) if i.image else {}
+        products.append({'id': i.id, 'name': i.name, 'price': i.price, 'img': img, 'images': images, 'category': i.category.name if i.category else "Khác"})
+    return {'categories': categories, 'products': products}
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 @authentication_classes([])
 def get_menu_data(request):
+    build = lambda: menu_data(list(menu_data_queryset()), request)
     try:
-        items = Item.objects.select_related('category').all().order_by('category__id', 'id')
-        categories = sorted(list(set(i.category.name for i in items if i.category)))
-        products = []
-        for i in items:
-            img = request.build_absolute_uri(i.image.url) if i.image and request else (i.image.url if i.image else "")
-            products.append({'id': i.id, 'name': i.name, 'price': i.price, 'img': img, 'category': i.category.name if i.category else "Khác"})
-        return Response({'categories': categories, 'products': products})
+        # Link ảnh là tuyệt đối nên mỗi host (localhost/ngrok) có snapshot riêng
+        return snapshot_response(request, f"data:{request.build_absolute_uri('/')}", build)
     except Exception as e: return Response({'error': str(e)}, 500)
 
 class EmployeeViewSet(viewsets.ViewSet):
@@ -130,7 +145,7 @@ class EmployeeViewSet(viewsets.ViewSet):
 @authentication_classes([])
 def get_menu_by_category(request, id_danhmuc):
     try:
-        items = Item.objects.filter(category_id=id_danhmuc)
+        items = Item.objects.select_related('category').filter(category_id=id_danhmuc)
         serializer = ItemSerializer(items, many=True, context={'request': request})
         return Response(serializer.data)
     except Exception:
@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from ..models import Order, OrderItem
+from ..models.order import next_version
+from ..events import STREAM_TOKEN_MAX_AGE, broker, publish_on_commit, sse_response, staff_stream, stream_token
+
+# Sự kiện màn hình bếp cần: đơn mới/gọi thêm ('order'), ra món ('kitchen'), bàn thanh toán/huỷ ('checkout', 'cancel')
+KITCHEN_EVENTS = {'order', 'kitchen', 'checkout', 'cancel'}
+
+def _unserved_lines():
+    return (OrderItem.objects.filter(is_served=False).exclude(order__status__in=['paid', 'cancelled'])
+            .values('id_chitiet', 'quantity', 'note', 'item_id', 'item__name', 'order_id',
+                    'order__table__number', 'order__created_at')
+            .order_by('item_id', 'id_chitiet'))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def kitchen_queue(request):
+    """Hàng chờ bếp: mọi dòng món chưa ra của các đơn đang mở, gom theo món (1 query).
+    ?order=<id>: chỉ lấy các dòng của 1 đơn (màn hình bếp gọi lại khi nhận sự kiện 'order').
+    `cursor` dùng làm ?since= khi mở /api/kitchen/stream/ để không lỡ thay đổi nào."""
+    try:
+        cursor = broker.last_id
+        lines = _unserved_lines()
+        order_id = request.query_params.get('order')
+        if order_id: lines = lines.filter(order_id=order_id)
+        groups = {}
+        for l in lines:
+            g = groups.get(l['item_id'])
+            if g is None:
+                g = groups[l['item_id']] = {'item_id': l['item_id'], 'name': l['item__name'], 'quantity': 0, 'tables': [], 'lines': []}
+            g['quantity'] += l['quantity']
+            if l['order__table__number'] not in g['tables']: g['tables'].append(l['order__table__number'])
+            g['lines'].append({'id': l['id_chitiet'], 'order_id': l['order_id'], 'table': l['order__table__number'],
+                               'quantity': l['quantity'], 'note': l['note'], 'ordered_at': l['order__created_at']})
+        return Response({'cursor': cursor, 'items': list(groups.values())})
+    except Exception as e: return Response({'error': str(e)}, 500)
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def kitchen_serve(request):
+    """Đánh dấu ra món (hoặc trả lại hàng chờ với served=false) cho nhiều dòng trong 1 lần: {'ids': [...], 'served': true}.
+    Phiên bản của các đơn liên quan được tăng để máy khách đang long-poll nhận thay đổi."""
+    try:
+        ids = request.data.get('ids') or []
+        if not isinstance(ids, list) or not all(str(i).isdigit() for i in ids): return Response({'error': 'ids phải là danh sách ID dòng món'}, 400)
+        served = request.data.get('served', True) not in (False, 'false', '0', 0)
+        pks = [int(i) for i in ids]
+        with transaction.atomic():
+            # Khoá đơn trước rồi mới đụng tới dòng món - cùng thứ tự với create_order nên không deadlock
+            current = dict(Order.objects.select_for_update()
+                           .filter(pk__in=OrderItem.objects.filter(pk__in=pks).values('order_id')).values_list('pk', 'version'))
+            changed = list(OrderItem.objects.filter(pk__in=pks, is_served=not served).values_list('id_chitiet', 'order_id', 'order__table_id'))
+            if changed:
+                # Mỗi đơn bị ảnh hưởng lên 1 phiên bản, các dòng vừa đổi mang phiên bản đó (2 UPDATE dùng CASE)
+                versions = {o: next_version(current[o]) for o in {o for _, o, _ in changed}}
+                Order.objects.filter(pk__in=versions).update(version=Case(*[When(pk=o, then=Value(v)) for o, v in versions.items()]))
+                OrderItem.objects.filter(pk__in=[pk for pk, _, _ in changed]).update(
+                    is_served=served, version=Case(*[When(order_id=o, then=Value(v)) for o, v in versions.items()]))
+        ids = [pk for pk, _, _ in changed]
+        if changed:
+            publish_on_commit('kitchen', {'ids': ids, 'served': served, 'order_ids': sorted({o for _, o, _ in changed}),
+                                          'table_ids': sorted({t for _, _, t in changed})})
+        return Response({'updated': len(changed), 'ids': ids})
+    except Exception as e: return Response({'error': str(e)}, 500)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def kitchen_stream_token(request):
+    """Token ngắn hạn để mở /api/kitchen/stream/?token=...; lấy token mới mỗi khi EventSource phải nối lại"""
+    return Response({'token': stream_token(request.user), 'expires_in': STREAM_TOKEN_MAX_AGE})
+
+# Trình duyệt dùng EventSource (không gửi được header Authorization) nên stream là view Django thường như notification_stream,
+# xác thực bằng session hoặc ?token= (sự kiện có tổng tiền / phương thức thanh toán của đơn)
+@require_GET
+@staff_stream
+def kitchen_stream(request):
+    return sse_response(request, types=KITCHEN_EVENTS)
@@ -1,81 +1,163 @@
-import base64, os
+import logging
 from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import OuterRef, Subquery, Sum
 from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser, AllowAny
 from rest_framework.response import Response
-from ..models import Table, Revenue, OrderItem, Item, Booking, Notification
+from ..models import Table, DailyRevenue, Item, OrderItem, ArchivedOrderItem, Booking, Notification
 from ..serializers import NotificationSerializer, TableSerializer
+from ..events import STREAM_TOKEN_MAX_AGE, sse_response, publish_on_commit, staff_stream, stream_token
+from .. import analytics, caching, exports, reservations
+from ..images import get_thumbnail, derivative_names
+
+logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 def reserve_table(request, id_ban):
+    Table.objects.filter(pk=id_ban).release_expired()
     table = get_object_or_404(Table, id=id_ban)
     if table.status != 'available': return Response({'error': 'Bàn bận'}, 400)
-    table.status = 'reserved'; table.reserved_at = timezone.now(); table.save()
-    return Response(TableSerializer(table).data)
+    table.status = 'reserved'; table.reserved_at = timezone.now(); table.expires_at = reservations.expires_at(table.reserved_at)
+    table.save(update_fields=['status', 'reserved_at', 'expires_at'])
+    data = TableSerializer(table).data
+    publish_on_commit('table', data)
+    return Response(data)
 
 @api_view(['GET'])
 def get_notifications(request):
-    return Response(NotificationSerializer(Notification.objects.all().order_by('-created_at'), many=True).data)
+    qs = Notification.objects.select_related('table').order_by('-created_at')
+    # ?since=<id>: chỉ lấy thông báo mới hơn id client đã có
+    since = request.query_params.get('since')
+    if since and since.isdigit(): qs = qs.filter(id__gt=int(since))
+    return Response(NotificationSerializer(qs, many=True).data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def notification_stream_token(request):
+    """Token ngắn hạn để mở /api/notifications/stream/?token=...; lấy token mới mỗi khi EventSource phải nối lại"""
+    return Response({'token': stream_token(request.user), 'expires_in': STREAM_TOKEN_MAX_AGE})
+
+# Stream SSE thay cho việc máy thu ngân poll /api/notifications/ (view Django thường vì DRF không render text/event-stream),
+# chỉ cho nhân viên: sự kiện có tổng tiền / phương thức thanh toán
+@require_GET
+@staff_stream
+def notification_stream(request):
+    return sse_response(request, types={'payment_request', 'order', 'checkout', 'table'}, on_tick=reservations.maybe_sweep)
+
+FALLBACK_IMG = "https://images.unsplash.com/photo-1579871494447-9811cf80d66c?q=80&w=200"
+
+def _best_sellers(request, limit=5):
+    """Top món bán chạy: 1 query trên items, ảnh trả về dạng link thumbnail nhỏ (không nhúng base64)"""
+    # Chỉ tính món của đơn đã thanh toán (đơn đang mở / đã huỷ không phải là món bán được), cộng cả đơn đã lưu trữ
+    live = (OrderItem.objects.filter(item=OuterRef('pk'), order__status='paid').order_by()
+            .values('item').annotate(n=Sum('quantity')).values('n'))
+    archived = ArchivedOrderItem.objects.filter(item_id=OuterRef('pk')).order_by().values('item_id').annotate(n=Sum('quantity')).values('n')
+    top = (Item.objects.annotate(total=Coalesce(Subquery(live), 0) + Coalesce(Subquery(archived), 0)).filter(total__gt=0)
+           .values('id', 'name', 'price', 'image', 'image_hash', 'total').order_by('-total')[:limit])
+    result = []
+    for t in top:
+        # Ưu tiên thumbnail dẫn xuất sẵn có, ảnh cũ chưa có thì tạo thumbnail lần đầu
+        thumb = derivative_names(t['image_hash'], t['image']).get('thumb')
+        if not thumb:
+            try: thumb = get_thumbnail(t['image'])
+            except Exception: thumb = None
+        img = request.build_absolute_uri(default_storage.url(thumb)) if thumb else FALLBACK_IMG
+        result.append({'id': t['id'], 'name': t['name'], 'price': t['price'], 'img': img, 'sold_count': t['total']})
+    return result
 
 @api_view(['GET'])
 def get_dashboard_stats(request):
     try:
         range_type = request.query_params.get('range', 'today'); today = timezone.now().date()
-        filter_kwargs = {'paid_at__date': today}
-        if range_type == 'yesterday': filter_kwargs = {'paid_at__date': today - timedelta(days=1)}
-        elif range_type == 'month': filter_kwargs = {'paid_at__date__gte': today.replace(day=1)}
-        elif range_type == 'year': filter_kwargs = {'paid_at__date__gte': today.replace(month=1, day=1)}
-
-        revenues = Revenue.objects.filter(**filter_kwargs)
-        total_rev = revenues.aggregate(t=Coalesce(Sum('amount'), 0))['t']
-        cash_rev = revenues.filter(method='cash').aggregate(t=Coalesce(Sum('amount'), 0))['t']
-        transfer_rev = revenues.filter(method='transfer').aggregate(t=Coalesce(Sum('amount'), 0))['t']
-
-        top = OrderItem.objects.values('item').annotate(total=Sum('quantity')).order_by('-total')[:5]
-        best_sellers = []
-        for t in top:
-            try:
-                i = Item.objects.get(pk=t['item'])
-                img = ""
-                if i.image and os.path.exists(i.image.path):
-                    with open(i.image.path, "rb") as f:
-                        img = f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}"
-                else: img = "https://images.unsplash.com/photo-1579871494447-9811cf80d66c?q=80&w=200"
-                best_sellers.append({'id': i.id, 'name': i.name, 'price': i.price, 'img': img, 'sold_count': t['total']})
-            except: continue
-
-        bookings = Booking.objects.filter(status='pending').order_by('-created_at')[:10]
-        bookings_data = []
+        # Link ảnh món bán chạy là tuyệt đối -> mỗi host 1 bản; đơn / doanh thu / đặt bàn đổi -> signals.py huỷ nhóm 'dashboard'
+        key = f"{range_type if range_type in ('yesterday', 'month', 'year') else 'today'}:{today}:{request.build_absolute_uri('/')}"
+        return Response(caching.dashboard.get_or_set(key, lambda: _dashboard_stats(request, range_type, today)))
+    except Exception as e:
+        logger.exception("Lỗi Dashboard")
+        return Response({'error': str(e)}, status=500)
+
+def _dashboard_stats(request, range_type, today):
+    start, end = today, today
+    if range_type == 'yesterday': start = end = today - timedelta(days=1)
+    elif range_type == 'month': start = today.replace(day=1)
+    elif range_type == 'year': start = today.replace(month=1, day=1)
+
+    # Đọc từ bảng tổng hợp theo ngày: tối đa ~366 dòng, 1 query gom theo phương thức
+    by_method = {r['method']: r for r in DailyRevenue.objects.filter(day__gte=start, day__lte=end)
+                 .values('method').annotate(t=Sum('total'), n=Sum('count')).order_by()}
+    total_rev = sum(r['t'] for r in by_method.values())
+    order_count = sum(r['n'] for r in by_method.values())
+    cash_rev = by_method.get('cash', {}).get('t', 0)
+    transfer_rev = by_method.get('transfer', {}).get('t', 0)
+
+    best_sellers = _best_sellers(request)
+
+    bookings = Booking.objects.filter(status='pending').order_by('-created_at')[:10]
+    bookings_data = []
+    
+    for b in bookings:
+        # 1. Format ngày giờ thành dd/mm/yyyy HH:MM
+        # Lưu ý: Cần import method strftime nếu chưa có (thực ra nó thuộc về datetime object có sẵn)
+        fmt_time = b.booking_time.strftime("%d/%m/%Y %H:%M") if b.booking_time else ""
         
-        for b in bookings:
-            # 1. Format ngày giờ thành dd/mm/yyyy HH:MM
-            # Lưu ý: Cần import method strftime nếu chưa có (thực ra nó thuộc về datetime object có sẵn)
-            fmt_time = b.booking_time.strftime("%d/%m/%Y %H:%M") if b.booking_time else ""
-            
-            bookings_data.append({
-                "id": b.id,
-                "customer_name": b.customer_name,
-                "name": b.customer_name,  # <--- THÊM DÒNG NÀY: Để Frontend hiển thị được cột "Tên khách"
-                "phone": b.customer_phone,
-                "time": fmt_time,         # <--- SỬA DÒNG NÀY: Trả về ngày giờ đã format dễ đọc
-                "guests": b.guest_count,
-                "status": b.status
-            })
-        # --------------------
-
-        return Response({
-            "revenue": {"total": total_rev, "cash": cash_rev, "transfer": transfer_rev, "orders": revenues.count()},
-            "best_sellers": best_sellers, 
-            "bookings": bookings_data # Trả về data mới đã sửa
+        bookings_data.append({
+            "id": b.id,
+            "customer_name": b.customer_name,
+            "name": b.customer_name,  # <--- THÊM DÒNG NÀY: Để Frontend hiển thị được cột "Tên khách"
+            "phone": b.customer_phone,
+            "time": fmt_time,         # <--- SỬA DÒNG NÀY: Trả về ngày giờ đã format dễ đọc
+            "guests": b.guest_count,
+            "status": b.status
         })
-        
+    # --------------------
+
+    return {
+        "revenue": {"total": total_rev, "cash": cash_rev, "transfer": transfer_rev, "orders": order_count,
+                    "by_method": {m: r['t'] for m, r in by_method.items()}},
+        "best_sellers": best_sellers, 
+        "bookings": bookings_data # Trả về data mới đã sửa
+    }
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_sales_analytics(request):
+    """Doanh thu + món bán theo khung: ?bucket=hour|day|week|month&from=&to=&method=cash,card&category=1,2&limit=10
+    from/to là ngày (YYYY-MM-DD, `to` tính trọn ngày) hoặc datetime ISO; mặc định 30 ngày gần nhất"""
+    try:
+        params = analytics.parse_params(request.query_params)
+        limit = request.query_params.get('limit', '10')
+        return Response(analytics.report(params, int(limit) if limit.isdigit() else 10))
+    except ValueError as e: return Response({'error': str(e)}, 400)
     except Exception as e:
-        print("Lỗi Dashboard:", e)
-        return Response({'error': str(e)}, status=500)
+        logger.exception("Lỗi thống kê doanh thu")
+        return Response({'error': str(e)}, 500)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_cache_stats(request):
+    """Số lần trúng LRU trong RAM / trúng cache dùng chung / trượt của từng nhóm cache, tính trong worker trả lời request"""
+    return Response(caching.stats())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_data(request, dataset, fmt):
+    """/api/export/<revenues|orders|order_items>.<csv|xlsx|json>?from=YYYY-MM-DD&to=YYYY-MM-DD (to tính trọn ngày).
+    File được stream theo từng trang dữ liệu nên xuất 1 ngày hay 5 năm đều dùng chừng ấy RAM"""
+    try:
+        q = request.query_params
+        start = analytics.parse_time(q['from']) if q.get('from') else None
+        end = analytics.parse_time(q['to'], inclusive_end=True) if q.get('to') else None
+        body = exports.stream(dataset, fmt, start, end)
+    except ValueError as e: return Response({'error': str(e)}, 400)
+    res = StreamingHttpResponse(body, content_type=exports.FORMATS[fmt])
+    res['Content-Disposition'] = f'attachment; filename="{exports.filename(dataset, fmt, start, end)}"'
+    return res
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -1,90 +1,118 @@
+import json, time
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from ..models import Order, OrderItem, Table, Item, Revenue, Notification
-from ..serializers import OrderSerializer, TableSerializer
-import math
+from ..models.order import next_version
+from ..serializers import OrderSerializer, TableSerializer, NotificationSerializer
+from ..events import broker, publish_on_commit
+from .. import caching, reservations
+from ..geofence import geofenced
+from ..idempotency import idempotent
+# Long-poll get_order_by_table giữ 1 thread WSGI tối đa chừng này giây
+LONGPOLL_MAX_SECONDS = getattr(settings, 'EMENU_LONGPOLL_MAX_SECONDS', 25)
+ORDER_EVENTS = {'order', 'kitchen', 'checkout', 'cancel'}
+
+class OrderCursorPagination(CursorPagination):
+    # Phân trang theo con trỏ id_donhang: không OFFSET nên trang sau nhanh như trang đầu khi bảng orders lớn
+    ordering = '-id_donhang'; page_size_query_param = 'page_size'; max_page_size = 200
+
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().order_by('-id_donhang'); serializer_class = OrderSerializer
+    queryset = Order.objects.select_related('table').prefetch_related('items__item').order_by('-id_donhang')
+    serializer_class = OrderSerializer; pagination_class = OrderCursorPagination
     def create(self, request, *args, **kwargs): return create_order(request)
 
 class TableViewSet(viewsets.ModelViewSet):
-    queryset = Table.objects.all().order_by('id'); serializer_class = TableSerializer
+    queryset = Table.objects.with_open_order().order_by('id'); serializer_class = TableSerializer
+    def list(self, request, *args, **kwargs):
+        reservations.maybe_sweep()  # Bàn hết hạn được trả trước khi liệt kê (tối đa 1 lần / chu kỳ quét)
+        # Cache theo URL (trang, bộ lọc); bàn / đơn đổi -> nhóm 'tables' bị huỷ ở mọi worker (signals.py, caching.py)
+        build = super().list
+        return Response(caching.tables.get_or_set(request.get_full_path(), lambda: build(request, *args, **kwargs).data))
+
+def _touches_table(event, table_id):
+    if event['type'] == 'resync': return True
+    data = json.loads(event['json'])
+    return data.get('table_id') == table_id or table_id in data.get('table_ids', ())
 
 @api_view(['GET'])
 def get_order_by_table(request, table_id):
+    """Đơn đang mở của bàn. ?since=<version>: 304 nếu đơn chưa đổi, ngược lại chỉ trả các món có dòng đổi sau
+    phiên bản đó (delta=true). Thêm ?wait=<giây> để long-poll: giữ request tới khi đơn đổi hoặc hết giờ."""
     try:
-        order = Order.objects.filter(table=table_id).exclude(status__in=['paid', 'cancelled']).last()
-        return Response(OrderSerializer(order, context={'request': request}).data) if order else Response(None, 200)
+        since = request.query_params.get('since', '')
+        if not since.isdigit():
+            order = Order.objects.open().filter(table=table_id).select_related('table').prefetch_related('items__item').last()
+            return Response(OrderSerializer(order, context={'request': request}).data) if order else Response(None, 200)
+
+        since = int(since)
+        try: wait = min(max(float(request.query_params.get('wait') or 0), 0), LONGPOLL_MAX_SECONDS)
+        except ValueError: wait = 0
+        cursor = broker.last_id  # Lấy con trỏ trước khi đọc DB để không lỡ thay đổi xảy ra giữa chừng
+        head = lambda: Order.objects.open().filter(table=table_id).order_by('-id_donhang').values('id_donhang', 'version').first()
+        current, deadline = head(), time.monotonic() + wait
+        while current and current['version'] <= since and (left := deadline - time.monotonic()) > 0:
+            cursor, events = broker.wait(cursor, left, ORDER_EVENTS)
+            # Hết giờ cũng đọc lại 1 lần: thay đổi có thể đến từ tiến trình khác
+            if not events or any(_touches_table(e, table_id) for e in events): current = head()
+        if current is None: return Response(None, 200)
+        if current['version'] <= since: return Response(status=304)
+        order = Order.objects.select_related('table').prefetch_related('items__item').get(pk=current['id_donhang'])
+        data = OrderSerializer(order, context={'request': request, 'since': since}).data
+        data['delta'] = True
+        return Response(data)
     except Exception as e: return Response({'error': str(e)}, 500)
 
-# --- HÀM PHỤ: TÍNH KHOẢNG CÁCH (Haversine) ---
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371000 # Bán kính trái đất (mét)
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-
-    a = math.sin(delta_phi / 2.0) ** 2 + \
-        math.cos(phi1) * math.cos(phi2) * \
-        math.sin(delta_lambda / 2.0) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-# --- HÀM PHỤ: TÍNH KHOẢNG CÁCH (Haversine) ---
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371000 # Bán kính trái đất (mét)
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-
-    a = math.sin(delta_phi / 2.0) ** 2 + \
-        math.cos(phi1) * math.cos(phi2) * \
-        math.sin(delta_lambda / 2.0) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+# --- HÀM PHỤ: GOM GIỎ HÀNG THEO MÓN ---
+def _parse_cart(items_data):
+    """Trả về {id_mon: [số lượng, [ghi chú...]]}, món trùng trong giỏ được cộng dồn"""
+    cart = {}
+    for i in items_data:
+        pid = i.get('product_id') or i.get('itemId') or i.get('id')
+        if not pid: continue
+        line = cart.setdefault(int(pid), [0, []])
+        line[0] += int(i.get('quantity', 1))
+        if i.get('note'): line[1].append(i['note'])
+    return cart
+
+# --- HÀM PHỤ: CỘNG DỒN GIỎ HÀNG VÀO ĐƠN (1 SELECT + 1 UPDATE + 1 INSERT) ---
+# Gọi trong transaction đã khoá bàn (create_order)
+def _merge_cart(order, cart, version):
+    existing = {}
+    for line in OrderItem.objects.filter(order=order, item_id__in=list(cart), is_served=False).order_by('id_chitiet'):
+        existing.setdefault(line.item_id, line)
+
+    to_update, to_create = [], []
+    for pid, (qty, notes) in cart.items():
+        note = ", ".join(notes)
+        exist = existing.get(pid)
+        if exist:
+            # 🔥 LOGIC QUAN TRỌNG: CỘNG DỒN SỐ LƯỢNG (+=) ngay trong DB bằng F()
+            exist.quantity = F('quantity') + qty
+            if note: exist.note = f"{exist.note}, {note}" if exist.note else note
+            exist.version = version
+            to_update.append(exist)
+        else:
+            to_create.append(OrderItem(order=order, item_id=pid, quantity=qty, note=note, version=version))
+
+    if to_update: OrderItem.objects.bulk_update(to_update, ['quantity', 'note', 'version'])
+    if to_create: OrderItem.objects.bulk_create(to_create)
 
 # --- API TẠO ĐƠN (ĐÃ GỘP CHECK VỊ TRÍ + CỘNG DỒN MÓN) ---
 @api_view(['POST'])
+@idempotent
+@geofenced
 def create_order(request):
     try:
+        # Vị trí khách đã được kiểm tra ở @geofenced (EMENU/geofence.py)
         # ==================================================================
-        # 🛡️ BƯỚC 1: BẢO MẬT VỊ TRÍ (GEOFENCING)
-        # ==================================================================
-        
-        # Cấu hình tọa độ quán (Thay số thực tế của bạn vào đây)
-        SHOP_LAT = 10.824682   
-        SHOP_LON = 106.720029
-        MAX_DISTANCE = 150    # Cho phép sai số 150 mét
-        
-        # Lấy tọa độ khách gửi lên từ Frontend
-        user_lat = request.data.get('lat')
-        user_lon = request.data.get('lon')
-
-        # Debug xem khách gửi gì lên (xem trong Terminal)
-        print(f"📡 Khách đang ở: {user_lat}, {user_lon}")
-
-        if not user_lat or not user_lon:
-            # Nếu khách dùng tool để order mà không gửi tọa độ -> CHẶN
-            return Response({'error': 'Yêu cầu bật Vị trí (GPS) trên thiết bị để đặt món!'}, status=400)
-
-        # Tính khoảng cách
-        try:
-            dist = calculate_distance(SHOP_LAT, SHOP_LON, float(user_lat), float(user_lon))
-        except ValueError:
-             return Response({'error': 'Tọa độ GPS không hợp lệ!'}, status=400)
-
-        print(f"📏 Khoảng cách tới quán: {int(dist)} mét")
-
-        if dist > MAX_DISTANCE:
-            return Response({'error': f'Bạn đang cách quán {int(dist)}m. Vui lòng lại gần quán để đặt!'}, status=403)
-
-        # ==================================================================
-        # 🛒 BƯỚC 2: XỬ LÝ ĐƠN HÀNG (Logic cộng dồn món)
+        # 🛒 XỬ LÝ ĐƠN HÀNG (Logic cộng dồn món)
         # ==================================================================
         
         data = request.data
@@ -93,57 +121,42 @@ def create_order(request):
         
         if not table_id: return Response({'error': 'Thiếu ID bàn'}, 400)
         
-        table = get_object_or_404(Table, pk=table_id)
-        
-        # Tìm đơn hàng hiện tại của bàn (chưa thanh toán, chưa hủy)
-        order = Order.objects.filter(table=table).exclude(status__in=['paid', 'cancelled']).last()
-        if not order:
-            order = Order.objects.create(table=table, status='pending', total=0)
-        
-        if table.status == 'available':
-            table.status = 'occupied'; table.save()
-
-        # --- XỬ LÝ MÓN ĂN ---
-        for i in items_data:
-            # 1. Lấy ID chuẩn
-            pid = i.get('product_id') or i.get('itemId') or i.get('id') 
-            if not pid: pid = i.get('id') # Fallback
-            if not pid: continue 
-
-            # 2. Tìm món trong Menu
-            item = Item.objects.filter(pk=pid).first()
-            if not item: 
-                return Response({'error': f"Lỗi: Không tìm thấy món ID={pid}"}, 400)
-
-            # 3. Lấy số lượng và ghi chú
-            qty = int(i.get('quantity', 1))
-            note = i.get('note', '')
-
-            # 4. Kiểm tra món này đã có trong đơn chưa (và chưa ra món)
-            exist = OrderItem.objects.filter(order=order, item=item, is_served=False).first()
-            
-            if exist:
-                # 🔥 LOGIC QUAN TRỌNG: CỘNG DỒN SỐ LƯỢNG (+=)
-                exist.quantity += qty 
-                
-                # Gộp ghi chú nếu có
-                if note: 
-                    exist.note = f"{exist.note}, {note}" if exist.note else note
-                
-                exist.save()
-            else:
-                # Nếu chưa có thì tạo mới
-                OrderItem.objects.create(order=order, item=item, quantity=qty, note=note)
-
-        # 5. Tính lại tổng tiền (Loop qua DB để chính xác tuyệt đối)
-        total_price = 0
-        current_items = OrderItem.objects.filter(order=order)
-        for line in current_items:
-            total_price += line.quantity * line.item.price
-
-        order.total = total_price
-        order.save()
-        
+        # Kiểm tra toàn bộ món trong giỏ bằng 1 query trước khi ghi gì vào DB
+        cart = _parse_cart(items_data)
+        menu = Item.objects.in_bulk(list(cart))
+        missing = [pid for pid in cart if pid not in menu]
+        if missing:
+            return Response({'error': f"Lỗi: Không tìm thấy món ID={missing[0]}"}, 400)
+
+        # Nhiều điện thoại cùng bàn gửi đồng thời: khoá dòng bàn để các lượt gộp món chạy lần lượt,
+        # không sinh 2 đơn mở và không mất số lượng
+        with transaction.atomic():
+            table = get_object_or_404(Table.objects.select_for_update(), pk=table_id)
+
+            # Tìm đơn hàng hiện tại của bàn (chưa thanh toán, chưa hủy)
+            order = Order.objects.open().filter(table=table).select_for_update().last()
+            if not order:
+                order = Order.objects.create(table=table, status='pending', total=0)
+
+            if table.status != 'occupied':
+                # Khách của bàn đặt trước đã tới -> bỏ hạn giữ chỗ để bộ quét không trả bàn khi đơn còn mở
+                table.status = 'occupied'; table.reserved_at = table.expires_at = None
+                table.save(update_fields=['status', 'reserved_at', 'expires_at'])
+
+            # --- XỬ LÝ MÓN ĂN (gộp theo lô: số query cố định bất kể giỏ hàng dài bao nhiêu) ---
+            # Đơn đã bị khoá nên tính phiên bản mới ngay ở đây được
+            version = next_version(order.version)
+            _merge_cart(order, cart, version)
+
+            # Cộng dồn tổng tiền bằng F() theo phần vừa thêm, không tính lại cả đơn
+            delta = sum(qty * menu[pid].price for pid, (qty, _) in cart.items())
+            Order.objects.filter(pk=order.pk).update(total=F('total') + delta, version=version)
+            order.total += delta; order.version = version
+            caching.changed('tables')  # update() không phát signal
+
+        order.table = table
+        prefetch_related_objects([order], 'items__item')
+        publish_on_commit('order', {'table_id': table.id, 'order_id': order.pk, 'total': order.total})
         return Response(OrderSerializer(order, context={'request': request}).data, status=201)
         
     except Exception as e:
@@ -151,18 +164,22 @@ def create_order(request):
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
+@idempotent
 def checkout(request, table_id):
     try:
-        table = get_object_or_404(Table, id=table_id)
-        order = Order.objects.filter(table=table).exclude(status__in=['paid', 'cancelled', 'served']).last()
-        if not order: order = Order.objects.filter(table=table).exclude(status='paid').last()
-        if not order: return Response({'error': 'Không có đơn'}, 400)
-
-        method = request.data.get('payment_method', 'cash')
-        Revenue.objects.create(order=order, method=method, amount=order.total)
-        order.status = 'paid'; order.save()
-        table.status = 'available'; table.save()
-        Notification.objects.filter(table=table).delete()
+        with transaction.atomic():
+            # Khoá bàn: không cho gộp món mới vào đơn đang được thanh toán
+            table = get_object_or_404(Table.objects.select_for_update(), id=table_id)
+            order = Order.objects.filter(table=table).exclude(status__in=['paid', 'cancelled', 'served']).last()
+            if not order: order = Order.objects.filter(table=table).exclude(status='paid').last()
+            if not order: return Response({'error': 'Không có đơn'}, 400)
+
+            method = request.data.get('payment_method', 'cash')
+            Revenue.objects.create(order=order, method=method, amount=order.total)
+            order.status = 'paid'; order.version = next_version(order.version); order.save()
+            table.status = 'available'; table.save()
+            Notification.objects.filter(table=table).delete()
+        publish_on_commit('checkout', {'table_id': table.id, 'order_id': order.pk, 'amount': order.total, 'method': method})
         return Response({'message': 'Thanh toán thành công'})
     except Exception as e: return Response({'error': str(e)}, 500)
 
@@ -174,7 +191,9 @@ def cancel_order(request):
         if not table_id: return Response({'error': 'Thiếu ID'}, 400)
         Order.objects.filter(table_id=table_id).exclude(status='paid').delete()
         Table.objects.filter(id=table_id).update(status='available', reserved_at=None, expires_at=None)
+        caching.changed('tables')
         Notification.objects.filter(table_id=table_id).delete()
+        publish_on_commit('cancel', {'table_id': int(table_id)})
         return Response({'message': 'Đã hủy đơn'})
     except Exception as e: return Response({'error': str(e)}, 500)
 
@@ -182,6 +201,7 @@ def cancel_order(request):
 def request_payment(request):
     try:
         table = Table.objects.get(id=request.data.get('table_id'))
-        Notification.objects.create(table=table, message=f"{table.number} yêu cầu thanh toán", is_read=False)
+        noti = Notification.objects.create(table=table, message=f"{table.number} yêu cầu thanh toán", is_read=False)
+        publish_on_commit('payment_request', NotificationSerializer(noti).data)
         return Response({'success': True})
     except: return Response({'error': 'Lỗi'}, 500)
@@ -0,0 +1,110 @@
+"""Hàm dùng chung cho các script benchmark: dựng Django trên DB tạm (mặc định SQLite) và đo thời gian"""
+import os, sys, json, tempfile, threading, time, statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+# Fix encoding cho Windows console
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+def setup(mysql=False):
+    """Khởi tạo Django. mysql=False: SQLite trong thư mục tạm; mysql=True: tạo DB test_<tên DB> trên MySQL cấu hình sẵn.
+    Không bao giờ ghi vào DB thật."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'site1.settings')
+    import django
+    from django.conf import settings
+    tmp = tempfile.mkdtemp(prefix='emenu-bench-')
+    if not mysql:
+        # IMMEDIATE + timeout: các thread ghi đồng thời xếp hàng thay vì lỗi "database is locked"
+        settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(tmp, 'bench.sqlite3'),
+                                         'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 30},
+                                         'TEST': {'NAME': os.path.join(tmp, 'bench.sqlite3')}}
+    settings.MEDIA_ROOT = os.path.join(tmp, 'media')
+    settings.ALLOWED_HOSTS = ['*']
+    settings.DEBUG = False
+    django.setup()
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    return tmp
+
+def export_env():
+    """Biến môi trường để tiến trình con (server cần đo) dùng lại đúng DB/media tạm mà setup() vừa tạo"""
+    from django.conf import settings
+    return {**os.environ, 'EMENU_BENCH_DB': json.dumps(settings.DATABASES['default'], default=str),
+            'EMENU_BENCH_MEDIA': str(settings.MEDIA_ROOT)}
+
+def attach():
+    """Trong tiến trình con: trỏ Django vào DB/media của tiến trình cha (không tạo DB mới)"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'site1.settings')
+    import django
+    from django.conf import settings
+    settings.DATABASES['default'] = json.loads(os.environ['EMENU_BENCH_DB'])
+    settings.MEDIA_ROOT = os.environ['EMENU_BENCH_MEDIA']
+    settings.ALLOWED_HOSTS = ['*']
+    settings.DEBUG = False
+    django.setup()
+
+def measure(fn, repeat=50, warmup=3):
+    """Chạy fn `repeat` lần, trả về danh sách thời gian (ms)"""
+    for _ in range(warmup): fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter(); fn(); samples.append((time.perf_counter() - t) * 1000)
+    return samples
+
+def percentile(samples, p):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+def summary(samples):
+    return {'p50_ms': round(percentile(samples, 50), 3), 'p95_ms': round(percentile(samples, 95), 3),
+            'p99_ms': round(percentile(samples, 99), 3), 'mean_ms': round(statistics.fmean(samples), 3), 'n': len(samples)}
+
+def report(title, rows):
+    """In bảng kết quả dạng {tên: {chỉ số: giá trị}}"""
+    print(f"\n== {title} ==")
+    for name, stats in rows.items():
+        print(f"  {name:<32} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+
+def dump(path, data):
+    with open(path, 'w', encoding='utf-8') as f: json.dump(data, f, ensure_ascii=False, indent=2)
+
+def serve_wsgi():
+    """Chạy app WSGI của Django trên 127.0.0.1 (cổng ngẫu nhiên, mỗi request 1 thread) và trả về base URL.
+    Số query của mỗi request được trả kèm trong header X-Bench-Queries."""
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connection
+    app = get_wsgi_application()
+
+    def counted(environ, start_response):
+        queries = [0]
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+        def start(status, headers, exc_info=None):
+            return start_response(status, headers + [('X-Bench-Queries', str(queries[0]))], exc_info)
+        with connection.execute_wrapper(count): return app(environ, start)
+
+    class Server(ThreadingMixIn, WSGIServer):
+        daemon_threads = True; request_queue_size = 256
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args): pass
+    server = make_server('127.0.0.1', 0, counted, server_class=Server, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+def compare(base_path, results):
+    """In chênh lệch so với file JSON của lần chạy trước (vd. commit trước)"""
+    with open(base_path, encoding='utf-8') as f: base = json.load(f)
+    print(f"\n== So với {base_path} ==")
+    for name, stats in results.items():
+        old = base.get(name)
+        if not old: continue
+        diffs = []
+        for k in ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries_per_req'):
+            if k in stats and old.get(k):
+                diffs.append(f"{k} {old[k]} -> {stats[k]} ({(stats[k] - old[k]) / old[k] * 100:+.1f}%)")
+        print(f"  {name:<32} " + "  ".join(diffs))
@@ -0,0 +1,83 @@
+"""Đo /api/dashboard/analytics/ trên 1 năm dữ liệu giả lập: lần đầu (cache trống), lần sau (khung đã đóng lấy từ cache,
+chỉ truy vấn khung đang mở) và khoảng đã đóng hẳn (0 query). In EXPLAIN của câu SQL gom nhóm.
+
+    python benchmarks/bench_analytics.py [--mysql] [--orders-per-day 150] [--repeat 20] [--json out.json] [--compare base.json]
+"""
+import argparse, datetime, random
+import _common
+
+def seed(per_day, days=365):
+    from django.utils import timezone
+    from EMENU.models import Category, Item, Table, Order, OrderItem, Revenue
+    rnd = random.Random(21)
+    cats = [Category.objects.create(name=f'Nhóm {i}') for i in range(6)]
+    items = Item.objects.bulk_create([Item(category=cats[i % 6], name=f'Món {i}', price=20000 + 1000 * i) for i in range(60)])
+    tables = Table.objects.bulk_create([Table(number=f'Bàn {i + 1}') for i in range(30)])
+    start = timezone.now().replace(minute=0, second=0, microsecond=0) - datetime.timedelta(days=days)
+    for day in range(days):
+        orders = Order.objects.bulk_create([Order(table=rnd.choice(tables), status='paid', total=0) for _ in range(per_day)])
+        OrderItem.objects.bulk_create([OrderItem(order=o, item=rnd.choice(items), quantity=rnd.randint(1, 3), is_served=True)
+                                       for o in orders for _ in range(3)], batch_size=2000)
+        revenues = Revenue.objects.bulk_create([Revenue(order=o, method=rnd.choice(['cash', 'card', 'momo']), amount=100000) for o in orders])
+        # auto_now_add ghi đè paid_at/created_at -> rải đều trong giờ mở cửa 10h-22h bằng update theo từng giờ
+        by_hour = {}
+        for r in revenues: by_hour.setdefault(rnd.randint(10, 21), []).append(r.pk)
+        for hour, pks in by_hour.items():
+            paid_at = start + datetime.timedelta(days=day, hours=hour - start.hour)
+            Revenue.objects.filter(pk__in=pks).update(paid_at=paid_at)
+            Order.objects.filter(revenues__in=pks).update(created_at=paid_at - datetime.timedelta(minutes=45))
+    # Cập nhật thống kê cho query planner (MySQL tự làm; SQLite không có thì chọn đi từ danh mục thay vì khoảng paid_at)
+    from django.db import connection
+    with connection.cursor() as cur:
+        if connection.vendor == 'sqlite': cur.execute('ANALYZE')
+        else: cur.execute('ANALYZE TABLE revenues, orders, order_items, items')
+    return cats
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--orders-per-day', type=int, default=150)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    _common.setup(mysql=args.mysql)
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from EMENU import analytics
+    cats = seed(args.orders_per_day)
+    client = APIClient()
+    client.force_authenticate(User.objects.create_superuser('bench', password='x'))
+    year_ago = (timezone.now() - datetime.timedelta(days=365)).date().isoformat()
+    last_month = (timezone.now().date().replace(day=1) - datetime.timedelta(days=1)).isoformat()
+    scenarios = {
+        'nam, theo ngay': {'bucket': 'day', 'from': year_ago},
+        'nam, theo gio': {'bucket': 'hour', 'from': year_ago},
+        'nam, theo tuan, method=cash': {'bucket': 'week', 'from': year_ago, 'method': 'cash'},
+        'nam, theo thang, 1 danh muc': {'bucket': 'month', 'from': year_ago, 'category': str(cats[0].id)},
+        'nam toi het thang truoc (da dong)': {'bucket': 'day', 'from': year_ago, 'to': last_month},
+    }
+    p = analytics.parse_params({'bucket': 'day', 'from': year_ago})
+    explain = analytics.build_query(p['start'], p['end'], 'day').explain()
+    print('EXPLAIN (nam, theo ngay):\n' + explain + '\n')
+
+    results = {}
+    for name, params in scenarios.items():
+        get = lambda: client.get('/api/dashboard/analytics/', params)
+        cache.clear()
+        cold = _common.measure(get, 1, warmup=0)
+        with CaptureQueriesContext(connection) as ctx: res = get()
+        assert res.status_code == 200, res.content
+        results[name] = {'cold_ms': round(cold[0], 1), 'queries': len(ctx.captured_queries), 'buckets': len(res.json()['series']),
+                         **_common.summary(_common.measure(get, args.repeat))}
+    _common.report(f'Analytics, 1 năm x {args.orders_per_day} đơn/ngày (cold = cache trống, còn lại = khung đóng từ cache)', results)
+    if args.compare: _common.compare(args.compare, results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Đo các truy vấn nóng trước và sau khi lưu trữ đơn cũ (manage.py archive_orders) trên 1 năm dữ liệu giả lập,
+cùng tốc độ lưu trữ. Thống kê / món bán chạy phải cho cùng kết quả ở cả 2 lần đo.
+
+    python benchmarks/bench_archive.py [--mysql] [--orders-per-day 150] [--days 90] [--repeat 30] [--json out.json] [--compare base.json]
+"""
+import argparse, datetime, time
+import _common
+from bench_analytics import seed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--orders-per-day', type=int, default=150)
+    parser.add_argument('--days', type=int, default=90, help='Lưu trữ đơn cũ hơn số ngày này')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    _common.setup(mysql=args.mysql)
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.utils import timezone
+    from EMENU import analytics, archive
+    from EMENU.models import ArchivedOrder, Order, OrderItem, Table
+    from EMENU.views.manage_views import _best_sellers
+    seed(args.orders_per_day)
+    tables = list(Table.objects.all())
+    for t in tables:  # Mỗi bàn có 1 đơn đang mở
+        o = Order.objects.create(table=t, total=0)
+        OrderItem.objects.create(order=o, item_id=OrderItem.objects.values_list('item_id', flat=True).first())
+    request = RequestFactory().get('/api/dashboard/stats/')
+    year = analytics.parse_params({'bucket': 'month', 'from': (timezone.now() - datetime.timedelta(days=366)).date().isoformat()})
+
+    def year_report():
+        cache.clear()
+        return {k: v for k, v in analytics.report(year).items() if k != 'cached'}
+
+    probes = {
+        'don mo cua ban (create_order)': lambda: [Order.objects.open().filter(table=t).last() for t in tables[:10]],
+        'ban + don mo (GET /api/tables/)': lambda: list(Table.objects.with_open_order()),
+        'thong ke ca nam, cache trong': year_report,
+        'mon ban chay': lambda: _best_sellers(request),
+    }
+
+    def measure(label):
+        with connection.cursor() as cur:
+            cur.execute('ANALYZE' if connection.vendor == 'sqlite' else 'ANALYZE TABLE orders, order_items, revenues, orders_archive, order_lines_archive, revenues_archive')
+        return {f'{label} | {name}': _common.summary(_common.measure(fn, args.repeat if 'thong ke' not in name else 3, warmup=1))
+                for name, fn in probes.items()}
+
+    results = measure('truoc')
+    expected = (year_report(), _best_sellers(request))
+    t = time.perf_counter()
+    moved = archive.archive_orders(args.days)
+    elapsed = time.perf_counter() - t
+    results['archive_orders'] = {'orders': moved, 'seconds': round(elapsed, 2), 'orders_per_s': round(moved / elapsed),
+                                 'live_orders': Order.objects.count(), 'archived': ArchivedOrder.objects.count()}
+    results.update(measure('sau'))
+    assert (year_report(), _best_sellers(request)) == expected, 'Kết quả thống kê đổi sau khi lưu trữ'
+    _common.report(f'Lưu trữ đơn > {args.days} ngày, {args.orders_per_day} đơn/ngày', results)
+    if args.compare: _common.compare(args.compare, results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""So sánh WSGI (view DRF đồng bộ, server thread) và ASGI (uvicorn + EMENU/views/async_views.py)
+trên các endpoint đọc công khai với hàng trăm kết nối đồng thời. Client là asyncio thuần, không cần mạng.
+
+    pip install uvicorn   # chỉ cần cho phía ASGI
+    python benchmarks/bench_asgi.py [--mysql] [--connections 500] [--duration 10] [--servers wsgi,asgi]
+                                    [--scenarios menu,category,order,longpoll] [--json out.json] [--compare base.json]
+
+Mỗi server chạy ở tiến trình con riêng, dùng chung DB tạm do script này tạo.
+Kịch bản longpoll: mọi kết nối chờ đơn của bàn đổi (?since=&wait=2) -> WSGI giữ 1 thread cho mỗi kết nối đang chờ.
+"""
+import argparse, asyncio, os, socket, subprocess, sys, time
+import _common
+
+def serve(kind, port):
+    """Chạy trong tiến trình con"""
+    os.environ['EMENU_ASYNC_VIEWS'] = '1' if kind == 'asgi' else '0'
+    _common.attach()
+    if kind == 'asgi':
+        import uvicorn
+        from django.core.asgi import get_asgi_application
+        uvicorn.run(get_asgi_application(), host='127.0.0.1', port=port, log_level='warning', backlog=4096)
+    else:
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+        from django.core.wsgi import get_wsgi_application
+        class Server(ThreadingMixIn, WSGIServer):
+            daemon_threads = True; request_queue_size = 4096
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args): pass
+        make_server('127.0.0.1', port, get_wsgi_application(), server_class=Server, handler_class=QuietHandler).serve_forever()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0)); return s.getsockname()[1]
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), 0.5): return
+        except OSError: time.sleep(0.1)
+    raise RuntimeError(f'Server cổng {port} không khởi động được')
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        await reader.read()  # Đọc tới khi server đóng kết nối
+        return status
+    finally:
+        writer.close()
+
+async def load(port, paths, connections, duration):
+    samples, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def worker(n):
+        nonlocal errors
+        i = n
+        while time.monotonic() < deadline:
+            t = time.perf_counter()
+            try: ok = (await fetch(port, paths[i % len(paths)])) < 400
+            except (OSError, IndexError, ValueError): ok = False
+            i += 1
+            if ok: samples.append((time.perf_counter() - t) * 1000)
+            else: errors += 1
+    started = time.monotonic()
+    await asyncio.gather(*(worker(n) for n in range(connections)))
+    return samples, errors, time.monotonic() - started
+
+def seed(n_tables):
+    from EMENU.models import Category, Item, Order, OrderItem, Table
+    cats = [Category.objects.create(name=f'Nhóm {i}') for i in range(8)]
+    items = Item.objects.bulk_create([Item(category=cats[i % 8], name=f'Món {i}', price=10000 + i) for i in range(120)])
+    tables = Table.objects.bulk_create([Table(number=f'Bàn {i + 1}') for i in range(n_tables)])
+    orders = Order.objects.bulk_create([Order(table=t, total=30000, version=1) for t in tables])
+    OrderItem.objects.bulk_create([OrderItem(order=o, item=items[(o.pk + k) % 120], quantity=1, version=1) for o in orders for k in range(4)])
+    return [c.id for c in cats], [t.id for t in tables]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--servers', default='wsgi,asgi')
+    parser.add_argument('--scenarios', default='menu,category,order,longpoll')
+    parser.add_argument('--json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+    if args.serve: return serve(args.serve, args.port)
+
+    _common.setup(mysql=args.mysql)
+    cat_ids, table_ids = seed(50)
+    scenarios = {
+        'menu': ['/menu/data/'],
+        'category': [f'/api/menu/category/{c}/' for c in cat_ids],
+        'order': [f'/api/orders/table/{t}/' for t in table_ids],
+        'longpoll': [f'/api/orders/table/{t}/?since=1&wait=2' for t in table_ids],
+    }
+    results = {}
+    for kind in args.servers.split(','):
+        port = free_port()
+        proc = subprocess.Popen([sys.executable, __file__, '--serve', kind, '--port', str(port)], env=_common.export_env())
+        try:
+            wait_ready(port)
+            for name in args.scenarios.split(','):
+                asyncio.run(load(port, scenarios[name], 20, 1))  # Làm nóng cache / kết nối DB
+                samples, errors, elapsed = asyncio.run(load(port, scenarios[name], args.connections, args.duration))
+                results[f'{kind} | {name}'] = {**(_common.summary(samples) if samples else {'n': 0}),
+                                               'rps': round(len(samples) / elapsed, 1), 'errors': errors}
+        finally:
+            proc.terminate(); proc.wait()
+    _common.report(f'WSGI vs ASGI, {args.connections} kết nối đồng thời, {args.duration:.0f}s mỗi kịch bản', results)
+    if args.compare: _common.compare(args.compare, results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Đo các endpoint đọc nhiều (danh sách bàn, dashboard, menu) qua cache 2 tầng (EMENU/caching.py):
+không cache (xoá trước mỗi request), trúng cache dùng chung (worker khác đã dựng, LRU trong RAM trống)
+và trúng LRU trong RAM. Chạy với REDIS_URL=redis://... để đo cache dùng chung là Redis thật.
+
+    python benchmarks/bench_cache.py [--mysql] [--tables 30] [--orders-per-day 50] [--repeat 200] [--json out.json] [--compare base.json]
+"""
+import argparse
+import _common
+from bench_queries import seed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--tables', type=int, default=30)
+    parser.add_argument('--orders-per-day', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    _common.setup(mysql=args.mysql)
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from EMENU import caching
+    seed(args.tables, args.orders_per_day)
+    client = APIClient()
+    client.force_authenticate(User.objects.create_superuser('bench', password='x'))
+    urls = {'ban': '/api/tables/', 'dashboard thang': '/api/dashboard/stats/?range=month', 'menu': '/api/menu/'}
+
+    def forget_local():
+        for ns in (caching.menu, caching.tables, caching.dashboard): ns.reset()
+
+    modes = {
+        'khong cache': caching.clear,
+        'cache dung chung': forget_local,  # Như 1 worker khác vừa được 1 worker đầu tiên dựng sẵn
+        'LRU trong RAM': lambda: None,
+    }
+    results = {}
+    for name, url in urls.items():
+        client.get(url)
+        for mode, before in modes.items():
+            def fn():
+                before(); client.get(url)
+            results[f'{name} | {mode}'] = _common.summary(_common.measure(fn, args.repeat))
+    _common.report(f'Cache 2 tầng, {args.tables} bàn, {args.orders_per_day} đơn/ngày x 365 ngày', results)
+    if args.compare: _common.compare(args.compare, results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
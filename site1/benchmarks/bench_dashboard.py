@@ -0,0 +1,63 @@
+"""So sánh phần best_sellers của dashboard: cách cũ (đọc file gốc + base64) và cách mới (1 query + link thumbnail).
+
+    python benchmarks/bench_dashboard.py [--mysql] [--repeat 50] [--json out.json]
+"""
+import argparse, base64, glob, json, os, shutil
+import _common
+
+def seed(media_root):
+    from EMENU.models import Category, Item, Table, Order, OrderItem
+    # Lấy ảnh thật trong media/menu (cả JPEG lẫn PNG) làm ảnh món
+    src = sorted(glob.glob(os.path.join(_common.BASE_DIR, 'media', 'menu', '*-*.*')))[:5]
+    os.makedirs(os.path.join(media_root, 'menu'), exist_ok=True)
+    cat = Category.objects.create(name='Sushi')
+    items = []
+    for i, path in enumerate(src):
+        shutil.copy(path, os.path.join(media_root, 'menu'))
+        items.append(Item.objects.create(category=cat, name=f'Món {i}', price=50000, image=f'menu/{os.path.basename(path)}'))
+    table = Table.objects.create(number='Bàn 1')
+    for n in range(200):
+        order = Order.objects.create(table=table, status='paid')
+        OrderItem.objects.bulk_create([OrderItem(order=order, item=it, quantity=1 + (n + k) % 3) for k, it in enumerate(items)])
+
+def legacy_best_sellers():
+    """Bản sao logic cũ của get_dashboard_stats để làm mốc so sánh"""
+    from django.db.models import Sum
+    from EMENU.models import Item, OrderItem
+    top = OrderItem.objects.values('item').annotate(total=Sum('quantity')).order_by('-total')[:5]
+    best_sellers = []
+    for t in top:
+        i = Item.objects.get(pk=t['item'])
+        img = ""
+        if i.image and os.path.exists(i.image.path):
+            with open(i.image.path, "rb") as f:
+                img = f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}"
+        best_sellers.append({'id': i.id, 'name': i.name, 'price': i.price, 'img': img, 'sold_count': t['total']})
+    return best_sellers
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--json')
+    args = parser.parse_args()
+
+    _common.setup(mysql=args.mysql)
+    from django.conf import settings
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+    from EMENU.views.manage_views import _best_sellers
+    seed(settings.MEDIA_ROOT)
+    request = RequestFactory().get('/api/dashboard/stats/')
+
+    results = {}
+    for name, fn in (('truoc (base64 inline)', legacy_best_sellers), ('sau (thumbnail URL)', lambda: _best_sellers(request))):
+        with CaptureQueriesContext(connection) as ctx: payload = json.dumps(fn()).encode()
+        results[name] = {'payload_bytes': len(payload), 'queries': len(ctx.captured_queries),
+                         **_common.summary(_common.measure(fn, args.repeat))}
+    _common.report('Dashboard best_sellers', results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
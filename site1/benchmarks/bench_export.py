@@ -0,0 +1,66 @@
+"""Xuất dòng món cho kế toán: lật trang /api/orders/ (cách duy nhất trước đây) so với stream /api/export/order_items.<fmt>.
+Đo thời gian, số query và đỉnh bộ nhớ Python (tracemalloc) khi xuất 1 tháng và cả năm - bản stream phải giữ RAM phẳng.
+
+    python benchmarks/bench_export.py [--mysql] [--orders-per-day 150] [--json out.json] [--compare base.json]
+"""
+import argparse, datetime, time, tracemalloc
+import _common
+from bench_analytics import seed
+
+def run(fn):
+    """Lần 1 đo thời gian + số query, lần 2 đo đỉnh bộ nhớ (tracemalloc làm chậm code Python nên không đo chung)"""
+    from django.db import connection
+    queries = []
+    def count(execute, *args): queries.append(1); return execute(*args)
+    t = time.perf_counter()
+    # Không dùng CaptureQueriesContext: test client reset connection.queries ở đầu mỗi request
+    with connection.execute_wrapper(count): size = fn()
+    elapsed = (time.perf_counter() - t) * 1000
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'ms': round(elapsed, 1), 'queries': len(queries), 'peak_mb': round(peak / 2 ** 20, 2), 'bytes': size}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--orders-per-day', type=int, default=150)
+    parser.add_argument('--json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    _common.setup(mysql=args.mysql)
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    seed(args.orders_per_day)
+    client = APIClient()
+    client.force_authenticate(User.objects.create_superuser('bench', password='x'))
+    today = timezone.now().date()
+    ranges = {'1 thang': (today - datetime.timedelta(days=30)).isoformat(), '1 nam': (today - datetime.timedelta(days=366)).isoformat()}
+
+    def paginate():
+        # Trước đây: lật từng trang 50 đơn của OrderViewSet rồi tự ghép (phải lấy hết, API không lọc theo ngày)
+        size, url = 0, '/api/orders/'
+        while url:
+            res = client.get(url); size += len(res.content)
+            url = res.json().get('next')
+        return size
+
+    def export(fmt, start):
+        def fn():
+            res = client.get(f'/api/export/order_items.{fmt}', {'from': start})
+            return sum(len(part) for part in res.streaming_content)
+        return fn
+
+    results = {'truoc: lat trang /api/orders/ (ca nam)': run(paginate)}
+    for label, start in ranges.items():
+        for fmt in ('csv', 'xlsx', 'json'):
+            results[f'stream {fmt}, {label}'] = run(export(fmt, start))
+    _common.report(f'Xuất dòng món, {args.orders_per_day} đơn/ngày x 3 món', results)
+    if args.compare: _common.compare(args.compare, results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Micro-benchmark kiểm tra vị trí đặt món với hàng nghìn vùng (chi nhánh): cách cũ (haversine tới từng vùng)
+và GeofenceSet (lưới ô + bbox tính sẵn, chỉ tính chính xác với vài vùng ứng viên).
+
+    python benchmarks/bench_geofence.py [--fences 5000] [--points 20000] [--json out.json]
+"""
+import argparse, os, random, time
+import _common
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fences', type=int, default=5000)
+    parser.add_argument('--points', type=int, default=20000)
+    parser.add_argument('--json')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'site1.settings')
+    import django; django.setup()
+    from EMENU.geofence import GeofenceSet, make_fence, haversine
+    rnd = random.Random(17)
+    # Các chi nhánh rải trong khu vực ~50km quanh TP.HCM, 1/4 là đa giác
+    specs = []
+    for i in range(args.fences):
+        lat, lon = 10.8 + rnd.uniform(-0.25, 0.25), 106.7 + rnd.uniform(-0.25, 0.25)
+        if i % 4: specs.append({'name': f'CN {i}', 'lat': lat, 'lon': lon, 'radius': rnd.uniform(50, 300)})
+        else: specs.append({'name': f'CN {i}', 'polygon': [(lat, lon), (lat + 0.002, lon), (lat + 0.002, lon + 0.002), (lat, lon + 0.002)]})
+    fences = [make_fence(s) for s in specs]
+    circles = [f for f in fences if hasattr(f, 'radius')]
+    points = [(10.8 + rnd.uniform(-0.25, 0.25), 106.7 + rnd.uniform(-0.25, 0.25)) for _ in range(args.points)]
+
+    def naive(lat, lon):
+        # Cách cũ mở rộng cho nhiều vùng: haversine tới mọi vùng tròn
+        return next((f for f in circles if haversine(f.lat, f.lon, lat, lon) <= f.radius), None)
+
+    t = time.perf_counter(); index = GeofenceSet(fences); build_ms = (time.perf_counter() - t) * 1000
+    sample = points[:max(1, args.points // 20)]  # Cách cũ chậm -> đo trên 1 phần điểm
+    results = {}
+    for name, fn, pts in (('cu: haversine moi vung', naive, sample), ('moi: luoi + bbox', index.find, points)):
+        samples = []
+        for lat, lon in pts:
+            t = time.perf_counter(); fn(lat, lon); samples.append((time.perf_counter() - t) * 1000)
+        results[name] = {**_common.summary(samples), 'checks_per_s': round(len(pts) / (sum(samples) / 1000))}
+    results['moi: luoi + bbox']['build_ms'] = round(build_ms, 1)
+    # Cách mới phải cho cùng kết quả với phép tính đầy đủ
+    for p in sample:
+        found, full = index.find(*p), [f for f in fences if f.contains(*p)]
+        assert (found in full) if full else found is None
+    _common.report(f'Geofence: {args.fences} vùng', results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Mô phỏng điện thoại gửi lại create_order khi Wi-Fi chập chờn: mỗi giỏ hàng được gửi 1 + RETRIES lần.
+So sánh không có header Idempotency-Key (mỗi lần gửi lại cộng dồn số lượng, chạy lại cả logic đơn)
+với có key (lần gửi lại trả response đã lưu). Đo thời gian, số query mỗi lần gửi lại và số lượng món cuối cùng.
+
+    python benchmarks/bench_idempotency.py [--mysql] [--carts 100] [--retries 3] [--json out.json] [--compare base.json]
+"""
+import argparse, time, uuid
+import _common
+
+SHOP_GPS = {'lat': 10.824682, 'lon': 106.720029}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--carts', type=int, default=100)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--json')
+    parser.add_argument('--compare')
+    args = parser.parse_args()
+
+    _common.setup(mysql=args.mysql)
+    from django.db import connection
+    from django.db.models import Sum
+    from rest_framework.test import APIClient
+    from EMENU.models import Category, Item, OrderItem, Table
+    cat = Category.objects.create(name='Sushi')
+    items = Item.objects.bulk_create([Item(category=cat, name=f'Món {i}', price=10000 + 500 * i) for i in range(40)])
+    client = APIClient()
+    results = {}
+    for label, with_key in (('truoc: khong key', False), ('sau: Idempotency-Key', True)):
+        table = Table.objects.create(number=f'Bàn {label}')
+        cart = {**SHOP_GPS, 'table_id': table.id, 'items': [{'product_id': i.id, 'quantity': 1} for i in items[:5]]}
+        first_ms, retry_ms, queries = [], [], []
+        def count(execute, *a): queries.append(1); return execute(*a)
+        for _ in range(args.carts):
+            headers = {'HTTP_IDEMPOTENCY_KEY': str(uuid.uuid4())} if with_key else {}
+            for attempt in range(1 + args.retries):
+                t = time.perf_counter()
+                if attempt:
+                    with connection.execute_wrapper(count): client.post('/api/orders/create/', cart, format='json', **headers)
+                else: client.post('/api/orders/create/', cart, format='json', **headers)
+                (retry_ms if attempt else first_ms).append((time.perf_counter() - t) * 1000)
+        results[f'{label} | gui lan dau'] = _common.summary(first_ms)
+        results[f'{label} | gui lai'] = {**_common.summary(retry_ms), 'queries': round(len(queries) / len(retry_ms), 1),
+                                         'so_luong': OrderItem.objects.filter(order__table=table).aggregate(n=Sum('quantity'))['n'],
+                                         'dung': args.carts * 5}
+    _common.report(f'{args.carts} giỏ hàng x {args.retries} lần gửi lại', results)
+    if args.compare: _common.compare(args.compare, results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Đo thời gian nạp menu N món: cách cũ (xoá hết + Item.objects.create từng dòng) và lệnh import_menu (upsert theo lô).
+
+    python benchmarks/bench_import.py [--mysql] [--items 10000] [--json out.json]
+"""
+import argparse, io, json, os, time
+import _common
+
+def write_menu(path, n):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([{'ten_mon': f'Món {i}', 'gia': 10000 + i, 'phan_loai': f'Nhóm {i % 20}'} for i in range(n)], f, ensure_ascii=False)
+
+def legacy_import(path):
+    """Bản sao logic import_menu.py cũ để làm mốc"""
+    from EMENU.models import Category, Item
+    Item.objects.all().delete(); Category.objects.all().delete()
+    with open(path, encoding='utf-8') as f: data = json.load(f)
+    categories = {}
+    for row in data:
+        if row['phan_loai'] not in categories:
+            categories[row['phan_loai']], _ = Category.objects.get_or_create(name=row['phan_loai'])
+        Item.objects.create(category=categories[row['phan_loai']], name=row['ten_mon'], price=row['gia'], image=None)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--json')
+    args = parser.parse_args()
+
+    tmp = _common.setup(mysql=args.mysql)
+    from django.core.management import call_command
+    from EMENU.models import Item
+    path = os.path.join(tmp, 'menu.json')
+    write_menu(path, args.items)
+
+    def timed(fn):
+        t = time.perf_counter(); fn(); return round(time.perf_counter() - t, 3)
+
+    quiet = io.StringIO()
+    results = {
+        'cu: create tung dong': {'seconds': timed(lambda: legacy_import(path))},
+        'moi: lan dau (insert)': {'seconds': timed(lambda: (Item.objects.all().delete(), call_command('import_menu', path, stdout=quiet)))},
+        'moi: nap lai (upsert)': {'seconds': timed(lambda: call_command('import_menu', path, stdout=quiet))},
+    }
+    for r in results.values(): r['items_per_s'] = round(args.items / max(r['seconds'], 1e-9))
+    _common.report(f'Nạp menu {args.items} món', results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Load test luồng gọi món của khách qua HTTP thật (server WSGI cục bộ, không cần mạng).
+
+Mỗi "khách" (1 thread) ngồi 1 bàn và lặp: tải menu (/menu/data/, có If-None-Match như trình duyệt),
+gửi giỏ hàng (create_order), poll đơn của bàn; 1 thread thu ngân poll /api/notifications/ và
+thanh toán (checkout) một bàn đang có đơn.
+
+    python benchmarks/bench_ordering_flow.py [--mysql] [--customers 20] [--duration 20] [--items 120]
+                                             [--json out.json] [--compare base.json]
+"""
+import argparse, json, random, threading, time, urllib.request, urllib.error
+from collections import defaultdict
+import _common
+
+SHOP_GPS = {'lat': 10.824682, 'lon': 106.720029}
+
+def seed(n_items, n_tables):
+    from django.contrib.auth.models import User
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from EMENU.models import Category, Item, Table
+    cats = [Category.objects.create(name=f'Nhóm {i}') for i in range(8)]
+    items = Item.objects.bulk_create([Item(category=cats[i % 8], name=f'Món {i}', price=10000 + 500 * i) for i in range(n_items)])
+    tables = Table.objects.bulk_create([Table(number=f'Bàn {i + 1}') for i in range(n_tables)])
+    admin = User.objects.create_superuser('bench', password='x')
+    return [i.id for i in items], [t.id for t in tables], str(RefreshToken.for_user(admin).access_token)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)   # endpoint -> [(ms, số query)]
+        self.errors = defaultdict(int)
+
+    def call(self, base, endpoint, method, path, body=None, headers=None):
+        req = urllib.request.Request(base + path, method=method, headers={'Content-Type': 'application/json', **(headers or {})},
+                                     data=json.dumps(body).encode() if body is not None else None)
+        t = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=30) as res: data, status, res_headers = res.read(), res.status, res.headers
+        except urllib.error.HTTPError as e:
+            data, status, res_headers = e.read(), e.code, e.headers
+        ms = (time.perf_counter() - t) * 1000
+        with self.lock:
+            if status >= 400: self.errors[endpoint] += 1
+            else: self.samples[endpoint].append((ms, int(res_headers.get('X-Bench-Queries', 0))))
+        return status, data, res_headers
+
+
+def customer(base, rec, table_id, item_ids, stop, rnd):
+    etag = None
+    while not stop.is_set():
+        _, _, headers = rec.call(base, 'GET menu/data', 'GET', '/menu/data/', headers={'If-None-Match': etag} if etag else None)
+        etag = headers.get('ETag') or etag
+        cart = [{'id': pid, 'quantity': rnd.randint(1, 3), 'note': ''} for pid in rnd.sample(item_ids, rnd.randint(1, 5))]
+        rec.call(base, 'POST create_order', 'POST', '/api/orders/create/', {**SHOP_GPS, 'table_id': table_id, 'items': cart})
+        for _ in range(3):
+            rec.call(base, 'GET order_by_table', 'GET', f'/api/orders/table/{table_id}/')
+            time.sleep(rnd.uniform(0.05, 0.2))
+
+def cashier(base, rec, table_ids, token, stop, rnd):
+    auth = {'Authorization': f'Bearer {token}'}
+    while not stop.is_set():
+        rec.call(base, 'GET notifications', 'GET', '/api/notifications/', headers=auth)
+        _, body, _ = rec.call(base, 'GET tables', 'GET', '/api/tables/', headers=auth)
+        busy = [t['id'] for t in json.loads(body).get('results', []) if t['current_order_total']]
+        if busy: rec.call(base, 'POST checkout', 'POST', f'/api/tables/{rnd.choice(busy)}/checkout/', {'payment_method': 'cash'}, auth)
+        time.sleep(0.2)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--customers', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=20, help='Số giây chạy tải')
+    parser.add_argument('--items', type=int, default=120)
+    parser.add_argument('--seed', type=int, default=15)
+    parser.add_argument('--json')
+    parser.add_argument('--compare', help='File JSON của lần chạy trước để so sánh')
+    args = parser.parse_args()
+
+    _common.setup(mysql=args.mysql)
+    item_ids, table_ids, token = seed(args.items, args.customers)
+    base = _common.serve_wsgi()
+    rec, stop = Recorder(), threading.Event()
+    workers = [threading.Thread(target=customer, args=(base, rec, tid, item_ids, stop, random.Random(args.seed + n)))
+               for n, tid in enumerate(table_ids)]
+    workers.append(threading.Thread(target=cashier, args=(base, rec, table_ids, token, stop, random.Random(args.seed))))
+
+    started = time.perf_counter()
+    for w in workers: w.start()
+    time.sleep(args.duration); stop.set()
+    for w in workers: w.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for endpoint, samples in sorted(rec.samples.items()):
+        results[endpoint] = {**_common.summary([ms for ms, _ in samples]), 'rps': round(len(samples) / elapsed, 1),
+                             'queries_per_req': round(sum(q for _, q in samples) / len(samples), 2),
+                             'errors': rec.errors.get(endpoint, 0)}
+    total = sum(len(s) for s in rec.samples.values())
+    results['TOTAL'] = {'requests': total, 'rps': round(total / elapsed, 1), 'errors': sum(rec.errors.values())}
+    _common.report(f'Luồng gọi món: {args.customers} bàn, {args.duration:.0f}s, DB={"MySQL" if args.mysql else "SQLite"}', results)
+    if args.compare: _common.compare(args.compare, results)
+    if args.json: _common.dump(args.json, results)
+
+if __name__ == '__main__':
+    main()
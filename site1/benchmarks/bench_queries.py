@@ -0,0 +1,105 @@
+"""Đo các truy vấn nóng trên 1 năm dữ liệu giả lập, trước và sau khi có index ghép (Meta.indexes).
+In EXPLAIN của từng truy vấn và độ trễ của các endpoint dùng chúng.
+
+    python benchmarks/bench_queries.py [--mysql] [--tables 30] [--orders-per-day 150] [--repeat 30] [--json out.json]
+"""
+import argparse, datetime, io, random
+import _common
+
+def seed(n_tables, per_day, days=365):
+    from django.core.management import call_command
+    from django.utils import timezone
+    from EMENU.models import Category, Item, Table, Order, OrderItem, Revenue, Notification, Booking
+    rnd = random.Random(13)
+    cat = Category.objects.create(name='Sushi')
+    items = Item.objects.bulk_create([Item(category=cat, name=f'Món {i}', price=20000 + 1000 * i) for i in range(40)])
+    tables = Table.objects.bulk_create([Table(number=f'Bàn {i + 1}') for i in range(n_tables)])
+    start = timezone.now() - datetime.timedelta(days=days)
+    for day in range(days):
+        orders = Order.objects.bulk_create([Order(table=rnd.choice(tables), status='paid', total=0) for _ in range(per_day)])
+        lines = [OrderItem(order=o, item=rnd.choice(items), quantity=rnd.randint(1, 3), is_served=True)
+                 for o in orders for _ in range(3)]
+        OrderItem.objects.bulk_create(lines, batch_size=2000)
+        paid_at = start + datetime.timedelta(days=day, hours=12)
+        revenues = Revenue.objects.bulk_create([Revenue(order=o, method=rnd.choice(['cash', 'banking']), amount=100000) for o in orders])
+        # auto_now_add ghi đè paid_at/created_at -> dời về đúng ngày bằng update
+        Revenue.objects.filter(pk__in=[r.pk for r in revenues]).update(paid_at=paid_at)
+        Notification.objects.bulk_create([Notification(table=rnd.choice(tables), message='yêu cầu thanh toán', is_read=True) for _ in range(per_day // 10)])
+        Booking.objects.bulk_create([Booking(customer_name='Khách', customer_phone='0900000000', booking_time=paid_at, status='confirmed') for _ in range(5)])
+    # Mỗi bàn đang có 1 đơn mở với vài món chưa ra
+    for t in tables:
+        o = Order.objects.create(table=t, status='pending', total=0)
+        OrderItem.objects.bulk_create([OrderItem(order=o, item=it) for it in items[:3]])
+    Booking.objects.bulk_create([Booking(customer_name='Khách', customer_phone='0900000000', booking_time=timezone.now()) for _ in range(10)])
+    call_command('backfill_revenue_rollups', stdout=io.StringIO())
+    return tables, items
+
+def hot_queries(table, items):
+    """Các truy vấn mà view thực sự chạy, dạng queryset để EXPLAIN được"""
+    from django.db.models import Sum
+    from django.utils import timezone
+    from EMENU.models import Order, OrderItem, Revenue, Notification, Booking
+    order = Order.objects.open().filter(table=table).last()
+    year_ago = timezone.now() - datetime.timedelta(days=365)
+    return {
+        'don mo cua ban': Order.objects.open().filter(table=table).order_by('-id_donhang')[:1],
+        'gop mon chua ra': OrderItem.objects.filter(order=order, item_id__in=[i.id for i in items[:5]], is_served=False),
+        'doanh thu theo khoang': Revenue.objects.filter(paid_at__gte=year_ago, paid_at__lt=timezone.now()).values('method').annotate(s=Sum('amount')),
+        'doanh thu __date (cu)': Revenue.objects.filter(paid_at__date__gte=year_ago.date()).values('method').annotate(s=Sum('amount')),
+        'thong bao chua doc': Notification.objects.filter(table=table, is_read=False).order_by('-created_at'),
+        'booking cho xu ly': Booking.objects.filter(status='pending').order_by('-created_at')[:10],
+    }
+
+def set_indexes(enabled):
+    from django.db import connection
+    from EMENU.models import Order, OrderItem, Revenue, Notification, Booking
+    with connection.schema_editor() as editor:
+        for model in (Order, OrderItem, Revenue, Notification, Booking):
+            for index in model._meta.indexes:
+                if enabled: editor.add_index(model, index)
+                else: editor.remove_index(model, index)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--tables', type=int, default=30)
+    parser.add_argument('--orders-per-day', type=int, default=150)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--json')
+    args = parser.parse_args()
+
+    _common.setup(mysql=args.mysql)
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+    tables, items = seed(args.tables, args.orders_per_day)
+    table = tables[0]
+    client = APIClient()
+    client.force_authenticate(User.objects.create_superuser('bench', password='x'))
+    endpoints = {
+        'GET orders/table/<id>': f'/api/orders/table/{table.id}/',
+        'GET tables': '/api/tables/',
+        'GET dashboard ?range=year': '/api/dashboard/stats/?range=year',
+        'GET notifications': '/api/notifications/',
+    }
+
+    results, plans = {}, {}
+    # DB tạo từ model đã có index -> đo "không index" trước bằng cách gỡ, rồi thêm lại
+    for phase, enabled in (('khong index', False), ('co index', True)):
+        set_indexes(enabled)
+        for name, qs in hot_queries(table, items).items():
+            plans[f'{phase} | {name}'] = qs.explain()
+            results[f'{phase} | {name}'] = _common.summary(_common.measure(lambda: list(qs.all()), args.repeat))
+        for name, url in endpoints.items():
+            with CaptureQueriesContext(connection) as ctx: client.get(url)
+            results[f'{phase} | {name}'] = {'queries': len(ctx.captured_queries),
+                                            **_common.summary(_common.measure(lambda: client.get(url), args.repeat))}
+
+    print('\n== EXPLAIN ==')
+    for name, plan in plans.items(): print(f'-- {name}\n{plan}')
+    _common.report(f'Truy vấn nóng ({args.orders_per_day} đơn/ngày x 365 ngày, {args.tables} bàn)', results)
+    if args.json: _common.dump(args.json, {'results': results, 'plans': plans})
+
+if __name__ == '__main__':
+    main()
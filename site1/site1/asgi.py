@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'site1.settings')
+# Chạy dưới ASGI -> các endpoint đọc công khai dùng view async (xem EMENU/views/async_views.py)
+os.environ.setdefault('EMENU_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
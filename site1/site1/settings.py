@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Phải đặt đầu tiên
+    'EMENU.middleware.RequestMetricsMiddleware',  # Chỉ chạy khi EMENU_METRICS = True
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -155,7 +156,9 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
     'ngrok-skip-browser-warning',
+    'idempotency-key',  # Gửi lại đơn / thanh toán không bị ghi 2 lần (EMENU/idempotency.py)
 ]
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
 
 # CORS methods được phép
 CORS_ALLOW_METHODS = [
@@ -208,6 +211,20 @@ SIMPLE_JWT = {
 }
 import os
 
+# Đo query / thời gian DB / render của từng request (header Server-Timing + log 'EMENU.metrics')
+EMENU_METRICS = os.environ.get('EMENU_METRICS', '0') == '1'
+EMENU_QUERY_BUDGET = 20  # Cảnh báo khi 1 request chạy quá số query này
+
+# Cache dùng chung giữa các worker (EMENU/caching.py): Redis khi có REDIS_URL (cần gói redis), không thì bộ nhớ
+# tiến trình. Lệnh huỷ cache được phát qua pub/sub của cùng Redis tới mọi worker.
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL} if REDIS_URL
+          else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+EMENU_CACHE_BUS = REDIS_URL
+
+# Dùng view async cho menu / đơn của bàn (site1/asgi.py tự bật khi chạy bằng uvicorn)
+EMENU_ASYNC_VIEWS = os.environ.get('EMENU_ASYNC_VIEWS', '0') == '1'
+
 # Đường dẫn URL để truy cập ảnh (VD: http://localhost:8000/media/...)
 MEDIA_URL = '/media/'
 
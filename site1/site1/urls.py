@@ -9,6 +9,10 @@ from rest_framework.routers import DefaultRouter
 
 # Import Views
 from EMENU import views
+from EMENU.views import async_views
+
+# Dưới ASGI (EMENU_ASYNC_VIEWS) các endpoint đọc công khai dùng bản async trong EMENU/views/async_views.py
+public = async_views if settings.EMENU_ASYNC_VIEWS else views
 
 # Router
 router = DefaultRouter()
@@ -29,6 +33,9 @@ urlpatterns = [
     
     # 3. Dashboard
     path('api/dashboard/stats/', views.get_dashboard_stats, name='get_dashboard_stats'),
+    path('api/dashboard/analytics/', views.get_sales_analytics, name='get_sales_analytics'),
+    path('api/export/<str:dataset>.<str:fmt>', views.export_data, name='export_data'),
+    path('api/cache/stats/', views.get_cache_stats, name='get_cache_stats'),
     
     # 4. Booking
     path('api/booking/create/', views.create_booking, name='create_booking'),
@@ -37,17 +44,26 @@ urlpatterns = [
     # 5. Orders & Tables
     path('api/orders/create/', views.create_order, name='create_order'),
     path('api/orders/cancel/', views.cancel_order, name='cancel_order'),
-    path('api/orders/table/<int:table_id>/', views.get_order_by_table, name='get_order_by_table'),
+    path('api/orders/table/<int:table_id>/', public.get_order_by_table, name='get_order_by_table'),
     path('api/tables/request-payment/', views.request_payment, name='request_payment'),
     path('api/tables/<int:id_ban>/reserve/', views.reserve_table, name='reserve_table'),
     path('api/tables/<int:table_id>/checkout/', views.checkout, name='checkout'),
     
     # 6. Menu (Cho khách hàng)
-    path('api/menu/', views.get_menu, name='get_menu'),
-    path('api/menu/category/<int:id_danhmuc>/', views.get_menu_by_category, name='get_menu_by_category'),
+    path('api/menu/', public.get_menu, name='get_menu'),
+    path('api/menu/category/<int:id_danhmuc>/', public.get_menu_by_category, name='get_menu_by_category'),
     path('api/notifications/', views.get_notifications, name='get_notifications'),
-    path('menu/data/', views.get_menu_data, name='get_menu_data'),
-    # 7. Router APIs
+    path('api/notifications/stream/', views.notification_stream, name='notification_stream'),
+    path('api/notifications/stream-token/', views.notification_stream_token, name='notification_stream_token'),
+    path('menu/data/', public.get_menu_data, name='get_menu_data'),
+
+    # 7. Bếp
+    path('api/kitchen/queue/', views.kitchen_queue, name='kitchen_queue'),
+    path('api/kitchen/serve/', views.kitchen_serve, name='kitchen_serve'),
+    path('api/kitchen/stream/', views.kitchen_stream, name='kitchen_stream'),
+    path('api/kitchen/stream-token/', views.kitchen_stream_token, name='kitchen_stream_token'),
+
+    # 8. Router APIs
     path('api/', include(router.urls)),
 ]
 